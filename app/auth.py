@@ -1,4 +1,7 @@
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
+import asyncio
+import multiprocessing
 from typing import Annotated
 from enum import Enum
 from functools import total_ordering
@@ -16,6 +19,7 @@ from sqlalchemy.orm import Session
 from .sql_app import crud, models, schemas
 from .sql_app.db import get_db
 from . import config
+from .instrumentation import stage
 
 @total_ordering
 class AccessLevels(Enum):
@@ -55,11 +59,56 @@ def get_password_hash(password):
     return django_context.hash(password)
 
 
-def authenticate_user(db : Session, user_cred : schemas.UserCredAuth):
+class PasswordVerifier:
+    '''Verifies password hashes in a process pool, so slow hashing doesn't block the event loop.
+    Requests over the queue limit are rejected instead of waiting.
+
+    Pool processes come from a fork server (spawned where there is none): a uvicorn worker
+    runs threads, and a child forked from it could inherit locks held by them.
+    '''
+
+    def __init__(self, workers : int, queue_limit : int) -> None:
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self._pool : ProcessPoolExecutor | None = None
+
+    def start(self):
+        """Creates the pool, called at application startup."""
+        if not self._pool:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+
+    async def verify(self, plain_password, hashed_password) -> bool:
+        if self.pending >= self.workers + self.queue_limit:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts, try again later",
+                headers={"Retry-After": "1"},
+            )
+        self.start()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, verify_password, plain_password, hashed_password)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self._pool:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+password_verifier = PasswordVerifier(config.PASSWORD_HASH_WORKERS, config.PASSWORD_HASH_QUEUE)
+
+
+async def authenticate_user(db : Session, user_cred : schemas.UserCredAuth):
     user = crud.get_user_by_name(db, user_cred.user_login)
     if not user:
         return False
-    if not verify_password(user_cred.user_password, user.password):
+    # Give the connection back to the pool while waiting for the hash, waiting logins could exhaust it
+    db.close()
+    if not await password_verifier.verify(user_cred.user_password, user.password):
         return False
     return user
 
@@ -72,25 +121,30 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes
     return encoded_jwt
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
+async def get_user_by_token(db: Session, token: str):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
-        user_id: int = int(payload.get("sub"))
-        if user_id is None:
+    with stage('auth'):
+        try:
+            payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
+            user_id: int = int(payload.get("sub"))
+            if user_id is None:
+                raise credentials_exception
+        except JWTError:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = crud.get_user(db, user_id)
+        user = crud.get_user(db, user_id)
     if user is None:
         raise credentials_exception
     return user
 
 
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
+    return await get_user_by_token(db, token)
+
+
 def check_access(
     db: Session,
     current_user: Annotated[models.User, Depends(get_current_user)],
@@ -112,7 +166,8 @@ async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: Session = Depends(get_db)
 ) -> Token:
-    user = authenticate_user(db, schemas.UserCredAuth(user_login=form_data.username, user_password=form_data.password))
+    with stage('auth'):
+        user = await authenticate_user(db, schemas.UserCredAuth(user_login=form_data.username, user_password=form_data.password))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import threading
+from collections import OrderedDict, deque
+
+from sqlalchemy.orm import Session
+
+from .sql_app import crud
+from .sql_app.db import SessionLocal
+from . import config
+
+
+def _message(version : int, events : list[dict] | None) -> str:
+    return json.dumps({'version' : version, 'events' : events}, separators=(',', ':'))
+
+
+class ProjectFeed:
+    '''Recent messages of one project, encoded once and shared by all of its subscribers.
+
+    Versions in the buffer are consecutive: a version published out of order, e.g. after
+    a change made by another worker, gets a message with `events: null`, telling clients
+    to load the graph again.
+    '''
+
+    def __init__(self, version : int, size : int) -> None:
+        self.version = version
+        self.messages : deque[tuple[int, str]] = deque(maxlen=size)
+        self.subscribers = 0
+        self.deleted = False
+        self._changed = asyncio.Event()
+
+    def publish(self, version : int, events : list[dict] | None):
+        if version <= self.version:
+            return
+        if version != self.version + 1:
+            events = None
+        self.messages.append((version, _message(version, events)))
+        self.version = version
+        self._wake()
+
+    def delete(self):
+        self.deleted = True
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def since(self, version : int) -> list[tuple[int, str]] | None:
+        """Messages after `version`, None if some of them are no longer kept."""
+        if version == self.version:
+            return []
+        if version > self.version or not self.messages or self.messages[0][0] > version + 1:
+            return None
+        return [message for message in self.messages if message[0] > version]
+
+    async def wait(self, version : int):
+        if self.version == version and not self.deleted:
+            await self._changed.wait()
+
+
+class ChangeBroker:
+    '''Per-project change feeds of this worker process.
+
+    A feed is created by its first subscriber and kept after the last one leaves, so
+    clients can reconnect and resume; at most `projects` feeds without subscribers are kept.
+    Mutation endpoints publish only to existing feeds. While there are subscribers, versions of their projects are polled from the
+    database every `poll_seconds` to notice changes committed by other workers.
+    '''
+
+    def __init__(self, buffer_size : int, projects : int, poll_seconds : float) -> None:
+        self.buffer_size = buffer_size
+        self.projects = projects
+        self.poll_seconds = poll_seconds
+        self.feeds : OrderedDict[int, ProjectFeed] = OrderedDict()
+        self._loop : asyncio.AbstractEventLoop | None = None
+        self._loop_thread : int | None = None
+        self._poller : asyncio.Task | None = None
+
+    def watched(self, pid : int) -> bool:
+        return pid in self.feeds
+
+    def _call(self, func, *args):
+        # Feeds belong to the event loop, endpoints running in the thread pool hand messages over to it
+        if self._loop is None:
+            return
+        if self._loop.is_closed():
+            self._loop = None
+        elif threading.get_ident() == self._loop_thread:
+            func(*args)
+        else:
+            self._loop.call_soon_threadsafe(func, *args)
+
+    def publish(self, db : Session, pid : int, events : list[dict] | None):
+        """Publishes events of a committed change. `None` events mean the change is unknown."""
+        if pid not in self.feeds:
+            return
+        project = crud.get_project_by_id(db, pid)
+        if project:
+            self._call(self._publish, pid, project.project_version, events)
+
+    def _publish(self, pid : int, version : int, events : list[dict] | None):
+        feed = self.feeds.get(pid)
+        if feed:
+            feed.publish(version, events)
+
+    def delete(self, pid : int):
+        if pid in self.feeds:
+            self._call(self._delete, pid)
+
+    def _delete(self, pid : int):
+        feed = self.feeds.pop(pid, None)
+        if feed:
+            feed.delete()
+
+    def _feed(self, pid : int, version : int) -> ProjectFeed:
+        feed = self.feeds.get(pid)
+        if feed is None:
+            feed = self.feeds[pid] = ProjectFeed(version, self.buffer_size)
+            idle = [key for key, other in self.feeds.items() if not other.subscribers and key != pid]
+            for key in idle[:max(0, len(idle) - self.projects)]:
+                del self.feeds[key]
+        else:
+            feed.publish(version, None)
+        self.feeds.move_to_end(pid)
+        return feed
+
+    async def subscribe(self, pid : int, version : int, since : int | None = None):
+        """Yields `(version, message)` pairs for changes of the project after `since`.
+
+        `version` is the current project version read from the database. Without `since`
+        the first message carries the current version and no events. If changes after
+        `since` are no longer known, the first message has `events: null`.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        feed = self._feed(pid, version)
+        feed.subscribers += 1
+        if self.poll_seconds > 0 and not self._poller:
+            self._poller = asyncio.create_task(self._poll())
+        try:
+            if since is None:
+                since = feed.version
+                yield since, _message(since, [])
+            while not feed.deleted:
+                messages = feed.since(since)
+                if messages is None:
+                    messages = [(feed.version, _message(feed.version, None))]
+                for since, message in messages:
+                    yield since, message
+                await feed.wait(since)
+            yield since, json.dumps({'version' : since, 'events' : [{'type' : 'project_deleted'}]}, separators=(',', ':'))
+        finally:
+            feed.subscribers -= 1
+
+    async def _poll(self):
+        try:
+            while True:
+                await asyncio.sleep(self.poll_seconds)
+                watched = [pid for pid, feed in self.feeds.items() if feed.subscribers]
+                if not watched:
+                    break
+                versions = await asyncio.to_thread(_project_versions, watched)
+                for pid in watched:
+                    if pid not in versions:
+                        self._delete(pid)
+                    else:
+                        self._publish(pid, versions[pid], None)
+        except Exception as error:
+            print(f'Change feed poll failed: {error}')
+        finally:
+            self._poller = None
+
+    def shutdown(self):
+        if self._poller:
+            self._poller.cancel()
+
+
+def _project_versions(project_ids : list[int]) -> dict[int, int]:
+    db = SessionLocal()
+    try:
+        return crud.get_project_versions(db, project_ids)
+    finally:
+        db.close()
+
+
+broker = ChangeBroker(config.CHANGE_FEED_BUFFER, config.CHANGE_FEED_PROJECTS, config.CHANGE_FEED_POLL_SECONDS)
@@ -1,7 +1,93 @@
-from os import environ
+from os import environ, cpu_count
 
 ALGORITHM = "HS256"
 SECRET_KEY = environ['SECRET_KEY']
 SQLALCHEMY_DATABASE_URL = environ['SQLALCHEMY_DATABASE_URL']
 ACCESS_TOKEN_EXPIRE_MINUTES = int(environ['ACCESS_TOKEN_EXPIRE_MINUTES'])
 SAVE_DIRECTORY = environ['SAVE_DIRECTORY']
+
+# Connection pool of every database engine; recycle time in seconds, -1 keeps connections open
+DB_POOL_SIZE = int(environ.get('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(environ.get('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(environ.get('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(environ.get('DB_POOL_RECYCLE', '-1'))
+DB_POOL_PRE_PING = environ.get('DB_POOL_PRE_PING', '0') == '1'
+
+# Comma separated read replica URLs for read-only routes, and how long after a change
+# reads of the client that made it still go to the primary
+SQLALCHEMY_REPLICA_URLS = [url.strip() for url in environ.get('SQLALCHEMY_REPLICA_URLS', '').split(',') if url.strip()]
+READ_YOUR_WRITES_SECONDS = float(environ.get('READ_YOUR_WRITES_SECONDS', '5'))
+
+# 'file' keeps edges in aDOT files only, 'hybrid' keeps them in the edges table
+GRAPH_STORAGE = environ.get('GRAPH_STORAGE', 'file')
+
+# Stage timings in Server-Timing headers and route latency histograms on /metrics
+INSTRUMENTATION_ENABLED = environ.get('INSTRUMENTATION_ENABLED', '0') == '1'
+
+# Parsed graph cache: 'none', 'local' (per worker process) or 'shared' (between workers of one host),
+# holding at most GRAPH_CACHE_SIZE graphs and GRAPH_CACHE_BYTES bytes (256 MiB by default)
+GRAPH_CACHE = environ.get('GRAPH_CACHE', 'none')
+GRAPH_CACHE_SIZE = int(environ.get('GRAPH_CACHE_SIZE', '128'))
+GRAPH_CACHE_BYTES = int(environ.get('GRAPH_CACHE_BYTES', str(256 * 1024 * 1024)))
+
+# Startup warm-up: number of most recently updated projects put into graph cache
+WARMUP_PROJECTS = int(environ.get('WARMUP_PROJECTS', '50'))
+WARMUP_WORKERS = int(environ.get('WARMUP_WORKERS', '4'))
+WARMUP_BUDGET_SECONDS = float(environ.get('WARMUP_BUDGET_SECONDS', '30'))
+
+# Password hashes are verified in a process pool, logins over the queue limit get 429
+PASSWORD_HASH_WORKERS = int(environ.get('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_QUEUE = int(environ.get('PASSWORD_HASH_QUEUE', '32'))
+
+# Walks started with POST /project/{id}/walk: edges processed at once and the most steps allowed
+WALK_CONCURRENCY = int(environ.get('WALK_CONCURRENCY', '8'))
+WALK_MAX_STEPS = int(environ.get('WALK_MAX_STEPS', '10000'))
+
+# Most walks one POST /project/{id}/simulate request may simulate
+SIMULATION_MAX_WALKS = int(environ.get('SIMULATION_MAX_WALKS', '1000000'))
+
+# Barycenter sweeps of GET /project/{id}/layout, and the most vertex and edge changes
+# for which the previous layout is updated instead of computed again
+LAYOUT_SWEEPS = int(environ.get('LAYOUT_SWEEPS', '8'))
+LAYOUT_INCREMENTAL_CHANGES = int(environ.get('LAYOUT_INCREMENTAL_CHANGES', '20'))
+
+# Change feeds of GET /project/{id}/changes: messages kept per project for resuming, feeds kept
+# without subscribers, and how often versions of watched projects are checked for changes of other workers
+CHANGE_FEED_BUFFER = int(environ.get('CHANGE_FEED_BUFFER', '256'))
+CHANGE_FEED_PROJECTS = int(environ.get('CHANGE_FEED_PROJECTS', '1024'))
+CHANGE_FEED_POLL_SECONDS = float(environ.get('CHANGE_FEED_POLL_SECONDS', '2'))
+
+# Project history: versions kept per project (0 keeps all), and how many times deltas since
+# the last full snapshot may outgrow it before the next snapshot is stored
+HISTORY_VERSIONS = int(environ.get('HISTORY_VERSIONS', '1000'))
+HISTORY_SNAPSHOT_RATIO = float(environ.get('HISTORY_SNAPSHOT_RATIO', '1'))
+
+# Bulk import of aDOT files: processes parsing and writing graphs (all cores by default),
+# and projects created per transaction
+IMPORT_WORKERS = int(environ.get('IMPORT_WORKERS', str(cpu_count() or 1)))
+IMPORT_BATCH = int(environ.get('IMPORT_BATCH', '100'))
+
+# Writes of one project take turns, also between workers through byte locks of a shared file
+# (on a local file system), and give up with 503 after waiting this many seconds
+PROJECT_LOCK_FILE = environ.get('PROJECT_LOCK_FILE', '')
+PROJECT_LOCK_TIMEOUT = float(environ.get('PROJECT_LOCK_TIMEOUT', '30'))
+
+# POST /projects/batch: most projects per request, and threads loading their graphs
+BATCH_MAX_PROJECTS = int(environ.get('BATCH_MAX_PROJECTS', '100'))
+BATCH_WORKERS = int(environ.get('BATCH_WORKERS', '4'))
+
+# Opt-in profiling: requests slower than the threshold keep stacks of their endpoint sampled every
+# interval, requests with the header are also profiled with cProfile. Profiles are files in the
+# directory (`profiles` in SAVE_DIRECTORY by default), only the newest PROFILE_KEEP are kept
+PROFILING_ENABLED = environ.get('PROFILING_ENABLED', '0') == '1'
+PROFILE_THRESHOLD_SECONDS = float(environ.get('PROFILE_THRESHOLD_SECONDS', '1'))
+PROFILE_INTERVAL_SECONDS = float(environ.get('PROFILE_INTERVAL_SECONDS', '0.005'))
+PROFILE_HEADER = environ.get('PROFILE_HEADER', 'X-Profile')
+PROFILE_DIRECTORY = environ.get('PROFILE_DIRECTORY', '')
+PROFILE_KEEP = int(environ.get('PROFILE_KEEP', '200'))
+
+# Memory accounting: footprints of loaded graphs, and peak allocation of requests traced with
+# tracemalloc (slows requests down, meant for sizing runs). Projects with the largest values are
+# reported on /metrics, up to this many
+MEMORY_TRACKING_ENABLED = environ.get('MEMORY_TRACKING_ENABLED', '0') == '1'
+MEMORY_TRACKING_PROJECTS = int(environ.get('MEMORY_TRACKING_PROJECTS', '50'))
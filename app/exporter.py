@@ -0,0 +1,131 @@
+import argparse
+import json
+import sys
+import tarfile
+import tempfile
+import time
+from typing import Iterator
+
+from sqlalchemy.orm import Session
+
+from .sql_app import crud
+from .storage import storage
+
+CHUNK_SIZE = 64 * 1024
+# Member contents of a tar export kept in memory, larger ones go to a temporary file
+SPOOL_SIZE = 1024 * 1024
+FORMATS = {'ndjson' : 'application/x-ndjson', 'tar' : 'application/x-tar'}
+
+
+def _json(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=lambda value : value.isoformat())
+
+
+def _project_data(project) -> dict:
+    data = project._asdict()
+    del data['project_path']
+    return data
+
+
+def _buffered(parts : Iterator[str]) -> Iterator[str]:
+    """Joins small parts into chunks of about `CHUNK_SIZE`."""
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _project_parts(db : Session, project) -> Iterator[str]:
+    """JSON of a project with its nodes, without the graph and the closing brace."""
+    yield '{"project":' + _json(_project_data(project)) + ',"nodes":['
+    separator = ''
+    # Encoded by cursor batches, one dumps() per node costs more than reading the rows
+    for nodes in crud.stream_project_nodes(db, project.project_id).partitions():
+        yield separator + _json([node._asdict() for node in nodes])[1:-1]
+        separator = ','
+    yield ']'
+
+
+def _ndjson_parts(db : Session, user_id : int | None, after : int) -> Iterator[str]:
+    for project in crud.stream_projects(db, user_id, after):
+        yield from _project_parts(db, project)
+        yield ',"graph":"'
+        for chunk in storage.read_aDOT(db, project, CHUNK_SIZE):
+            # Escaping is per character, so chunks of a JSON string are encoded separately
+            yield json.dumps(chunk, ensure_ascii=False)[1:-1]
+        yield '"}\n'
+
+
+def export_ndjson(db : Session, user_id : int | None = None, after : int = 0) -> Iterator[bytes]:
+    """Projects after `after` in ID order, one JSON line each with project data, nodes and the aDOT graph.
+    Only projects accessible to `user_id`, if given."""
+    for chunk in _buffered(_ndjson_parts(db, user_id, after)):
+        yield chunk.encode()
+
+
+def _tar_member(name : str, file, mtime : int) -> Iterator[bytes]:
+    size = file.tell()
+    file.seek(0)
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.mode = 0o644
+    yield info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+    while chunk := file.read(CHUNK_SIZE):
+        yield chunk
+    yield tarfile.NUL * (-size % tarfile.BLOCKSIZE)
+
+
+def export_tar(db : Session, user_id : int | None = None, after : int = 0) -> Iterator[bytes]:
+    """Uncompressed tar stream with `<id>.json` (project data and nodes) and `<id>.gv` of every project,
+    same order and selection as `export_ndjson`. Members are written without knowing the archive size,
+    the stream is produced as it is read."""
+    mtime = int(time.time())
+    for project in crud.stream_projects(db, user_id, after):
+        with tempfile.SpooledTemporaryFile(SPOOL_SIZE) as file:
+            for chunk in _buffered(_project_parts(db, project)):
+                file.write(chunk.encode())
+            file.write(b'}\n')
+            yield from _tar_member(f'{project.project_id}.json', file, mtime)
+        with tempfile.SpooledTemporaryFile(SPOOL_SIZE) as file:
+            for chunk in storage.read_aDOT(db, project, CHUNK_SIZE):
+                file.write(chunk.encode())
+            yield from _tar_member(f'{project.project_id}.gv', file, mtime)
+    yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+
+
+exporters = {'ndjson' : export_ndjson, 'tar' : export_tar}
+
+
+if __name__ == '__main__':
+    from .sql_app.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description='Exports projects as NDJSON or a tar archive of aDOT files and node metadata')
+    parser.add_argument('--format', choices=list(exporters), default='ndjson')
+    parser.add_argument('--after', type=int, default=0, help='export projects with greater IDs, to resume an interrupted export')
+    parser.add_argument('--user', help='username, export only projects available to this user')
+    parser.add_argument('--output', help='file to write, standard output by default')
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        user_id = None
+        if args.user:
+            user = crud.get_user_by_name(db, args.user)
+            if not user:
+                parser.error(f'No user {args.user}')
+            user_id = user.user_id
+        output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in exporters[args.format](db, user_id, args.after):
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
+    finally:
+        db.close()
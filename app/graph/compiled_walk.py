@@ -0,0 +1,82 @@
+from .select_module import select1
+
+# How a vertex picks its next vertex
+_FIRST_EDGE, _SELECT1, _SELECTOR = range(3)
+
+
+class CompiledWalk:
+    '''Walk plan of a graph, made by `Graph.compile_walk`.
+
+    Vertices are numbered, successor orders and transition functions are resolved once,
+    so `run` makes the same transitions and function calls as `Graph.walk_graph` without
+    per-step lookups. `select1` is replaced by its precomputed order and a counter;
+    other selectors are still called. Like selectors, the plan keeps its state between
+    runs, `reset` starts over. Changes to the graph after compiling are not seen.
+    '''
+
+    def __init__(self, graph, selector_funcs : dict) -> None:
+        self.graph = graph
+        self.vertices = [graph.get_vertex(id) for id in graph.get_vertices_IDs()]
+        self.ids = [vertex.id for vertex in self.vertices]
+        index = {id : i for i, id in enumerate(self.ids)}
+        self.index = index
+        self.begin = index['__BEGIN__']
+        self.end = index['__END__']
+
+        self.kinds = []
+        self.successors = []
+        # Per vertex: successor index -> (predicate, processor) for edges with a predicate
+        self.actions = []
+        for vertex in self.vertices:
+            edges = list(vertex.edges.values())
+            selector = selector_funcs.get(vertex.id)
+            if selector is select1:
+                self.kinds.append(_SELECT1)
+                edges.sort(key=lambda edge : str(edge['next_vertex']))
+            else:
+                self.kinds.append(_SELECTOR if vertex.selector else _FIRST_EDGE)
+            self.successors.append(tuple(index[edge['next_vertex'].id] for edge in edges))
+
+            actions = {}
+            for edge in edges:
+                morph = edge.get('morph') or {}
+                if morph.get('predicate'):
+                    proc = morph.get('function')
+                    actions[index[edge['next_vertex'].id]] = (morph['predicate']['func'], proc['func'] if proc else None)
+            self.actions.append(actions)
+        self.reset()
+
+    def reset(self):
+        self.visited = [0] * len(self.vertices)
+
+    def run(self, verbose : bool = True) -> list:
+        """Walks from __BEGIN__ to __END__ like `Graph.walk_graph` and returns IDs of visited vertices."""
+        graph, vertices, ids = self.graph, self.vertices, self.ids
+        kinds, successors, actions, visited, index = self.kinds, self.successors, self.actions, self.visited, self.index
+        cur = self.begin
+        path = [cur]
+        while cur != self.end:
+            kind = kinds[cur]
+            if kind == _FIRST_EDGE:
+                following = successors[cur][0]
+            elif kind == _SELECT1:
+                count = visited[cur]
+                order = successors[cur]
+                if count < len(order):
+                    following = order[count]
+                    visited[cur] = count + 1
+                else:
+                    following = order[0]
+            else:
+                following = index[vertices[cur].selector().id]
+
+            action = actions[cur].get(following)
+            if action:
+                args = action[0](graph, vertices[cur], vertices[following])
+                if action[1] and args:
+                    action[1](*args)
+            if verbose:
+                print(ids[cur], '->', ids[following])
+            path.append(following)
+            cur = following
+        return [ids[i] for i in path]
@@ -1,14 +1,32 @@
-from multipledispatch import dispatch
+import struct
+import sys
+
+from multipledispatch import Dispatcher
 from .vertex import Vertex
+from .compiled_walk import CompiledWalk
+from .registry import registry
 
 class Graph :
-    @dispatch(int, label=str, select_module_funcs=dict, predicate_module_funcs=dict, processor_module_funcs=dict)
-    def __init__(self, id : int, label : str = '', select_module_funcs = {}, predicate_module_funcs = {}, processor_module_funcs = {}) -> None:
+    # A plain dispatcher: MethodDispatcher of `@dispatch` keeps the instance it was looked up on,
+    # so graphs created at the same time in different threads could be initialized in place of each other
+    _constructors = Dispatcher('Graph.__init__')
+
+    def __init__(self, *args, **kwargs) -> None:
+        types = tuple(type(arg) for arg in args)
+        init = Graph._constructors.dispatch(*types)
+        if not init:
+            raise TypeError(f'Graph() takes (int), (str) or (int, dict) arguments, not ({", ".join(type.__name__ for type in types)})')
+        init(self, *args, **kwargs)
+
+    @_constructors.register(int)
+    def _init_empty(self, id : int, label : str = '', select_module_funcs = {}, predicate_module_funcs = {}, processor_module_funcs = {}) -> None:
         """Initialize empty Graph object.
 
         Args:
             id (int): Graph id.
             label (str, optional): Graph label. Defaults to ''.
+            select_module_funcs, predicate_module_funcs, processor_module_funcs (dict, optional):
+                Functions used instead of the process-wide registry for their module. Defaults to {}.
         """
 
         self.__vertices : dict[str, Vertex] = {}
@@ -20,8 +38,8 @@ class Graph :
         self.add_vertex('__BEGIN__')
         self.add_vertex('__END__')
 
-    @dispatch(str, label=str, select_module_funcs=dict, predicate_module_funcs=dict, processor_module_funcs=dict)
-    def __init__(self, adot_template : str, label : str = '', select_module_funcs = {}, predicate_module_funcs = {}, processor_module_funcs = {}) -> None:
+    @_constructors.register(str)
+    def _init_template(self, adot_template : str, label : str = '', select_module_funcs = {}, predicate_module_funcs = {}, processor_module_funcs = {}) -> None:
         """Initialize Graph object from template.
 
         Args:
@@ -39,8 +57,8 @@ class Graph :
         if import_error:
             raise ValueError('adot_template must be a path to an aDOT file.')
 
-    @dispatch(int, dict, select_module_funcs=dict, predicate_module_funcs=dict, processor_module_funcs=dict)
-    def __init__(self, id : int, dict_template : dict, select_module_funcs = {}, predicate_module_funcs = {}, processor_module_funcs = {}) -> None:
+    @_constructors.register(int, dict)
+    def _init_dict(self, id : int, dict_template : dict, select_module_funcs = {}, predicate_module_funcs = {}, processor_module_funcs = {}) -> None:
         self._id : int = id
         self.label : str = dict_template.get('project_label')
         self.__functions = {'select_module' : select_module_funcs, 'predicate_module' : predicate_module_funcs, 'processor_module' : processor_module_funcs}
@@ -116,6 +134,20 @@ class Graph :
             v.del_edge(vertex, False)
         return self.__vertices.pop(vertex)
 
+    def rename_vertex(self, vertex : str | int | Vertex, new_id : str | int) -> Vertex:
+        if type(vertex) == Vertex:
+            vertex = vertex.id
+        renamed = self.__vertices.pop(vertex)
+        renamed._id = new_id
+        self.__vertices[new_id] = renamed
+        # Edge dicts are rebuilt in place to keep edge order, which walks and priorities depend on
+        for v in self.__vertices.values():
+            if vertex in v.edges:
+                edges = [(new_id if id == vertex else id, edge) for id, edge in v.edges.items()]
+                v.edges.clear()
+                v.edges.update(edges)
+        return renamed
+
 
     def add_func_desc(self, name, module, entry):
         try:
@@ -127,7 +159,8 @@ class Graph :
         if type(description) == str:
             description = self.__func_descriptions.get(description)
         if type(description) == dict and description.get('module') and description.get('entry'):
-            func = self.__functions.get(description['module']).get(description['entry'])
+            functions = self.__functions.get(description['module'])
+            func = functions.get(description['entry']) if functions else registry.get(description['module'], description['entry'])
             if not func:
                 print(f'Function "{description["entry"]}" does not exist in module "{description["module"]}"')
             return func
@@ -135,6 +168,9 @@ class Graph :
         return None
 
 
+    def get_transition(self, name) -> dict:
+        return self.__transitions.get(name, {})
+
     def add_transition(self, name, processor, predicate=None):
         self.__transitions[name] = {}
         if predicate:
@@ -151,6 +187,7 @@ class Graph :
                 self.__transitions[name]['function'] = {'name' : processor, 'func' : func}
         if self.__transitions[name]:
             self.__transitions[name]['name'] = name
+            self.__transitions[name] = registry.intern_transition(self.__transitions[name])
         else:
             print(f'Transitions:\tNo corresponding funcions found for "{name}"')
             self.__transitions.pop(name)
@@ -170,7 +207,7 @@ class Graph :
 
 
     # Функция импорта графа из формата aDOT
-    def import_aDOT(self, file, clear = True, check_errors = True, from_data = False):
+    def import_aDOT(self, file, clear = True, check_errors = True, from_data = False, edges = True):
         try:
             file = open(file)
             data = file.read()
@@ -199,9 +236,9 @@ class Graph :
         select = [line for line in data if 'selector' in line]
         func = [line for line in data if 'module' in line and 'entry_func' in line]
         transition_func = [line for line in data if ('predicate' in line or 'function' in line) and line not in func]
-        graph = [line for line in data if '->' in line or '=>' in line]
+        graph = [line for line in data if '->' in line or '=>' in line] if edges else []
 
-        if check_errors and not graph:
+        if check_errors and edges and not graph:
             print('aDOT import failed. Please, check file syntax.')
             return 1
 
@@ -235,9 +272,10 @@ class Graph :
             self.add_transition(func_name, processor, predicate)
 
         for line in graph:
-            line = line.split(' ')
-            start_vertex, threading, end_vertex, morphism = line if len(line) > 3 else [*line, '']
-            morphism = morphism[morphism.find('=')+1:-1]
+            start_vertex, threading, end_vertex, *attributes = line.split(' ')
+            attributes = dict(part.split('=', 1) for part in ''.join(attributes).strip('[]').split(',') if '=' in part)
+            morphism = attributes.get('morphism', '')
+            probability = float(attributes['probability']) if 'probability' in attributes else None
             try:
                 if start_vertex != '__BEGIN__':
                     start_vertex = int(start_vertex)
@@ -247,14 +285,14 @@ class Graph :
                 print('One of vertex IDs was not an integer. Import interrupted.')
             start_vertex = self.add_vertex(id = start_vertex)
             end_vertex = self.add_vertex(id = end_vertex)
-            start_vertex.add_edge(end_vertex, threading = threading == '=>', morph = self.__transitions[morphism] if morphism in self.__transitions else {})
+            start_vertex.add_edge(end_vertex, threading = threading == '=>', morph = self.__transitions[morphism] if morphism in self.__transitions else {}, probability = probability)
 
         for line in select:
             label = int(line[:line.find(' ')])
             start = line.find('=', line.find('selector'))+1
             comma = line.find(',', start)
             bracket = line.find(']', start)
-            selector = line[start: comma if comma < bracket else bracket]
+            selector = line[start: comma if comma < bracket else bracket].strip('"')
             self.set_selector(self.__vertices[label], selector)
 
     # Функция экспорта графа в формат aDOT
@@ -276,7 +314,7 @@ class Graph :
             if verts_with_selectors:
                 file.write('\n// В узле указана функция-селектор\n')
                 for vertex in verts_with_selectors:
-                    file.write(f'\t{vertex.id} ["selector="{vertex.get_selector_name()}]\n')
+                    file.write(f'\t{vertex.id} [selector={vertex.get_selector_name()}]\n')
             
             if processors:
                 file.write('\n// Определения функций-обработчиков\n')
@@ -288,7 +326,7 @@ class Graph :
                 for func in predicates:
                     file.write(f"\t{func['name']} [module={func.get('module')}, entry_func={func.get('entry')}]\n")
 
-            edges = [{'src' : vertex.id, 'dest' : edge['next_vertex'].id, 'thread' : edge['threading'], 'morph' : edge['morph']} for vertex in self.__vertices.values() for edge in vertex.edges.values()]
+            edges = [{'src' : vertex.id, 'dest' : edge['next_vertex'].id, 'thread' : edge['threading'], 'morph' : edge['morph'], 'probability' : edge.get('probability')} for vertex in self.__vertices.values() for edge in vertex.edges.values()]
             
             file.write('\n// Определения функций перехода\n')
             morphisms = []
@@ -304,7 +342,8 @@ class Graph :
 
             file.write('\n// Описание графовой модели\n')
             for edge in edges:
-                file.write(f"\t{edge['src']} {'=>' if edge['thread'] else '->'} {edge['dest']} {'[morphism='+edge['morph']['name']+']' if edge.get('morph') else ''}\n")
+                attributes = ([f"morphism={edge['morph']['name']}"] if edge.get('morph') else []) + ([f"probability={edge['probability']}"] if edge['probability'] is not None else [])
+                file.write(f"\t{edge['src']} {'=>' if edge['thread'] else '->'} {edge['dest']} {'['+', '.join(attributes)+']' if attributes else ''}\n")
             file.write('}\n')
             file.close()
         # except:
@@ -320,6 +359,7 @@ class Graph :
                 edge_copy = edge.copy()
                 edge_copy['cur_vertex'] = vert.id
                 edge_copy['next_vertex'] = id
+                edge_copy.setdefault('probability', None)
                 edges[id] = edge_copy
             vertices[vert.id] = {"id" : vert.id, "label" : vert.label, "edges" : edges, "metadata" : vert.metadata}
 
@@ -330,6 +370,77 @@ class Graph :
         }
 
 
+    def memory_footprint(self) -> dict[str, int]:
+        """Returns approximate bytes held by the graph, by part.
+
+        `vertices` are Vertex objects with IDs, labels, notes and selectors, `edges` are edge dicts,
+        `metadata` is loaded vertex metadata (a pending loader otherwise) and `transitions` are
+        transitions and function descriptions. Objects referenced from several places are counted
+        once; functions are counted without their code, which is shared between graphs.
+        """
+        seen = set()
+        transitions = deep_size(self.__transitions, seen) + deep_size(self.__func_descriptions, seen) + deep_size(self.__functions, seen)
+        vertices = sys.getsizeof(self) + _VERTEX_ATTRIBUTES_SIZE + deep_size(self.label, seen) + deep_size(self.__vertices, seen, shallow=True)
+        for vertex in self.__vertices.values():
+            vertices += deep_size(vertex, seen) + _VERTEX_ATTRIBUTES_SIZE
+            vertices += deep_size(vertex._id, seen) + deep_size(vertex._label, seen) + deep_size(vertex._selector, seen) + deep_size(vertex._notes, seen)
+        edges = sum(deep_size(vertex.edges, seen) for vertex in self.__vertices.values())
+        metadata = sum(deep_size(vertex._metadata, seen) for vertex in self.__vertices.values())
+        return {
+            'vertices' : vertices,
+            'edges' : edges,
+            'metadata' : metadata,
+            'transitions' : transitions,
+            'total' : vertices + edges + metadata + transitions,
+        }
+
+
+    def dump_state(self) -> dict:
+        """Returns graph contents as plain data, with functions referenced by name only.
+        Metadata of vertices that was not loaded yet is stored as None."""
+        transitions = []
+        for transition in self.__transitions.values():
+            predicate = transition.get('predicate')
+            function = transition.get('function')
+            transitions.append((transition['name'], function['name'] if function else None, predicate['name'] if predicate else None))
+        return {
+            'id' : self._id,
+            'label' : self.label,
+            'functions' : [func.copy() for func in self.__func_descriptions.values()],
+            'transitions' : transitions,
+            'vertices' : [(vertex.id, vertex.label, vertex.metadata if vertex.metadata_loaded else None) for vertex in self.__vertices.values()],
+            'edges' : [(vertex.id, id, edge.get('threading', False), edge['morph'].get('name') if edge.get('morph') else None, edge.get('probability'))
+                       for vertex in self.__vertices.values() for id, edge in vertex.edges.items()],
+            'selectors' : [(vertex.id, vertex.get_selector_name()) for vertex in self.__vertices.values() if vertex.get_selector_name()],
+        }
+
+    def load_state(self, state : dict, lazy_metadata = None):
+        """Restores graph contents from `dump_state` result, resolving functions of this graph.
+
+        Args:
+            state (dict): Result of `dump_state`.
+            lazy_metadata (Callable, optional): Called with vertex ID for vertices without stored metadata,
+                result is used as vertex metadata. Defaults to None.
+        """
+        self.label = state['label']
+        for func in state['functions']:
+            self.add_func_desc(func['name'], func['module'], func['entry'])
+        for name, processor, predicate in state['transitions']:
+            self.add_transition(name, processor, predicate)
+        for id, label, metadata in state['vertices']:
+            if metadata is None:
+                metadata = lazy_metadata(id) if lazy_metadata else {}
+            vertex = self.vertex_exists(id, False)
+            if vertex:
+                vertex.metadata = metadata
+            else:
+                self.__vertices[id] = Vertex(id, label, metadata=metadata)
+        for src, dst, threading, morph, probability in state['edges']:
+            self.__vertices[src].add_edge(self.__vertices[dst], threading=threading, morph=self.get_transition(morph), probability=probability)
+        for id, selector in state['selectors']:
+            self.set_selector(self.__vertices[id], selector)
+
+
     def __run_edge(self, vertex : Vertex, next_vertex : Vertex):
         edge = vertex.get_edge(next_vertex)
         if edge.get('morph'):
@@ -353,6 +464,11 @@ class Graph :
             print(cur_vertex.id, '->', next_vertex.id)
             cur_vertex = next_vertex
 
+    def compile_walk(self) -> CompiledWalk:
+        """Returns a plan doing what `walk_graph` does, for graphs walked many times."""
+        selectors = {vertex.id : self.__get_func(vertex.get_selector_name()) for vertex in self.__vertices.values() if vertex.get_selector_name()}
+        return CompiledWalk(self, selectors)
+
 
     def get_priorities(self, start_vertex : Vertex = None, end_vertex : Vertex | str = '__END__'):
         visited = set()
@@ -401,3 +517,30 @@ class Graph :
                 priorities.append(endpoint)
 
         return priorities
+
+
+# Attribute values of a vertex are kept in an array outside of the object until its __dict__ is
+# accessed, and sys.getsizeof(vertex) leaves it out. Measured with tracemalloc on CPython 3.11, the array
+# of a class with 6 to 13 attributes is a pointer per attribute, a spare one and a 16 byte prefix.
+# Attributes are counted on a spare vertex, vars() of every vertex would allocate a dict for each of them
+_VERTEX_ATTRIBUTES_SIZE = struct.calcsize('P') * (len(vars(Vertex(0))) + 3)
+
+def deep_size(obj, seen : set | None = None, shallow : bool = False) -> int:
+    """Bytes of an object with the dicts, lists, tuples and sets it holds and their values,
+    skipping objects in `seen`. Only the object itself is counted if `shallow`."""
+    if seen is None:
+        seen = set()
+    if obj is None or obj is True or obj is False or id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if shallow:
+        return size
+    if type(obj) == dict:
+        for key, value in obj.items():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif type(obj) in (list, tuple, set, frozenset):
+        for item in obj:
+            size += deep_size(item, seen)
+    return size
+
@@ -0,0 +1,154 @@
+import numpy as np
+
+from .graph import Graph
+
+
+def _reversed_edges(count : int, successors : list[list[int]], roots : list[int]) -> set[tuple[int, int]]:
+    """Back edges of a depth-first search, reversing them makes the graph acyclic."""
+    state = [0] * count  # 0 - new, 1 - on stack, 2 - done
+    back = set()
+    for root in roots + list(range(count)):
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [(root, iter(successors[root]))]
+        while stack:
+            vertex, children = stack[-1]
+            for child in children:
+                if state[child] == 1:
+                    back.add((vertex, child))
+                elif not state[child]:
+                    state[child] = 1
+                    stack.append((child, iter(successors[child])))
+                    break
+            else:
+                state[vertex] = 2
+                stack.pop()
+    return back
+
+
+def _longest_path_layers(count : int, edges : list[tuple[int, int]]) -> list[int]:
+    successors = [[] for _ in range(count)]
+    incoming = [0] * count
+    for src, dst in edges:
+        successors[src].append(dst)
+        incoming[dst] += 1
+    layers = [0] * count
+    queue = [vertex for vertex in range(count) if not incoming[vertex]]
+    while queue:
+        vertex = queue.pop()
+        for child in successors[vertex]:
+            layers[child] = max(layers[child], layers[vertex] + 1)
+            incoming[child] -= 1
+            if not incoming[child]:
+                queue.append(child)
+    return layers
+
+
+def _group(items : np.ndarray, layers : np.ndarray, depth : int) -> list[np.ndarray]:
+    """Splits items by layer, keeping their relative order."""
+    ordered = np.argsort(layers, kind='stable')
+    bounds = np.searchsorted(layers[ordered], np.arange(1, depth))
+    return np.split(items[ordered], bounds)
+
+
+def _sweep(order : list[np.ndarray], position : np.ndarray, layer_edges : list[tuple[np.ndarray, np.ndarray]]) -> bool:
+    """Reorders layers after the first one by barycenters of their neighbours in the previous layer.
+    `layer_edges[i]` holds neighbour and own node indexes of edges into `order[i]`."""
+    changed = False
+    for nodes, (neighbours, own) in zip(order[1:], layer_edges[1:]):
+        if not neighbours.size:
+            continue
+        # Positions are kept equal to indexes within layers
+        local = position[own].astype(np.int64)
+        sums = np.bincount(local, weights=position[neighbours], minlength=nodes.size)
+        counts = np.bincount(local, minlength=nodes.size)
+        current = position[nodes]
+        barycenters = np.where(counts > 0, sums / np.maximum(counts, 1), current)
+        ranks = np.lexsort((current, barycenters))
+        if (ranks != np.arange(nodes.size)).any():
+            changed = True
+            nodes[:] = nodes[ranks]
+        position[nodes] = np.arange(nodes.size)
+    return changed
+
+
+def layered_layout(graph : Graph, previous : dict | None = None, sweeps : int = 8, warm_sweeps : int = 2) -> dict:
+    """Computes a layered (Sugiyama-style) drawing of the graph.
+
+    Vertices get integer layers (`y`) by longest path from sources, with edges closing cycles
+    reversed for layering; edges longer than one layer get bend points. Order in layers (`x`)
+    is improved by alternating downward and upward barycenter sweeps. With `previous` layout of
+    the same graph, its order is the starting point and only `warm_sweeps` sweeps are made.
+    """
+    ids = graph.get_vertices_IDs()
+    index = {id : i for i, id in enumerate(ids)}
+    count = len(ids)
+    edges = [(index[vertex_id], index[next_id]) for vertex_id in ids for next_id in graph.get_vertex(vertex_id).edges if next_id != vertex_id]
+
+    successors = [[] for _ in range(count)]
+    for src, dst in edges:
+        successors[src].append(dst)
+    back = _reversed_edges(count, successors, [index['__BEGIN__']])
+    acyclic = [(dst, src) if (src, dst) in back else (src, dst) for src, dst in edges]
+    layers = _longest_path_layers(count, acyclic)
+    end = index['__END__']
+    layers[end] = max(layers)
+
+    # Edges spanning several layers go through dummy nodes, one per layer
+    layer_of = list(layers)
+    chains = []
+    proper = []
+    for src, dst in set(acyclic):
+        chain = [src]
+        for layer in range(layers[src] + 1, layers[dst]):
+            layer_of.append(layer)
+            chain.append(len(layer_of) - 1)
+        chain.append(dst)
+        proper.extend(zip(chain, chain[1:]))
+        chains.append(chain)
+    nodes = len(layer_of)
+    layer_of = np.array(layer_of, dtype=np.int64)
+    depth = int(layer_of.max()) + 1 if nodes else 0
+
+    # Initial order: previous x of known vertices, otherwise order of creation
+    position = np.arange(nodes, dtype=np.float64)
+    if previous:
+        known = {vertex['id'] : vertex['x'] for vertex in previous['vertices']}
+        for i, id in enumerate(ids):
+            if id in known:
+                position[i] = known[id] - nodes
+    order = _group(np.arange(nodes), layer_of, depth)
+    for layer, members in enumerate(order):
+        order[layer] = members[np.argsort(position[members], kind='stable')]
+        position[order[layer]] = np.arange(members.size)
+
+    proper = np.array(proper, dtype=np.int64).reshape(-1, 2)
+    by_layer = _group(proper, layer_of[proper[:, 0]], depth)
+    empty = np.empty(0, np.int64)
+    down = [(empty, empty)] + [(edges[:, 0], edges[:, 1]) for edges in by_layer[:-1]]
+    up = [(edges[:, 1], edges[:, 0]) for edges in reversed(by_layer)]
+
+    for _ in range(warm_sweeps if previous else sweeps):
+        changed = _sweep(order, position, down)
+        reversed_order = order[::-1]
+        changed = _sweep(reversed_order, position, up) or changed
+        if not changed:
+            break
+
+    x = np.empty(nodes)
+    for members in order:
+        x[members] = np.arange(members.size) - (members.size - 1) / 2
+    edge_points = {}
+    for chain in chains:
+        points = [[float(x[node]), int(layer_of[node])] for node in chain[1:-1]]
+        if (chain[-1], chain[0]) in back:
+            edge_points[ids[chain[-1]], ids[chain[0]]] = points[::-1]
+        if (chain[0], chain[-1]) not in back:
+            edge_points[ids[chain[0]], ids[chain[-1]]] = points
+    return {
+        'vertices' : [{'id' : id, 'x' : float(x[i]), 'y' : int(layer_of[i])} for i, id in enumerate(ids)],
+        'edges' : [{'src' : ids[src], 'dst' : ids[dst], 'points' : edge_points[ids[src], ids[dst]]} for src, dst in edges],
+        'width' : max((members.size for members in order), default=0),
+        'height' : depth,
+    }
@@ -0,0 +1,103 @@
+from collections import OrderedDict
+from importlib import import_module
+from importlib.metadata import entry_points
+from threading import RLock
+
+# Modules named in aDOT function descriptions: built-in implementation and its function dict
+BUILTIN_MODULES = {
+    'select_module' : ('.select_module', 'selectors'),
+    'predicate_module' : ('.predicate_module', 'predicates'),
+    'processor_module' : ('.processor_module', 'processors'),
+}
+# Installed packages add functions with entry points in groups like `graph_api.select_module`
+ENTRY_POINT_PREFIX = 'graph_api.'
+# Interned transitions kept, their names come from uploaded files
+MAX_TRANSITIONS = 4096
+
+
+class FunctionRegistry:
+    '''Process-wide selector, predicate and processor functions used by every `Graph`.
+
+    Built-in modules are imported and plugin entry points loaded on first use of a function.
+    Only built-in modules, plugin groups and modules with registered functions are kept,
+    other module names found in files resolve to nothing. Resolved transitions are interned:
+    graphs share one transition dict per distinct morphism, so it must not be modified.
+    At most `max_transitions` recently used ones are kept.
+    '''
+
+    def __init__(self, max_transitions : int = MAX_TRANSITIONS) -> None:
+        self._functions : dict[str, dict] = {}
+        self._plugins : dict[str, dict] = {}
+        self._groups : set[str] | None = None
+        self._transitions : OrderedDict[tuple, dict] = OrderedDict()
+        self.max_transitions = max_transitions
+        self._lock = RLock()
+
+    def _plugin_modules(self) -> set[str]:
+        if self._groups is None:
+            self._groups = {group[len(ENTRY_POINT_PREFIX):] for group in entry_points().groups if group.startswith(ENTRY_POINT_PREFIX)}
+        return self._groups
+
+    def _module(self, module : str, create : bool = False) -> dict:
+        functions = self._functions.get(module)
+        if functions is not None:
+            return functions
+        with self._lock:
+            if module not in self._functions:
+                if not create and module not in BUILTIN_MODULES and module not in self._plugin_modules():
+                    return {}
+                functions = {}
+                if module in BUILTIN_MODULES:
+                    path, attribute = BUILTIN_MODULES[module]
+                    functions.update(getattr(import_module(path, __package__), attribute))
+                self._plugins[module] = {point.name : point for point in entry_points(group=ENTRY_POINT_PREFIX + module)
+                                         if point.name not in functions}
+                self._functions[module] = functions
+            return self._functions[module]
+
+    def get(self, module : str, entry : str):
+        functions = self._module(module)
+        func = functions.get(entry)
+        if func is None and entry in self._plugins.get(module, {}):
+            with self._lock:
+                point = self._plugins[module].pop(entry, None)
+                if point:
+                    try:
+                        functions[entry] = point.load()
+                    except Exception as error:
+                        print(f'Plugin function "{entry}" of module "{module}" failed to load: {error}')
+                func = functions.get(entry)
+        return func
+
+    def register(self, module : str, entry : str, func):
+        self._module(module, create=True)[entry] = func
+
+    def functions(self, module : str) -> dict:
+        """All functions of a module, plugins are loaded."""
+        functions = self._module(module)
+        for entry in list(self._plugins.get(module, {})):
+            self.get(module, entry)
+        return dict(functions)
+
+    def preload(self) -> int:
+        """Loads all built-in modules and plugins, returns the number of functions."""
+        return sum(len(self.functions(module)) for module in set(BUILTIN_MODULES) | self._plugin_modules())
+
+    def intern_transition(self, transition : dict) -> dict:
+        predicate = transition.get('predicate')
+        function = transition.get('function')
+        key = (transition.get('name'),
+               (predicate['name'], predicate['func']) if predicate else None,
+               (function['name'], function['func']) if function else None)
+        with self._lock:
+            shared = self._transitions.get(key)
+            if shared is None:
+                shared = self._transitions[key] = transition
+                if len(self._transitions) > self.max_transitions:
+                    self._transitions.popitem(last=False)
+            else:
+                self._transitions.move_to_end(key)
+        return shared
+
+
+registry = FunctionRegistry()
@@ -1,15 +1,33 @@
+import random
+
 from .vertex import Vertex
 
+
+def edge_weight(edge : dict) -> float:
+    probability = edge.get('probability')
+    return 1.0 if probability is None else probability
+
 def select1(vertex : Vertex):
     visited = []
+    visited_ids = set()
     def visit():
         for edge in sorted(vertex.edges.values(), key=lambda x : str(x['next_vertex'])):
             target = edge['next_vertex']
-            if target not in visited:
+            if target.id not in visited_ids:
                 visited.append(target)
+                visited_ids.add(target.id)
                 return(target)
         return visited[0]
     return visit
 
+def select_weighted(vertex : Vertex):
+    def select():
+        edges = list(vertex.edges.values())
+        weights = [edge_weight(edge) for edge in edges]
+        if sum(weights) <= 0:
+            weights = None
+        return random.choices(edges, weights)[0]['next_vertex']
+    return select
+
 default = select1
-selectors = {'select1' : select1}
\ No newline at end of file
+selectors = {'select1' : select1, 'select_weighted' : select_weighted}
\ No newline at end of file
@@ -0,0 +1,85 @@
+import numpy as np
+
+from .graph import Graph
+from .select_module import edge_weight
+
+
+class WalkSimulation:
+    '''Monte-Carlo estimate of how walks go through a graph, computed for many walks at once.
+
+    The graph is compiled to a transition table in CSR form. As in `Graph.walk_graph`,
+    vertices without a selector follow their first edge. Vertices with a selector pick
+    an outgoing edge at random in proportion to its weight: `weights[(src, dst)]` if given,
+    otherwise the edge's `probability`, otherwise 1. This is exactly how `select_weighted`
+    chooses; deterministic selectors such as `select1` are approximated by a random choice.
+    '''
+
+    def __init__(self, graph : Graph, weights : dict[tuple, float] | None = None) -> None:
+        weights = weights or {}
+        self.ids = graph.get_vertices_IDs()
+        index = {id : i for i, id in enumerate(self.ids)}
+        self.begin = index['__BEGIN__']
+        self.end = index['__END__']
+
+        indptr = [0]
+        indices = []
+        cumulative = []
+        for i, id in enumerate(self.ids):
+            vertex = graph.get_vertex(id)
+            edges = list(vertex.edges.items()) if id != '__END__' else []
+            if edges and not vertex.get_selector_name():
+                edges = edges[:1]
+            row = [weights.get((id, dst), edge_weight(edge)) for dst, edge in edges]
+            total = sum(row)
+            if total <= 0:
+                row, total = [1.0] * len(edges), float(len(edges))
+            running = 0.0
+            for (dst, edge), weight in zip(edges, row):
+                running += weight / total
+                indices.append(index[dst])
+                # Rows are offset by their index, so one sorted array serves every row
+                cumulative.append(i + running)
+            if edges:
+                cumulative[-1] = i + 1.0
+            indptr.append(len(indices))
+
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.cumulative = np.array(cumulative, dtype=np.float64)
+        self.absorbing = np.diff(self.indptr) == 0
+
+    def run(self, walks : int, max_steps : int = 10000, seed : int | None = None) -> dict:
+        rng = np.random.default_rng(seed)
+        vertices = len(self.ids)
+        visits = np.zeros(vertices, dtype=np.int64)
+        visits[self.begin] = walks
+        current = np.full(walks, self.begin, dtype=np.int64)
+        ended = stuck = 0
+        ended_steps = 0
+
+        step = 0
+        while True:
+            # Walks stop at __END__ and at dead ends, including an edgeless __BEGIN__
+            done = self.absorbing[current]
+            if done.any():
+                reached = current[done] == self.end
+                finished = int(reached.sum())
+                ended += finished
+                ended_steps += finished * step
+                stuck += int(done.sum()) - finished
+                current = current[~done]
+            if not current.size or step >= max_steps:
+                break
+            step += 1
+            positions = np.searchsorted(self.cumulative, current + rng.random(current.size), side='right')
+            current = self.indices[positions]
+            visits += np.bincount(current, minlength=vertices)
+
+        return {
+            'walks' : walks,
+            'end_probability' : ended / walks,
+            'stuck_probability' : stuck / walks,
+            'truncated_probability' : current.size / walks,
+            'expected_length' : ended_steps / ended if ended else None,
+            'visits' : {id : int(visits[i]) / walks for i, id in enumerate(self.ids)},
+        }
@@ -24,7 +24,8 @@ class Vertex :
             label (str, optional): label of a vertex. Defaults to None.
             pos (list[2], optional): position of a vertex. Defaults to None.
             selector (dict, optional): selector function associated with vertex. Defaults to {}.
-            metadata (dict, optional): field for description, date of creation, etc. Defaults to {}.
+            metadata (dict | Callable[[], dict], optional): field for description, date of creation, etc.
+                A callable is invoked on first access, so metadata can be loaded lazily. Defaults to {}.
         """
         self._id = id
         self._label = str(label) if label else str(self._id)
@@ -32,7 +33,7 @@ class Vertex :
         self._edges : dict[str, dict] = {}
         self._selector = selector
 
-        self.metadata = metadata
+        self._metadata = metadata
         self._notes = {}
 
     def __eq__(self, vertex : Vertex) -> bool:
@@ -54,13 +55,29 @@ class Vertex :
         if _check_type(label, 'label', str):
             self._label = label
 
+    @property
+    def metadata(self) -> dict:
+        if callable(self._metadata):
+            self._metadata = self._metadata()
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, metadata : dict):
+        self._metadata = metadata
+
+    @property
+    def metadata_loaded(self) -> bool:
+        return not callable(self._metadata)
+
     @property
     def edges(self):
         return self._edges
 
-    def add_edge(self, next_vertex : Vertex, morph : dict = {}, threading : bool = False, **kwargs):
+    def add_edge(self, next_vertex : Vertex, morph : dict = {}, threading : bool = False, probability : float | None = None, **kwargs):
         if _check_type(next_vertex, 'next_vertex', Vertex):
             self._edges[next_vertex.id] = {'next_vertex' : next_vertex, 'threading': threading}
+            if probability is not None:
+                self._edges[next_vertex.id]['probability'] = probability
             self.set_morph(next_vertex, morph)
 
     def get_edge(self, next_vertex : Vertex | str | int, verbose = True) -> dict | None:
@@ -0,0 +1,125 @@
+import asyncio
+import inspect
+from typing import AsyncIterator
+
+from .graph import Graph
+from .vertex import Vertex
+
+
+async def _call(func, *args):
+    # Coroutine functions run on the loop, plain functions in a thread so blocking I/O doesn't stall it
+    if inspect.iscoroutinefunction(func):
+        return await func(*args)
+    result = await asyncio.to_thread(func, *args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class AsyncWalker:
+    '''Walks a graph from `__BEGIN__` to `__END__` the way `Graph.walk_graph` does,
+    accepting both plain and `async def` selector, predicate and processor functions.
+
+    The path only depends on selectors, so it is chosen ahead of edge processing and up to
+    `concurrency` edges are processed at the same time. Edges leading to the same vertex
+    are processed in walk order. `walk` yields events:
+
+        {'event' : 'transition', 'step' : n, 'from' : id, 'to' : id}
+        {'event' : 'processed', 'step' : n, 'from' : id, 'to' : id}
+        {'event' : 'error', 'step' : n, 'detail' : str}
+        {'event' : 'end', 'steps' : n}
+
+    The walk stops after the first error or once `max_steps` transitions were made.
+    '''
+
+    def __init__(self, graph : Graph, concurrency : int = 8, max_steps : int = 10000) -> None:
+        self.graph = graph
+        self.concurrency = concurrency
+        self.max_steps = max_steps
+
+    async def _next_vertex(self, vertex : Vertex) -> Vertex:
+        if vertex.selector:
+            next_vertex = vertex.selector()
+            if inspect.isawaitable(next_vertex):
+                next_vertex = await next_vertex
+            return next_vertex
+        if not vertex.edges:
+            raise ValueError(f'Vertex {vertex.id} has no outgoing edges')
+        return next(iter(vertex.edges.values()))['next_vertex']
+
+    async def _run_edge(self, vertex : Vertex, next_vertex : Vertex, previous : asyncio.Task | None):
+        if previous:
+            await asyncio.wait([previous])
+        morph = vertex.get_edge(next_vertex).get('morph')
+        if not morph:
+            return
+        pred = morph.get('predicate')
+        proc = morph.get('function')
+        if pred:
+            args = await _call(pred['func'], self.graph, vertex, next_vertex)
+            if proc and args:
+                await _call(proc['func'], *args)
+
+    async def walk(self) -> AsyncIterator[dict]:
+        cur_vertex = self.graph.get_vertex('__BEGIN__')
+        end_vertex = self.graph.get_vertex('__END__')
+        if not cur_vertex or not end_vertex:
+            raise ValueError('Graph has no __BEGIN__ or __END__ vertex')
+
+        slots = asyncio.Semaphore(self.concurrency)
+        finished : asyncio.Queue[dict] = asyncio.Queue()
+        tasks : set[asyncio.Task] = set()
+        # Last task processing an edge into each vertex
+        last_into : dict[int | str, asyncio.Task] = {}
+        failed = False
+
+        async def process(step, vertex, next_vertex, previous):
+            event = {'step' : step, 'from' : vertex.id, 'to' : next_vertex.id}
+            try:
+                await self._run_edge(vertex, next_vertex, previous)
+                finished.put_nowait({'event' : 'processed', **event})
+            except Exception as error:
+                finished.put_nowait({'event' : 'error', **event, 'detail' : str(error)})
+            finally:
+                slots.release()
+
+        def drain():
+            nonlocal failed
+            while not finished.empty():
+                event = finished.get_nowait()
+                failed = failed or event['event'] == 'error'
+                yield event
+
+        step = 0
+        try:
+            while cur_vertex != end_vertex and not failed:
+                if step >= self.max_steps:
+                    yield {'event' : 'error', 'step' : step, 'detail' : f'__END__ was not reached in {self.max_steps} steps'}
+                    break
+                try:
+                    next_vertex = await self._next_vertex(cur_vertex)
+                except Exception as error:
+                    yield {'event' : 'error', 'step' : step, 'detail' : str(error)}
+                    break
+                await slots.acquire()
+                for event in drain():
+                    yield event
+                if failed:
+                    slots.release()
+                    break
+                step += 1
+                yield {'event' : 'transition', 'step' : step, 'from' : cur_vertex.id, 'to' : next_vertex.id}
+                task = asyncio.create_task(process(step, cur_vertex, next_vertex, last_into.get(next_vertex.id)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                last_into[next_vertex.id] = task
+                cur_vertex = next_vertex
+
+            if tasks:
+                await asyncio.wait(list(tasks))
+            for event in drain():
+                yield event
+            yield {'event' : 'end', 'steps' : step}
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,287 @@
+import hmac
+import json
+import os
+import pickle
+import struct
+from collections import OrderedDict
+from datetime import datetime
+from multiprocessing import resource_tracker, shared_memory
+from threading import Lock
+
+from . import config
+
+# Header of a shared segment: ready flag, ID of the process that created it and payload length
+_HEADER = struct.Struct('<?3xIQ')
+_SHM_DIRECTORY = '/dev/shm'
+
+
+def version_key(version : datetime | None) -> int:
+    return int(version.timestamp() * 1_000_000) if version else 0
+
+
+# Shared segments can be read by other processes, they hold JSON instead of pickles
+def _default(value):
+    if isinstance(value, datetime):
+        return {'__datetime__' : value.isoformat()}
+    raise TypeError(f'{type(value).__name__} is not stored in shared segments')
+
+def _encode(state) -> bytes:
+    return json.dumps(state, separators=(',', ':'), default=_default).encode()
+
+def _datetime(value : dict):
+    return datetime.fromisoformat(value['__datetime__']) if len(value) == 1 and '__datetime__' in value else value
+
+def _decode(data : bytes):
+    return json.loads(data, object_hook=_datetime)
+
+
+class GraphCache:
+    '''Keeps parsed graphs as `Graph.dump_state` results, keyed by project, load profile and version.
+    Every `get` returns a new copy, so callers may change loaded graphs.'''
+
+    def get(self, pid : int, version : datetime | None, profile : str) -> dict | None:
+        return None
+
+    def put(self, pid : int, version : datetime | None, profile : str, state : dict):
+        pass
+
+    def invalidate(self, pid : int):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class LocalGraphCache(GraphCache):
+    '''LRU cache inside of a single worker process, of at most `size` graphs and `max_bytes` bytes.'''
+
+    def __init__(self, size : int, max_bytes : int) -> None:
+        self.size = size
+        self.max_bytes = max_bytes
+        self._entries : OrderedDict[tuple, tuple[int, bytes]] = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+
+    def get(self, pid, version, profile):
+        with self._lock:
+            entry = self._entries.get((pid, profile))
+            if not entry or entry[0] != version_key(version):
+                return None
+            self._entries.move_to_end((pid, profile))
+        return pickle.loads(entry[1])
+
+    def put(self, pid, version, profile, state):
+        data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove((pid, profile))
+            self._entries[pid, profile] = (version_key(version), data)
+            self._bytes += len(data)
+            while len(self._entries) > self.size or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key : tuple):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._bytes -= len(entry[1])
+
+    def invalidate(self, pid):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == pid]:
+                self._remove(key)
+
+
+def _alive(pid : int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedGraphCache(GraphCache):
+    '''Cache shared by all worker processes on a host, one shared memory segment per graph version.
+
+    Segments are immutable: a version is written once by the first worker that parsed it
+    and is marked ready only after the payload is complete. Readers look segments up by
+    the version they got from the database, so stale versions are never read.
+
+    A writer removes older versions of the graph it stores, then the least recently read
+    segments while there are more than `size` of them or they take more than `max_bytes`;
+    readers mark use by touching the segment file. Segments of processes that are gone
+    are removed when a worker starts, and a stopping worker removes its own as well.
+
+    Segment names depend on `SECRET_KEY`, and segments that other users created or could
+    write are not read.
+    '''
+
+    def __init__(self, namespace : str, size : int, max_bytes : int, min_free : float = 0.1) -> None:
+        self.prefix = 'gapi_' + hmac.new(config.SECRET_KEY.encode(), namespace.encode(), 'sha256').hexdigest()[:16]
+        self.size = size
+        self.max_bytes = max_bytes
+        self.min_free = min_free
+        self.remove_orphans()
+
+    def _name(self, pid, version, profile) -> str:
+        return f'{self.prefix}_{pid}_{profile}_{version_key(version)}'
+
+    @staticmethod
+    def _path(name : str) -> str:
+        return os.path.join(_SHM_DIRECTORY, name)
+
+    @staticmethod
+    def _open(name : str, **kwargs) -> shared_memory.SharedMemory:
+        segment = shared_memory.SharedMemory(name, **kwargs)
+        # Segments must outlive the process that created or attached them
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+    def _unlink(self, name : str):
+        # Same as shm_unlink, without attaching the segment
+        try:
+            os.unlink(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def _segments(self) -> list[tuple[str, int, str, int]]:
+        """Names of segments of this cache with their project ID, profile and version."""
+        try:
+            names = os.listdir(_SHM_DIRECTORY)
+        except OSError:
+            return []
+        segments = []
+        for name in names:
+            if not name.startswith(self.prefix + '_'):
+                continue
+            parts = name[len(self.prefix) + 1:].split('_')
+            if len(parts) == 3 and parts[0].isdigit() and parts[2].isdigit():
+                segments.append((name, int(parts[0]), parts[1], int(parts[2])))
+        return segments
+
+    def _owner(self, name : str) -> int | None:
+        try:
+            file = os.open(self._path(name), os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            header = os.pread(file, _HEADER.size, 0)
+        finally:
+            os.close(file)
+        return _HEADER.unpack(header)[1] if len(header) == _HEADER.size else 0
+
+    def get(self, pid, version, profile):
+        name = self._name(pid, version, profile)
+        try:
+            file = os.open(self._path(name), os.O_RDONLY | os.O_NOFOLLOW)
+        except OSError:
+            return None
+        try:
+            stats = os.fstat(file)
+            if stats.st_uid != os.getuid() or stats.st_mode & 0o777 != 0o600:
+                return None
+            header = os.pread(file, _HEADER.size, 0)
+            if len(header) != _HEADER.size:
+                return None
+            ready, owner, length = _HEADER.unpack(header)
+            if not ready:
+                return None
+            data = os.pread(file, length, _HEADER.size)
+            if len(data) != length:
+                return None
+            state = _decode(data)
+        except ValueError:
+            return None
+        finally:
+            os.close(file)
+        try:
+            os.utime(self._path(name))
+        except OSError:
+            pass
+        return state
+
+    def _has_space(self, size : int) -> bool:
+        # Writing past the end of a full tmpfs kills the process with SIGBUS instead of raising
+        try:
+            stats = os.statvfs(_SHM_DIRECTORY)
+        except OSError:
+            return True
+        return (stats.f_bavail * stats.f_frsize - size) > self.min_free * stats.f_blocks * stats.f_frsize
+
+    def _evict(self, segments : list, pid : int, profile : str, key : int, size : int):
+        """Removes older versions of the graph, then least recently used segments until one of `size` bytes fits."""
+        kept = []
+        for name, segment_pid, segment_profile, segment_key in segments:
+            if (segment_pid, segment_profile) == (pid, profile) and segment_key < key:
+                self._unlink(name)
+                continue
+            try:
+                stats = os.stat(self._path(name))
+            except FileNotFoundError:
+                continue
+            kept.append((stats.st_mtime, stats.st_size, name))
+        kept.sort()
+        count, total = len(kept) + 1, sum(segment_size for _, segment_size, _ in kept) + size
+        for _, segment_size, name in kept:
+            if count <= self.size and total <= self.max_bytes:
+                break
+            self._unlink(name)
+            count -= 1
+            total -= segment_size
+
+    def put(self, pid, version, profile, state):
+        try:
+            data = _encode(state)
+        except (TypeError, ValueError):
+            return
+        size = _HEADER.size + len(data)
+        if size > self.max_bytes:
+            return
+        key = version_key(version)
+        segments = self._segments()
+        # A newer version was stored meanwhile, this one would never be read
+        if any((segment_pid, segment_profile) == (pid, profile) and segment_key > key for _, segment_pid, segment_profile, segment_key in segments):
+            return
+        self._evict(segments, pid, profile, key, size)
+        if not self._has_space(size):
+            return
+        try:
+            segment = self._open(self._name(pid, version, profile), create=True, size=size)
+        except FileExistsError:
+            return
+        try:
+            _HEADER.pack_into(segment.buf, 0, False, os.getpid(), 0)
+            segment.buf[_HEADER.size:size] = data
+            _HEADER.pack_into(segment.buf, 0, True, os.getpid(), len(data))
+        finally:
+            segment.close()
+
+    def invalidate(self, pid):
+        for name, segment_pid, profile, key in self._segments():
+            if segment_pid == pid:
+                self._unlink(name)
+
+    def remove_orphans(self, own : bool = False):
+        """Removes segments of processes that are gone, and with `own` those of this process."""
+        for name, *_ in self._segments():
+            owner = self._owner(name)
+            if owner is not None and ((own and owner == os.getpid()) or not _alive(owner)):
+                self._unlink(name)
+
+    def shutdown(self):
+        self.remove_orphans(own=True)
+
+
+def create_cache(backend : str) -> GraphCache:
+    if backend == 'local':
+        return LocalGraphCache(config.GRAPH_CACHE_SIZE, config.GRAPH_CACHE_BYTES)
+    if backend == 'shared':
+        return SharedGraphCache(config.SQLALCHEMY_DATABASE_URL + config.SAVE_DIRECTORY, config.GRAPH_CACHE_SIZE, config.GRAPH_CACHE_BYTES)
+    return GraphCache()
+
+
+graph_cache : GraphCache = create_cache(config.GRAPH_CACHE)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class GraphEdgeBase(BaseModel):
     cur_vertex : int | str
@@ -7,10 +7,14 @@ class GraphEdgeBase(BaseModel):
 class GraphEdge(GraphEdgeBase):
     threading : bool = False
     morph : dict = {}
+    probability : float | None = Field(None, ge=0)
 
 class GraphEdgeDesc(GraphEdgeBase):
     pass
 
+class GraphEdgeWeight(GraphEdgeBase):
+    probability : float = Field(ge=0)
+
 
 class GraphNode(BaseModel):
     id : int | str
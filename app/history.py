@@ -0,0 +1,299 @@
+import argparse
+import json
+import zlib
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .graph.graph import Graph
+from .sql_app import models
+from . import config
+
+# Node metadata kept in history, update times would make every save touch every vertex
+HISTORY_METADATA = ('node_description', 'node_created')
+
+
+def _encode(data) -> bytes:
+    return zlib.compress(json.dumps(data, separators=(',', ':'), default=lambda value : value.isoformat()).encode())
+
+def _decode(data : bytes):
+    return json.loads(zlib.decompress(data))
+
+
+def _metadata(metadata : dict | None) -> dict:
+    return {key : metadata[key] for key in HISTORY_METADATA if metadata and key in metadata}
+
+def _morph(morph : dict | None) -> list | None:
+    if not morph or not morph.get('name'):
+        return None
+    function = morph.get('function')
+    predicate = morph.get('predicate')
+    return [morph['name'], function['name'] if function else None, predicate['name'] if predicate else None]
+
+
+def node_vertex(node : models.Node) -> list:
+    return [node.node_id, node.node_label, _metadata({'node_description' : node.node_description, 'node_created' : node.node_created})]
+
+def edge_row(vertex, edge : dict) -> list:
+    row = [vertex.id, edge['next_vertex'].id, bool(edge.get('threading')), _morph(edge.get('morph'))]
+    # Probability is appended only when set, rows stored before edges had one keep four items
+    return row + [edge['probability']] if edge.get('probability') is not None else row
+
+def graph_edges(graph : Graph) -> dict[tuple, list]:
+    vertices = [graph.get_vertex(id) for id in graph.get_vertices_IDs()]
+    return {(vertex.id, next_id) : edge_row(vertex, edge) for vertex in vertices for next_id, edge in vertex.edges.items()}
+
+
+def graph_state(graph : Graph) -> dict:
+    """History state of a fully loaded project graph."""
+    state = graph.dump_state()
+    return {
+        'label' : state['label'],
+        'functions' : state['functions'],
+        'selectors' : state['selectors'],
+        'vertices' : {id : [label, _metadata(metadata)] for id, label, metadata in state['vertices']},
+        'edges' : graph_edges(graph),
+    }
+
+
+def edge_delta(before : Graph, after : Graph) -> dict:
+    """Edge, function and selector changes turning `before` into `after`. An edge with changed
+    attributes is deleted and added again."""
+    old, new = graph_edges(before), graph_edges(after)
+    delta = {
+        'edges_deleted' : [list(pair) for pair, row in old.items() if new.get(pair) != row],
+        'edges_added' : [row for pair, row in new.items() if old.get(pair) != row],
+    }
+    old_state, new_state = before.dump_state(), after.dump_state()
+    for key in ['functions', 'selectors']:
+        if old_state[key] != new_state[key]:
+            delta[key] = new_state[key]
+    return delta
+
+
+def initial_delta(state : dict) -> dict:
+    """Change turning an empty project into `state`."""
+    return {
+        'label' : state['label'],
+        'functions' : state['functions'],
+        'selectors' : state['selectors'],
+        'vertices_added' : [[id, label, metadata] for id, (label, metadata) in state['vertices'].items() if id not in ('__BEGIN__', '__END__')],
+        'edges_added' : list(state['edges'].values()),
+    }
+
+
+def apply_delta(state : dict, delta : dict):
+    for key in ['label', 'functions', 'selectors']:
+        if key in delta:
+            state[key] = delta[key]
+    for id in delta.get('vertices_deleted', []):
+        state['vertices'].pop(id, None)
+    for id, label, metadata in delta.get('vertices_added', []) + delta.get('vertices_updated', []):
+        state['vertices'][id] = [label, metadata]
+    for src, dst in delta.get('edges_deleted', []):
+        state['edges'].pop((src, dst), None)
+    for row in delta.get('edges_added', []):
+        state['edges'][row[0], row[1]] = row
+
+
+def compose(deltas : list[dict]) -> dict:
+    """Net change of consecutive deltas: vertices and edges changed back and forth appear once,
+    ones added and deleted again do not appear. Deltas must not add what already exists."""
+    result = {}
+    # Key -> [existed before the first delta, final value or None if deleted]
+    vertices = {}
+    edges = {}
+    for delta in deltas:
+        for key in ['label', 'functions', 'selectors']:
+            if key in delta:
+                result[key] = delta[key]
+        for id in delta.get('vertices_deleted', []):
+            vertices.setdefault(id, [True, None])[1] = None
+        for id, label, metadata in delta.get('vertices_added', []):
+            vertices.setdefault(id, [False, None])[1] = [id, label, metadata]
+        for id, label, metadata in delta.get('vertices_updated', []):
+            vertices.setdefault(id, [True, None])[1] = [id, label, metadata]
+        for src, dst in delta.get('edges_deleted', []):
+            edges.setdefault((src, dst), [True, None])[1] = None
+        for row in delta.get('edges_added', []):
+            edges.setdefault((row[0], row[1]), [False, None])[1] = row
+    result['vertices_added'] = [value for existed, value in vertices.values() if value and not existed]
+    result['vertices_updated'] = [value for existed, value in vertices.values() if value and existed]
+    result['vertices_deleted'] = [id for id, (existed, value) in vertices.items() if existed and not value]
+    result['edges_deleted'] = [list(pair) for pair, (existed, value) in edges.items() if existed and not value]
+    result['edges_added'] = [value for existed, value in edges.values() if value]
+    return result
+
+
+def events(delta : dict) -> list[dict]:
+    """Change feed events of a delta."""
+    result = []
+    for kind in ['added', 'updated']:
+        for id, label, metadata in delta.get('vertices_' + kind, []):
+            result.append({'type' : 'node_' + kind, 'node_id' : id, 'node_label' : label, 'node_description' : metadata.get('node_description')})
+    result.extend({'type' : 'node_deleted', 'node_id' : id} for id in delta.get('vertices_deleted', []))
+    for src, dst, threading, morph, *probability in delta.get('edges_added', []):
+        result.append({'type' : 'edge_added', 'src' : str(src), 'dst' : str(dst), 'threading' : threading, 'morph' : morph[0] if morph else None,
+                       'probability' : probability[0] if probability else None})
+    result.extend({'type' : 'edge_deleted', 'src' : str(src), 'dst' : str(dst)} for src, dst in delta.get('edges_deleted', []))
+    if 'label' in delta:
+        result.append({'type' : 'project_updated', 'project_label' : delta['label']})
+    return result
+
+
+def _dump_state(state : dict) -> dict:
+    return {
+        'label' : state['label'],
+        'functions' : state['functions'],
+        'selectors' : state['selectors'],
+        'vertices' : [[id, label, metadata] for id, (label, metadata) in state['vertices'].items()],
+        'edges' : list(state['edges'].values()),
+    }
+
+def encode_state(state : dict) -> bytes:
+    """Compressed snapshot of a history state, as stored in `project_history.state`."""
+    return _encode(_dump_state(state))
+
+def _load_state(data : dict) -> dict:
+    return {
+        'label' : data['label'],
+        'functions' : data['functions'],
+        'selectors' : data['selectors'],
+        'vertices' : {id : [label, metadata] for id, label, metadata in data['vertices']},
+        'edges' : {(row[0], row[1]) : row for row in data['edges']},
+    }
+
+
+def state_graph(pid : int, state : dict) -> Graph:
+    """Graph of a history state."""
+    transitions = {tuple(row[3]) for row in state['edges'].values() if row[3]}
+    graph = Graph(pid)
+    graph.load_state({
+        'id' : pid,
+        'label' : state['label'],
+        'functions' : state['functions'],
+        'transitions' : [(name, function, predicate) for name, function, predicate in transitions],
+        'vertices' : [(id, label, metadata) for id, (label, metadata) in state['vertices'].items()],
+        'edges' : [(src, dst, threading, morph[0] if morph else None, probability[0] if probability else None)
+                   for src, dst, threading, morph, *probability in state['edges'].values()],
+        'selectors' : state['selectors'],
+    })
+    return graph
+
+
+def _rows(db : Session, pid : int, first : int, last : int) -> list[models.ProjectHistory]:
+    return db.query(models.ProjectHistory).filter(
+        models.ProjectHistory.project_id == pid, models.ProjectHistory.version.between(first, last)
+    ).order_by(models.ProjectHistory.version).all()
+
+
+def state_at(db : Session, pid : int, version : int) -> dict | None:
+    """State of the project at `version`, None if it is not kept."""
+    snapshot = db.query(models.ProjectHistory).filter(
+        models.ProjectHistory.project_id == pid, models.ProjectHistory.version <= version, models.ProjectHistory.state != None
+    ).order_by(models.ProjectHistory.version.desc()).first()
+    if not snapshot:
+        return None
+    rows = _rows(db, pid, snapshot.version + 1, version)
+    if snapshot.version + len(rows) != version or any(row.delta is None for row in rows):
+        return None
+    state = _load_state(_decode(snapshot.state))
+    for row in rows:
+        apply_delta(state, _decode(row.delta))
+    return state
+
+
+def diff(db : Session, pid : int, since : int, version : int) -> dict | None:
+    """Net change from `since` to `version`, None if some of the changes are not kept."""
+    rows = _rows(db, pid, since + 1, version)
+    if since + len(rows) != version or any(row.delta is None for row in rows):
+        return None
+    return compose([_decode(row.delta) for row in rows])
+
+
+def record(db : Session, pid : int, delta : dict, load_state):
+    """Adds the change being committed to project history, in the same transaction.
+
+    `load_state()` returns the state after the change, called only when the project has no
+    history to continue. A full snapshot is stored once deltas since the previous one outgrow
+    it `HISTORY_SNAPSHOT_RATIO` times, so history grows with changes rather than with the graph
+    and rebuilding a version replays a bounded amount of deltas.
+    """
+    db.flush()
+    version = db.get(models.Project, pid).project_version
+    last = db.query(models.ProjectHistory).filter(models.ProjectHistory.project_id == pid).order_by(
+        models.ProjectHistory.version.desc()).first()
+    encoded = _encode(delta)
+    row = models.ProjectHistory(project_id=pid, version=version, delta=encoded, size=len(encoded))
+    if not last or last.version != version - 1:
+        # History starts here, changes before this version are unknown
+        row.delta = None
+        row.state = encode_state(load_state())
+        row.size = row.base_size = len(row.state)
+        row.chain_size = 0
+    elif last.chain_size + row.size >= last.base_size * config.HISTORY_SNAPSHOT_RATIO:
+        state = state_at(db, pid, last.version)
+        if state is None:
+            # Versions the previous one is rebuilt from are not kept
+            state = load_state()
+        else:
+            apply_delta(state, delta)
+        row.state = encode_state(state)
+        row.base_size = len(row.state)
+        row.chain_size = 0
+    else:
+        row.base_size = last.base_size
+        row.chain_size = last.chain_size + row.size
+    db.add(row)
+
+    oldest = db.query(func.min(models.ProjectHistory.version)).filter(models.ProjectHistory.project_id == pid).scalar()
+    # Compacted in batches, so the cost of a snapshot is shared by many versions
+    if config.HISTORY_VERSIONS and oldest is not None and version - oldest >= config.HISTORY_VERSIONS * 5 // 4:
+        db.flush()
+        compact(db, pid, version - config.HISTORY_VERSIONS + 1)
+
+
+def compact(db : Session, pid : int, first : int):
+    """Drops history before version `first`, which keeps a snapshot to rebuild later versions from."""
+    row = db.query(models.ProjectHistory).filter(models.ProjectHistory.project_id == pid, models.ProjectHistory.version == first).first()
+    if not row:
+        return
+    if row.state is None:
+        state = state_at(db, pid, first)
+        if state is None:
+            return
+        row.state = encode_state(state)
+        row.base_size = len(row.state)
+        # Later deltas keep counting from the old snapshot, the next one comes no later than before
+        db.flush()
+    db.query(models.ProjectHistory).filter(models.ProjectHistory.project_id == pid, models.ProjectHistory.version < first).delete(synchronize_session=False)
+
+
+def compact_all(db : Session, versions : int) -> int:
+    """Keeps last `versions` versions of every project, returns the number of compacted projects."""
+    latest = db.execute(select(models.ProjectHistory.project_id, func.min(models.ProjectHistory.version), func.max(models.ProjectHistory.version))
+                        .group_by(models.ProjectHistory.project_id)).all()
+    compacted = 0
+    for pid, oldest, newest in latest:
+        if newest - oldest >= versions:
+            compact(db, pid, newest - versions + 1)
+            db.commit()
+            compacted += 1
+    return compacted
+
+
+if __name__ == '__main__':
+    from .sql_app.db import SessionLocal, engine
+    from .sql_app.migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Project history tools')
+    parser.add_argument('command', choices=['compact'], help='compact: drop versions older than the last VERSIONS of every project')
+    parser.add_argument('--versions', type=int, default=config.HISTORY_VERSIONS or 1000)
+    args = parser.parse_args()
+
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        print(f'Compacted history of {compact_all(db, args.versions)} projects')
+    finally:
+        db.close()
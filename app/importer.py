@@ -0,0 +1,207 @@
+import argparse
+import contextlib
+import datetime
+import io
+import multiprocessing
+import os
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from .graph.graph import Graph
+from .sql_app import models, schemas
+from .storage import storage
+from . import config, history
+
+# Files of a directory or archive taken as aDOT graphs
+SUFFIXES = ('.gv', '.adot', '.dot')
+RESERVED_VERTICES = ('__BEGIN__', '__END__')
+
+
+def read_directory(path : str) -> list[tuple[str, bytes]]:
+    files = []
+    for root, _, names in os.walk(path):
+        for name in sorted(names):
+            if name.endswith(SUFFIXES):
+                with open(os.path.join(root, name), 'rb') as file:
+                    files.append((os.path.relpath(os.path.join(root, name), path), file.read()))
+    return sorted(files)
+
+
+def read_archive(fileobj) -> list[tuple[str, bytes]]:
+    """aDOT files of a tar archive, compressed or not. Raises `tarfile.TarError` for broken archives."""
+    files = []
+    with tarfile.open(fileobj=fileobj, mode='r:*') as archive:
+        for member in archive:
+            if member.isfile() and member.name.endswith(SUFFIXES):
+                files.append((member.name, archive.extractfile(member).read()))
+    return files
+
+
+def _label(name : str) -> str:
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def parse_file(name : str, data : bytes) -> tuple[str, dict | None, str | None]:
+    """Runs in import workers: `(name, graph state, None)` or `(name, None, error)`."""
+    output = io.StringIO()
+    try:
+        graph = Graph(0)
+        with contextlib.redirect_stdout(output):
+            failed = graph.import_aDOT(data.decode(), from_data=True)
+    except Exception as error:
+        return name, None, f'{type(error).__name__}: {error}'
+    if failed:
+        return name, None, output.getvalue().strip() or 'aDOT import failed'
+    return name, graph.dump_state(), None
+
+
+def write_project(pid : int, label : str, path : str, state : dict, ids : dict, metadata : dict) -> tuple[list[dict], bytes]:
+    """Runs in import workers: writes the graph of a new project with vertex IDs of its nodes,
+    returns edge rows for the storage and the first history snapshot."""
+    def node(id):
+        return ids.get(id, id)
+
+    graph = Graph(pid, label=label)
+    graph.load_state({
+        'id' : pid,
+        'label' : label,
+        'functions' : state['functions'],
+        'transitions' : state['transitions'],
+        'vertices' : [(id, None, {}) if id in RESERVED_VERTICES else (node(id), str(id), metadata) for id, _, _ in state['vertices']],
+        'edges' : [(node(src), node(dst), *edge) for src, dst, *edge in state['edges']],
+        'selectors' : [(node(id), selector) for id, selector in state['selectors']],
+    })
+    edges = [{'project_id' : pid, **row} for row in storage.write_new(path, graph)]
+    return edges, history.encode_state(history.graph_state(graph))
+
+
+class ProjectImporter:
+    '''Creates projects from aDOT files. Files are parsed and project graphs written in a process
+    pool, rows of a batch of projects are inserted at once, in one transaction per batch.'''
+
+    def __init__(self, workers : int, batch_size : int) -> None:
+        self.workers = workers
+        self.batch_size = batch_size
+        self._pool : ProcessPoolExecutor | None = None
+
+    def start(self):
+        """Creates the pool. In the application it is created at startup, not by the first import."""
+        if not self._pool:
+            # Not forked from the calling process, whose other threads may hold locks
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+
+    def _executor(self) -> ProcessPoolExecutor:
+        self.start()
+        return self._pool
+
+    def _parse(self, files : list[tuple[str, bytes]]):
+        chunksize = max(1, len(files) // (self.workers * 4))
+        return self._executor().map(parse_file, *zip(*files), chunksize=chunksize)
+
+    def run(self, db : Session, author : int, files : list[tuple[str, bytes]]) -> dict:
+        """Imports `(name, content)` files as projects of `author`, returns created projects and per-file errors."""
+        report = {'imported' : [], 'failed' : []}
+        batches = [files[start:start + self.batch_size] for start in range(0, len(files), self.batch_size)]
+        parsed = self._parse(batches[0]) if batches else []
+        for index in range(len(batches)):
+            # Workers parse the next batch while this one is inserted
+            results, parsed = parsed, self._parse(batches[index + 1]) if index + 1 < len(batches) else []
+            batch = []
+            for name, state, error in results:
+                if error:
+                    report['failed'].append({'file' : name, 'error' : error})
+                else:
+                    batch.append((name, state))
+            if batch:
+                self._store(db, author, batch, report)
+        return report
+
+    def _store(self, db : Session, author : int, batch : list[tuple[str, dict]], report : dict):
+        now = datetime.datetime.now(datetime.UTC)
+        paths = []
+        try:
+            pids = db.execute(insert(models.Project).returning(models.Project.project_id, sort_by_parameter_order=True), [
+                {**schemas.ProjectCreate(project_label=_label(name), project_author=author).model_dump(),
+                 'project_created' : now, 'project_updated' : now, 'project_version' : 1}
+                for name, _ in batch]).scalars().all()
+            paths = [f'{config.SAVE_DIRECTORY}{pid}.gv' for pid in pids]
+            db.execute(update(models.Project), [{'project_id' : pid, 'project_path' : path} for pid, path in zip(pids, paths)])
+            db.execute(insert(models.UserAccess), [{'user_id' : author, 'project_id' : pid, 'access_level' : 3} for pid in pids])
+
+            # Node labels are vertex IDs of the file, unique in a project: rows are matched by them
+            # instead of ordered RETURNING, which SQLite does one row at a time. Core inserts
+            # of tables skip ORM bookkeeping, about half the time for large graphs
+            vertices = [(pid, id) for pid, (_, state) in zip(pids, batch) for id, _, _ in state['vertices'] if id not in RESERVED_VERTICES]
+            table = models.Node.__table__
+            nodes = db.execute(insert(table).returning(table.c.node_id, table.c.project_id, table.c.node_label), [
+                {'project_id' : pid, 'node_label' : str(id), 'node_description' : '', 'node_created' : now, 'node_updated' : now}
+                for pid, id in vertices]).all() if vertices else []
+            node_ids = {(pid, label) : node_id for node_id, pid, label in nodes}
+            ids = {pid : {} for pid in pids}
+            for pid, id in vertices:
+                ids[pid][id] = node_ids[pid, str(id)]
+
+            metadata = {'node_description' : '', 'node_created' : now}
+            written = self._executor().map(write_project, pids, [_label(name) for name, _ in batch], paths,
+                                           [state for _, state in batch], [ids[pid] for pid in pids], [metadata] * len(pids))
+            edges, snapshots = [], []
+            for pid, (rows, snapshot) in zip(pids, written):
+                edges.extend(rows)
+                snapshots.append({'project_id' : pid, 'version' : 1, 'state' : snapshot, 'size' : len(snapshot),
+                                  'chain_size' : 0, 'base_size' : len(snapshot), 'created' : now})
+            if edges:
+                db.execute(insert(models.Edge.__table__), edges)
+            db.execute(insert(models.ProjectHistory), snapshots)
+            db.commit()
+        except Exception as error:
+            db.rollback()
+            print(f'Import of {len(batch)} files failed: {error}')
+            for path in paths:
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+            report['failed'].extend({'file' : name, 'error' : f'{type(error).__name__}: {error}'} for name, _ in batch)
+            return
+        for pid, (name, state) in zip(pids, batch):
+            report['imported'].append({'file' : name, 'project_id' : pid, 'nodes' : len(ids[pid]), 'edges' : len(state['edges'])})
+
+    def shutdown(self):
+        if self._pool:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+importer = ProjectImporter(config.IMPORT_WORKERS, config.IMPORT_BATCH)
+
+
+if __name__ == '__main__':
+    from .sql_app import crud
+    from .sql_app.db import SessionLocal, engine
+    from .sql_app.migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Creates projects from a directory or tar archive of aDOT files')
+    parser.add_argument('path', help='directory or tar archive (.tar, .tar.gz, ...)')
+    parser.add_argument('--author', required=True, help='username of the author of created projects')
+    parser.add_argument('--workers', type=int, default=config.IMPORT_WORKERS)
+    args = parser.parse_args()
+
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        user = crud.get_user_by_name(db, args.author)
+        if not user:
+            parser.error(f'No user {args.author}')
+        if os.path.isdir(args.path):
+            files = read_directory(args.path)
+        else:
+            with open(args.path, 'rb') as file:
+                files = read_archive(file)
+        report = ProjectImporter(args.workers, config.IMPORT_BATCH).run(db, user.user_id, files)
+        for failure in report['failed']:
+            print(f"{failure['file']}: {failure['error']}")
+        print(f"Imported {len(report['imported'])} of {len(files)} files")
+    finally:
+        db.close()
@@ -0,0 +1,230 @@
+from contextlib import nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+
+import fastapi.routing
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import config
+
+enabled : bool = config.INSTRUMENTATION_ENABLED
+
+# Stage timings of the current request, None outside of instrumented requests
+_timings : ContextVar[dict | None] = ContextVar('timings', default=None)
+_disabled_stage = nullcontext()
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    # Label values of the text format escape backslashes, double quotes and line feeds
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names : tuple, values : tuple) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Metric:
+    '''Metric in Prometheus text exposition format.'''
+    kind = 'untyped'
+
+    def __init__(self, name : str, description : str, labels : tuple = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values : dict[tuple, float] = {}
+        self._lock = Lock()
+
+    def render_samples(self) -> list[str]:
+        return [f'{self.name}{_format_labels(self.labels, key)} {value}' for key, value in self._values.items()]
+
+    def render(self) -> str:
+        with self._lock:
+            samples = self.render_samples()
+        return '\n'.join([f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}', *samples])
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, value : float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, *labels, value : float):
+        with self._lock:
+            self._values[labels] = value
+
+    def remove(self, *labels):
+        with self._lock:
+            self._values.pop(labels, None)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name : str, description : str, labels : tuple = (), buckets : tuple = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value : float):
+        with self._lock:
+            counts, total, count = self._values.get(labels, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[labels] = (counts, total + value, count + 1)
+
+    def render_samples(self) -> list[str]:
+        samples = []
+        bucket_labels = (*self.labels, 'le')
+        for labels, (counts, total, count) in self._values.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                samples.append(f'{self.name}_bucket{_format_labels(bucket_labels, (*labels, bound))} {bucket_count}')
+            samples.append(f'{self.name}_bucket{_format_labels(bucket_labels, (*labels, "+Inf"))} {count}')
+            samples.append(f'{self.name}_sum{_format_labels(self.labels, labels)} {total}')
+            samples.append(f'{self.name}_count{_format_labels(self.labels, labels)} {count}')
+        return samples
+
+
+registry : list[Metric] = []
+
+def register(metric : Metric) -> Metric:
+    registry.append(metric)
+    return metric
+
+
+request_duration = register(Histogram('graph_api_request_duration_seconds', 'Request latency by route.', ('method', 'route')))
+stage_duration = register(Counter('graph_api_stage_seconds_total', 'Time spent in request stages.', ('route', 'stage')))
+stage_calls = register(Counter('graph_api_stage_calls_total', 'Number of stage executions.', ('route', 'stage')))
+
+
+class _Stage:
+    __slots__ = ('name', 'timings', 'start')
+
+    def __init__(self, name : str, timings : dict) -> None:
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc):
+        duration, calls = self.timings.get(self.name, (0.0, 0))
+        self.timings[self.name] = (duration + perf_counter() - self.start, calls + 1)
+
+
+def stage(name : str):
+    """Context manager timing a part of request handling. Does nothing if instrumentation is off."""
+    if not enabled:
+        return _disabled_stage
+    timings = _timings.get()
+    if timings is None:
+        return _disabled_stage
+    return _Stage(name, timings)
+
+
+def timed(name : str):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_graph(graph_class):
+    for method in ['import_aDOT', 'export_aDOT', 'export_dict', 'get_priorities']:
+        setattr(graph_class, method, timed(method)(getattr(graph_class, method)))
+
+
+def instrument_engine(engine : Engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timings = _timings.get()
+        if timings is not None:
+            duration, calls = timings.get('sql', (0.0, 0))
+            timings['sql'] = (duration + perf_counter() - context._query_start, calls + 1)
+
+
+def instrument_serialization():
+    """Times response model validation and `jsonable_encoder` of API routes as the serialize stage.
+    FastAPI runs them in `serialize_response` before the response is rendered."""
+    serialize_response = fastapi.routing.serialize_response
+
+    @wraps(serialize_response)
+    async def timed_serialize_response(*args, **kwargs):
+        with stage('serialize'):
+            return await serialize_response(*args, **kwargs)
+
+    fastapi.routing.serialize_response = timed_serialize_response
+
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        with stage('serialize'):
+            return super().render(content)
+
+
+def server_timing(timings : dict, total : float) -> str:
+    entries = [f'{name};dur={duration * 1000:.2f};desc="{calls}x"' for name, (duration, calls) in timings.items()]
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+class InstrumentationMiddleware:
+    '''ASGI middleware collecting stage timings of HTTP requests.'''
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        timings = {}
+        token = _timings.set(timings)
+        start = perf_counter()
+
+        async def send_with_timings(message):
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                headers.append((b'server-timing', server_timing(timings, perf_counter() - start).encode()))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _timings.reset(token)
+            route = scope.get('route')
+            route = route.path if route else 'unmatched'
+            request_duration.observe(scope['method'], route, value=perf_counter() - start)
+            for name, (duration, calls) in timings.items():
+                stage_duration.inc(route, name, value=duration)
+                stage_calls.inc(route, name, value=calls)
+
+
+metrics = APIRouter()
+
+@metrics.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return '\n'.join(metric.render() for metric in registry) + '\n'
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from threading import Lock
+
+from sqlalchemy.orm import Session
+
+from .graph.layout import layered_layout
+from .graph_cache import graph_cache, version_key
+from .sql_app import crud
+from .sql_app.crud import LoadProfile
+from . import config
+
+# Latest layout of recently requested projects with its version, the starting point after changes
+_recent : OrderedDict[int, tuple[int, dict]] = OrderedDict()
+_lock = Lock()
+
+
+def _changes(graph, layout : dict) -> int:
+    vertices = set(graph.get_vertices_IDs())
+    edges = {(id, next_id) for id in vertices for next_id in graph.get_vertex(id).edges}
+    return (len(vertices ^ {vertex['id'] for vertex in layout['vertices']})
+            + len(edges ^ {(edge['src'], edge['dst']) for edge in layout['edges']}))
+
+
+def _remember(pid : int, version : int, layout : dict):
+    with _lock:
+        _recent[pid] = (version, layout)
+        _recent.move_to_end(pid)
+        while len(_recent) > config.GRAPH_CACHE_SIZE:
+            _recent.popitem(last=False)
+
+
+def get_layout(db : Session, pid : int, load_project) -> dict | None:
+    """Layout of the current project graph. Computed once per project version: kept in this
+    process and in the graph cache. After small changes the previous layout is updated instead of
+    computed from scratch. `load_project(db, pid, profile)` loads the graph."""
+    project = crud.get_project_by_id(db, pid)
+    if not project:
+        return None
+    version = version_key(project.project_updated)
+    with _lock:
+        recent = _recent.get(pid)
+    if recent and recent[0] == version:
+        return recent[1]
+
+    layout = graph_cache.get(pid, project.project_updated, 'layout')
+    if layout is None:
+        graph = load_project(db, pid, LoadProfile.topology)
+        previous = recent[1] if recent else None
+        changes = _changes(graph, previous) if previous else None
+        if changes == 0:
+            layout = previous
+        elif changes is not None and changes <= config.LAYOUT_INCREMENTAL_CHANGES:
+            layout = layered_layout(graph, previous, sweeps=config.LAYOUT_SWEEPS)
+        else:
+            layout = layered_layout(graph, sweeps=config.LAYOUT_SWEEPS)
+        graph_cache.put(pid, project.project_updated, 'layout', layout)
+    _remember(pid, version, layout)
+    return layout
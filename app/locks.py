@@ -0,0 +1,141 @@
+import os
+import threading
+from time import monotonic, sleep
+
+from fastapi import HTTPException, status
+
+from . import config
+from .instrumentation import Counter, Histogram, register, stage
+
+try:
+    import fcntl
+except ImportError:
+    # No file locks, writes are serialized within a worker process only
+    fcntl = None
+
+LOCK_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+lock_wait = register(Histogram('graph_api_project_lock_wait_seconds', 'Time spent waiting for project write locks.', buckets=LOCK_WAIT_BUCKETS))
+lock_contended = register(Counter('graph_api_project_lock_contended_total', 'Project write locks that were held by another writer when requested.'))
+lock_timeouts = register(Counter('graph_api_project_lock_timeouts_total', 'Project writes rejected after waiting for the lock too long.'))
+
+
+class _Entry:
+    __slots__ = ('lock', 'users')
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.users = 0
+
+
+class ProjectLocks:
+    '''Write locks of projects, held while a change is loaded, applied and saved.
+
+    Within a worker process a project has a thread lock; between processes it has a byte
+    of a shared lock file, locked with `fcntl.lockf` at the project ID offset. Writes
+    to one project take turns, writes to different projects don't wait for each other.
+    A lock is taken with `with` in the thread of a request, blocking endpoints run in the
+    thread pool and never hold it on the event loop.
+    '''
+
+    def __init__(self, path : str, timeout : float) -> None:
+        self.path = path
+        self.timeout = timeout
+        self._entries : dict[int, _Entry] = {}
+        self._mutex = threading.Lock()
+        self._file : int | None = None
+        self._file_pid : int | None = None
+
+    def write(self, pid : int) -> '_ProjectLock':
+        return _ProjectLock(self, pid)
+
+    def _fd(self) -> int:
+        # POSIX record locks belong to the process and are dropped when any of its descriptors
+        # of the file is closed, so the file is opened once per process and never closed
+        if self._file_pid != os.getpid():
+            self._file = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._file_pid = os.getpid()
+        return self._file
+
+    def _try_file(self, pid : int) -> bool:
+        if fcntl is None:
+            return True
+        try:
+            fcntl.lockf(self._fd(), fcntl.LOCK_EX | fcntl.LOCK_NB, 1, pid)
+            return True
+        except (BlockingIOError, PermissionError):
+            return False
+
+    def _release_file(self, pid : int):
+        if fcntl is not None:
+            fcntl.lockf(self._fd(), fcntl.LOCK_UN, 1, pid)
+
+    def _enter(self, pid : int) -> _Entry:
+        with self._mutex:
+            entry = self._entries.get(pid)
+            if entry is None:
+                entry = self._entries[pid] = _Entry()
+            entry.users += 1
+            return entry
+
+    def _leave(self, pid : int, entry : _Entry):
+        with self._mutex:
+            entry.users -= 1
+            if not entry.users:
+                del self._entries[pid]
+
+
+def _busy_exception():
+    lock_timeouts.inc()
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Project is being changed by other requests, try again later",
+        headers={"Retry-After": "1"},
+    )
+
+
+class _ProjectLock:
+    __slots__ = ('locks', 'pid', 'entry')
+
+    def __init__(self, locks : ProjectLocks, pid : int) -> None:
+        self.locks = locks
+        self.pid = pid
+        self.entry : _Entry | None = None
+
+    def _acquired(self, start : float, contended : bool):
+        lock_wait.observe(value=monotonic() - start)
+        if contended:
+            lock_contended.inc()
+
+    def __enter__(self):
+        locks = self.locks
+        start = monotonic()
+        deadline = start + locks.timeout
+        self.entry = locks._enter(self.pid)
+        with stage('lock'):
+            contended = not self.entry.lock.acquire(blocking=False)
+            if contended and not self.entry.lock.acquire(timeout=locks.timeout):
+                locks._leave(self.pid, self.entry)
+                raise _busy_exception()
+            delay = 0.001
+            while not locks._try_file(self.pid):
+                contended = True
+                if monotonic() >= deadline:
+                    self._release()
+                    raise _busy_exception()
+                sleep(delay)
+                delay = min(delay * 2, 0.05)
+        self._acquired(start, contended)
+        return self
+
+    def _release(self, file : bool = False):
+        if file:
+            self.locks._release_file(self.pid)
+        self.entry.lock.release()
+        self.locks._leave(self.pid, self.entry)
+
+    def __exit__(self, *exc):
+        self._release(file=True)
+
+
+project_locks = ProjectLocks(config.PROJECT_LOCK_FILE or config.SAVE_DIRECTORY + '.project_locks', config.PROJECT_LOCK_TIMEOUT)
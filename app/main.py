@@ -1,15 +1,34 @@
 from typing import Annotated
-from fastapi import Depends, FastAPI, status, HTTPException
+from fastapi import Depends, FastAPI, status, HTTPException, Query, Header, Response, WebSocket, UploadFile
 from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-import fileinput
-
-from .auth import auth, get_current_user, AccessLevels, check_access
+from functools import partial
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+import asyncio
+import json
+import logging
+import tarfile
+
+from .auth import auth, get_current_user, get_user_by_token, AccessLevels, check_access, password_verifier
 from .graph.graph import Graph
-from .sql_app.db import get_db, Base, engine
+from .graph.vertex import Vertex
+from .graph.walker import AsyncWalker
+from .graph.simulation import WalkSimulation
+from .sql_app.db import get_db, get_read_db, engine, replica_engines, SessionLocal, ReadYourWritesMiddleware
 from .sql_app import models, schemas, crud
-from .graph_models import GraphModel, GraphModelReturn, GraphEdge, GraphEdgeDesc
-from .config import SAVE_DIRECTORY
+from .sql_app.crud import LoadProfile
+from .graph_models import GraphModel, GraphModelReturn, GraphEdge, GraphEdgeDesc, GraphEdgeWeight
+from .config import SAVE_DIRECTORY, WALK_CONCURRENCY, WALK_MAX_STEPS, SIMULATION_MAX_WALKS, BATCH_MAX_PROJECTS, BATCH_WORKERS
+from .storage import storage
+from .graph_cache import graph_cache
+from . import instrumentation, warmup, layouts, changes, history, exporter, profiling, memory
+from .importer import importer, read_archive
+from .locks import project_locks
+
+logger = logging.getLogger(__name__)
 
 access_exception = HTTPException(
         status_code=status.HTTP_405_METHOD_NOT_ALLOWED,
@@ -36,39 +55,166 @@ illegal_input_exception = HTTPException(
     detail="Request is illegal"
 )
 
-Base.metadata.create_all(bind=engine)
+version_gone_exception = HTTPException(
+    status_code=status.HTTP_410_GONE,
+    detail="Project version is no longer kept"
+)
+
+batch_size_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail=f"At most {BATCH_MAX_PROJECTS} projects can be read at once"
+)
+
+load_fail_exception = HTTPException(
+    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    detail="Project graph could not be loaded",
+)
 
-app = FastAPI()
+# Threads loading graphs of POST /projects/batch, created on first use
+batch_pool = ThreadPoolExecutor(BATCH_WORKERS, thread_name_prefix='batch')
+
+@asynccontextmanager
+async def lifespan(app : FastAPI):
+    password_verifier.start()
+    importer.start()
+    warmup.start(get_project_by_pid)
+    yield
+    password_verifier.shutdown()
+    importer.shutdown()
+    batch_pool.shutdown()
+    changes.broker.shutdown()
+    profiling.sampler.shutdown()
+    graph_cache.shutdown()
+
+
+if instrumentation.enabled:
+    instrumentation.instrument_graph(Graph)
+    instrumentation.instrument_serialization()
+    for db_engine in [engine, *replica_engines]:
+        instrumentation.instrument_engine(db_engine)
+    app = FastAPI(lifespan=lifespan, default_response_class=instrumentation.TimedJSONResponse)
+    app.add_middleware(instrumentation.InstrumentationMiddleware)
+else:
+    app = FastAPI(lifespan=lifespan)
+if replica_engines:
+    app.add_middleware(ReadYourWritesMiddleware)
+if profiling.enabled:
+    app.add_middleware(profiling.ProfilingMiddleware)
+    app.include_router(profiling.profiles)
+if memory.enabled:
+    app.add_middleware(memory.AllocationMiddleware)
 app.include_router(auth)
+app.include_router(instrumentation.metrics)
 
 
-def get_project_by_pid(db : Session, pid : int) -> Graph | None:
+def get_project_by_pid(db : Session, pid : int, profile : LoadProfile = LoadProfile.full) -> Graph | None:
     project = crud.get_project_by_id(db, pid)
     if not project:
         return None
+    graph = get_cached_graph(db, project, profile)
+    if graph:
+        return graph
+    return load_project_graph(db, project, node_vertices(crud.get_project_nodes(db, pid, profile), profile), profile)
+
 
-    graph = Graph(pid, label=project.project_label)
-    for node in crud.get_project_nodes(db, pid):
-        graph.add_vertex(node.node_id, node.node_label, metadata={
-            'node_description' : node.node_description,
-            'node_created' : node.node_created,
-            'node_updated' : node.node_updated,
-            })
-    graph.import_aDOT(project.project_path, clear=False, check_errors=False)
+def get_cached_graph(db : Session, project : models.Project, profile : LoadProfile) -> Graph | None:
+    state = graph_cache.get(project.project_id, project.project_updated, profile.value)
+    if not state:
+        return None
+    graph = Graph(project.project_id, label=project.project_label)
+    graph.load_state(state, lazy_metadata=partial(lazy_node_metadata, db))
+    profiling.graph_loaded(graph)
     return graph
 
 
+def node_vertices(nodes : list[models.Node], profile : LoadProfile) -> list[tuple]:
+    vertices = []
+    for node in nodes:
+        # Deferred columns are fetched per node only when vertex metadata is accessed
+        metadata = crud.get_node_metadata(node) if profile == LoadProfile.full else partial(crud.get_node_metadata, node)
+        label = node.node_label if profile != LoadProfile.topology else None
+        vertices.append((node.node_id, label, metadata))
+    return vertices
+
+
+def load_project_graph(db : Session, project : models.Project, vertices : list[tuple], profile : LoadProfile) -> Graph:
+    graph = Graph(project.project_id, label=project.project_label)
+    for id, label, metadata in vertices:
+        graph.add_vertex(id, label, metadata=metadata)
+    storage.load(db, project, graph)
+    state = graph.dump_state()
+    graph_cache.put(project.project_id, project.project_updated, profile.value, state)
+    profiling.graph_loaded(graph)
+    if memory.enabled:
+        memory.graph_loaded(graph, profile.value, state)
+    return graph
+
+
+def _load_batch_graph(bind, project : models.Project, vertices : list[tuple], profile : LoadProfile) -> Graph:
+    # Sessions aren't shared between threads, storages reading the database get their own
+    db = SessionLocal(bind=bind)
+    try:
+        return load_project_graph(db, project, vertices, profile)
+    finally:
+        db.close()
+
+
+def get_projects_graphs(db : Session, projects : list[models.Project], profile : LoadProfile) -> dict[int, Graph | Exception]:
+    """Graphs of several projects: cached ones, then the rest with nodes of all of them read in one query
+    and graph files parsed in `batch_pool` threads. A project that failed to load has its exception instead."""
+    graphs = {}
+    missing = []
+    for project in projects:
+        graph = get_cached_graph(db, project, profile)
+        if graph:
+            graphs[project.project_id] = graph
+        else:
+            missing.append(project)
+    if not missing:
+        return graphs
+    nodes = crud.get_projects_nodes(db, [project.project_id for project in missing], profile)
+    # Node rows belong to the request session and are read here: threads only get vertex data, and lazy
+    # metadata loaders run later in the request thread, when the response is built
+    vertices = {pid : node_vertices(project_nodes, profile) for pid, project_nodes in nodes.items()}
+    # Threads run in a copy of the request context, for stage timings and profiling of the request
+    futures = {project.project_id : batch_pool.submit(copy_context().run, _load_batch_graph, db.get_bind(), project, vertices[project.project_id], profile)
+               for project in missing}
+    for pid, future in futures.items():
+        try:
+            graphs[pid] = future.result()
+        except Exception as error:
+            logger.exception('Batch read: project %s failed to load', pid)
+            graphs[pid] = error
+    return graphs
+
+
+def lazy_node_metadata(db : Session, node_id : int | str):
+    def load():
+        node = crud.get_node_by_id(db, node_id) if type(node_id) == int else None
+        return crud.get_node_metadata(node) if node else {}
+    return load
+
+
+def history_state(db : Session, pid : int) -> dict:
+    return history.graph_state(get_project_by_pid(db, pid))
+
+
 def save_project_by_pid(db : Session, pid : int, project_graph : Graph):
     project = crud.get_project_by_id(db, pid)
     if not project:
         raise wrong_project_exception
+    previous = get_project_by_pid(db, pid, LoadProfile.topology)
+    changed = []
+    deleted = []
     updated = []
     new_nodes = []
     project_nodes = crud.get_project_nodes(db, pid)
     for v_id in project_graph.get_vertices_IDs():
         if v_id not in ['__BEGIN__', '__END__']:
             vert = project_graph.get_vertex(v_id)
-            node_new = schemas.NodeCreate(node_label=str(vert.label), node_description=vert.metadata.get('node_description', ''))
+            # Empty values are not written by crud.update_node, so unloaded metadata is left untouched
+            description = vert.metadata.get('node_description', '') if vert.metadata_loaded else ''
+            node_new = schemas.NodeCreate(node_label=str(vert.label), node_description=description)
             db_node_record = None
             if type(vert.id) == int:
                 db_node_record = crud.get_node_by_id(db, vert.id)
@@ -76,48 +222,109 @@ def save_project_by_pid(db : Session, pid : int, project_graph : Graph):
                     raise wrong_project_exception
             
             if db_node_record:
+                label, description = db_node_record.node_label, db_node_record.node_description
                 updated.append(crud.update_node(db, schemas.Node(node_id=vert.id, project_id=pid, **node_new.model_dump()), flush=False))
+                if (label, description) != (db_node_record.node_label, db_node_record.node_description):
+                    changed.append(db_node_record)
             else:
                 new_node = crud.add_node(db, pid, node_new, flush=False)
                 new_nodes.append((v_id, new_node))
-    if project_graph.export_aDOT(project.project_path):
-        raise save_fail_exception
     for node in project_nodes:
         if node not in updated:
-            crud.del_node(db, node.node_id)
-    db.commit()
-    for obj in updated:
-        db.refresh(obj)
-
-    for _, node in new_nodes:
-            db.refresh(node)
+            crud.del_node(db, node.node_id, flush=False)
+            deleted.append(node)
+    db.flush()
+
+    # New vertices take IDs of their database records. Temporary IDs avoid collisions between renames
+    for v_id, node in new_nodes:
+        project_graph.rename_vertex(v_id, ('__NEW__', v_id))
+    for v_id, node in new_nodes:
+        project_graph.rename_vertex(('__NEW__', v_id), node.node_id)
+
+    if storage.save(db, project, project_graph):
+        db.rollback()
+        raise save_fail_exception
+    crud.update_project(db, schemas.Project(project_id=pid), flush=False)
+    delta = {
+        'vertices_added' : [history.node_vertex(node) for v_id, node in new_nodes],
+        'vertices_updated' : [history.node_vertex(node) for node in changed],
+        'vertices_deleted' : [node.node_id for node in deleted],
+        **history.edge_delta(previous, project_graph),
+    }
+    history.record(db, pid, delta, partial(history_state, db, pid))
+    crud.apply_change(db, project)
+
+    graph_cache.invalidate(pid)
+    changes.broker.publish(db, pid, history.events(delta))
+    return None
 
-    with fileinput.FileInput(project.project_path, inplace=True) as file:
-        for line in file:
-            for id, node in new_nodes:
-                line = line.replace(str(id), str(node.node_id))
-            print(line, end='')
 
+def save_project_edge(db : Session, pid : int, project_graph : Graph, vertex : Vertex, next_vertex : Vertex | int | str, deleted : bool = False, replaced : bool = False):
+    project = crud.get_project_by_id(db, pid)
+    if not project:
+        raise wrong_project_exception
+    if deleted:
+        failed = storage.del_edge(db, project, project_graph, vertex, next_vertex)
+        delta = {'edges_deleted' : [[vertex.id, next_vertex.id if type(next_vertex) == Vertex else next_vertex]]}
+    else:
+        failed = storage.add_edge(db, project, project_graph, vertex, next_vertex)
+        delta = {'edges_added' : [history.edge_row(vertex, vertex.get_edge(next_vertex))]}
+        if replaced:
+            delta['edges_deleted'] = [[vertex.id, next_vertex.id]]
+    if failed:
+        db.rollback()
+        raise save_fail_exception
+    crud.update_project(db, schemas.Project(project_id=pid), flush=False)
+    history.record(db, pid, delta, partial(history_state, db, pid))
+    db.commit()
+    graph_cache.invalidate(pid)
+    changes.broker.publish(db, pid, history.events(delta))
 
-    crud.update_project(db, schemas.Project(project_id=pid))
-    return None
 
 
+@app.get("/ready")
+def get_readiness():
+    report = warmup.state.report()
+    return JSONResponse(report, status_code=status.HTTP_200_OK if report['ready'] else status.HTTP_503_SERVICE_UNAVAILABLE)
 
 
 @app.get("/project")
 def get_available_projects_id(
     current_user: Annotated[models.User, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    page: Annotated[schemas.ProjectPage, Depends()],
+    db: Session = Depends(get_read_db)
 ):
-    return {'projects': crud.get_user_projects(db, current_user.user_id)}
+    projects = crud.get_user_projects(db, current_user.user_id, page)
+    next_page = projects[-1] if len(projects) == page.limit else None
+    return {'projects': projects, 'next': next_page}
 
 @app.get("/project/info")
 def get_available_projects_info(
     current_user: Annotated[models.User, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    page: Annotated[schemas.ProjectPage, Depends()],
+    db: Session = Depends(get_read_db)
 ):
-    return {'projects': crud.get_user_projects_data(db, current_user.user_id)}
+    projects = crud.get_user_projects_data(db, current_user.user_id, page)
+    next_page = projects[-1].project_id if len(projects) == page.limit else None
+    return {'projects': projects, 'next': next_page}
+
+
+def export_stream(exporter, user_id : int, after : int):
+    db = SessionLocal()
+    try:
+        yield from exporter(db, user_id, after)
+    finally:
+        db.close()
+
+@app.get("/project/export")
+def export_projects(
+    current_user: Annotated[models.User, Depends(get_current_user)],
+    format : schemas.ExportFormat = schemas.ExportFormat.ndjson,
+    after : int = 0,
+):
+    stream = export_stream(exporter.exporters[format.value], current_user.user_id, after)
+    headers = {'Content-Disposition' : f'attachment; filename="projects.{format.value}"'}
+    return StreamingResponse(stream, media_type=exporter.FORMATS[format.value], headers=headers)
 
 
 @app.get("/project/{project_id}")
@@ -140,18 +347,54 @@ async def get_project_info(
 async def get_full_graph(
     project_id : int,
     current_user: Annotated[models.User, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    response : Response,
+    version : Annotated[int | None, Query(ge=0)] = None,
+    db: Session = Depends(get_read_db)
 ) -> GraphModelReturn:
     if not check_access(db, current_user, project_id, AccessLevels.read_access):
         raise access_exception
-    graph : Graph = get_project_by_pid(db, project_id)
+    if version is None:
+        graph : Graph = get_project_by_pid(db, project_id)
+        version = crud.get_project_by_id(db, project_id).project_version
+    else:
+        project = crud.get_project_by_id(db, project_id)
+        if not project or version > project.project_version:
+            raise non_exist_exception
+        state = history.state_at(db, project_id, version)
+        if state is None:
+            raise version_gone_exception
+        graph = history.state_graph(project_id, state)
+    # Version to resume the change feed or diffs from
+    response.headers['X-Project-Version'] = str(version)
     return GraphModelReturn(**graph.export_dict())
 
+@app.get("/project/{project_id}/diff")
+async def get_graph_diff(
+    project_id : int,
+    since : Annotated[int, Query(ge=0)],
+    current_user: Annotated[models.User, Depends(get_current_user)],
+    db: Session = Depends(get_db)
+):
+    if not check_access(db, current_user, project_id, AccessLevels.read_access):
+        raise access_exception
+    project = crud.get_project_by_id(db, project_id)
+    if not project or since > project.project_version:
+        raise non_exist_exception
+    if since == 0:
+        # Version 0 is the empty project, its whole current state is the change
+        state = history.state_at(db, project_id, project.project_version) or history_state(db, project_id)
+        delta = history.initial_delta(state)
+    else:
+        delta = history.diff(db, project_id, since, project.project_version)
+    if delta is None:
+        raise version_gone_exception
+    return {'since' : since, 'version' : project.project_version, 'events' : history.events(delta)}
+
 @app.get("/project/{project_id}/users")
 async def get_project_users(
     project_id : int,
     current_user: Annotated[models.User, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if not check_access(db, current_user, project_id, AccessLevels.read_access):
         raise access_exception
@@ -161,13 +404,165 @@ async def get_project_users(
 async def get_ordered_chapters(
     project_id : int,
     current_user: Annotated[models.User, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if not check_access(db, current_user, project_id, AccessLevels.read_access):
         raise access_exception
-    graph : Graph = get_project_by_pid(db, project_id)
+    graph : Graph = get_project_by_pid(db, project_id, LoadProfile.topology)
     return {"chapters" : graph.get_priorities()}
 
+def batch_error(exception : HTTPException) -> dict:
+    return {'status_code' : exception.status_code, 'detail' : exception.detail}
+
+# Parts that weren't requested are left out
+@app.post("/projects/batch", response_model_exclude_unset=True)
+def read_projects_batch(
+    batch : schemas.ProjectBatch,
+    current_user: Annotated[models.User, Depends(get_current_user)],
+    db: Session = Depends(get_read_db)
+) -> schemas.ProjectBatchResult:
+    # Plain function, so queries and waiting for graphs run in the thread pool
+    project_ids = list(dict.fromkeys(batch.project_ids))
+    if len(project_ids) > BATCH_MAX_PROJECTS:
+        raise batch_size_exception
+    parts = set(batch.parts)
+    levels = crud.get_user_access_levels(db, current_user.user_id, project_ids)
+    readable = [pid for pid in project_ids if levels.get(pid, 0) >= AccessLevels.read_access]
+    projects = crud.get_projects_by_ids(db, readable) if readable else {}
+    graphs = {}
+    if projects and parts & {schemas.BatchPart.graph, schemas.BatchPart.chapters}:
+        # Chapters are computed from full graphs too when both are requested
+        profile = LoadProfile.full if schemas.BatchPart.graph in parts else LoadProfile.topology
+        graphs = get_projects_graphs(db, list(projects.values()), profile)
+    users = crud.get_projects_users(db, list(projects)) if projects and schemas.BatchPart.users in parts else {}
+
+    results = []
+    for pid in project_ids:
+        result = {'project_id' : pid}
+        results.append(result)
+        if pid not in projects:
+            result['error'] = batch_error(access_exception if pid not in readable else non_exist_exception)
+            continue
+        project = projects[pid]
+        result['version'] = project.project_version
+        if schemas.BatchPart.info in parts:
+            result['info'] = {'project' : crud.strip_project_path(project), 'access' : levels[pid]}
+        if schemas.BatchPart.users in parts:
+            result['users'] = users[pid]
+        graph = graphs.get(pid)
+        if isinstance(graph, Exception):
+            result['error'] = batch_error(load_fail_exception)
+        elif graph is not None:
+            try:
+                if schemas.BatchPart.graph in parts:
+                    result['graph'] = GraphModelReturn(**graph.export_dict())
+                if schemas.BatchPart.chapters in parts:
+                    result['chapters'] = graph.get_priorities()
+            except Exception:
+                logger.exception('Batch read: project %s failed to serialize', pid)
+                result.pop('graph', None)
+                result['error'] = batch_error(load_fail_exception)
+    return schemas.ProjectBatchResult(projects=results)
+
+
+def project_changes(db : Session, project_id : int, since : int | None):
+    version = crud.get_project_by_id(db, project_id).project_version
+    # Feeds live for long, the connection is given back to the pool
+    db.close()
+    return changes.broker.subscribe(project_id, version, since)
+
+@app.get("/project/{project_id}/changes")
+async def stream_project_changes(
+    project_id : int,
+    current_user: Annotated[models.User, Depends(get_current_user)],
+    since : int | None = None,
+    last_event_id : Annotated[int | None, Header()] = None,
+    db: Session = Depends(get_db)
+):
+    if not check_access(db, current_user, project_id, AccessLevels.read_access):
+        raise access_exception
+    if not crud.get_project_by_id(db, project_id):
+        raise non_exist_exception
+    # Browsers reconnecting an EventSource send the id of the last received event
+    feed = project_changes(db, project_id, since if last_event_id is None else last_event_id)
+
+    async def events():
+        try:
+            async for version, message in feed:
+                yield f"id: {version}\ndata: {message}\n\n"
+        finally:
+            await feed.aclose()
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers={'Cache-Control' : 'no-cache', 'X-Accel-Buffering' : 'no'})
+
+@app.websocket("/project/{project_id}/changes")
+async def watch_project_changes(
+    websocket : WebSocket,
+    project_id : int,
+    token : str | None = None,
+    since : int | None = None,
+    authorization : Annotated[str | None, Header()] = None,
+    db: Session = Depends(get_db)
+):
+    # Browsers can't set headers of WebSocket requests, the token may be passed as a query parameter
+    if token is None and authorization and authorization.lower().startswith('bearer '):
+        token = authorization[7:]
+    try:
+        current_user = await get_user_by_token(db, token or '')
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    if not check_access(db, current_user, project_id, AccessLevels.read_access) or not crud.get_project_by_id(db, project_id):
+        await websocket.close(code=1008)
+        return
+    feed = project_changes(db, project_id, since)
+    await websocket.accept()
+
+    async def send():
+        try:
+            async for version, message in feed:
+                await websocket.send_text(message)
+            await websocket.close()
+        finally:
+            await feed.aclose()
+
+    async def receive():
+        while (await websocket.receive())['type'] != 'websocket.disconnect':
+            pass
+
+    tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Plain function, so the layout is computed in the thread pool instead of the event loop
+@app.get("/project/{project_id}/layout")
+def get_graph_layout(
+    project_id : int,
+    current_user: Annotated[models.User, Depends(get_current_user)],
+    db: Session = Depends(get_db)
+):
+    if not check_access(db, current_user, project_id, AccessLevels.read_access):
+        raise access_exception
+    layout = layouts.get_layout(db, project_id, get_project_by_pid)
+    if not layout:
+        raise non_exist_exception
+    return layout
+
+
+@app.get("/search/nodes")
+def search_project_nodes(
+    q : Annotated[str, Query(min_length=1, max_length=200)],
+    current_user: Annotated[models.User, Depends(get_current_user)],
+    limit : Annotated[int, Query(ge=1, le=100)] = 20,
+    offset : Annotated[int, Query(ge=0)] = 0,
+    db: Session = Depends(get_db)
+):
+    nodes = crud.search_nodes(db, current_user.user_id, q, limit + 1, offset)
+    return {'nodes' : nodes[:limit], 'next' : offset + limit if len(nodes) > limit else None}
+
 
 @app.post("/project")
 async def create_project(
@@ -177,14 +572,27 @@ async def create_project(
 ):
     project = schemas.ProjectCreate(project_author = current_user.user_id, **project.model_dump())
     db_project = crud.add_project(db, project, dir=SAVE_DIRECTORY)
-    graph = get_project_by_pid(db, db_project.project_id)
+    graph = get_project_by_pid(db, db_project.project_id, LoadProfile.topology)
     graph.get_vertex('__BEGIN__').add_edge(graph.get_vertex('__END__'))
     save_project_by_pid(db, db_project.project_id, graph)
     return {'Message' : 'Success', 'project' : db_project}
 
 
+@app.post("/project/import")
+def import_projects(
+    archive : UploadFile,
+    current_user: Annotated[models.User, Depends(get_current_user)],
+    db: Session = Depends(get_db)
+):
+    try:
+        files = read_archive(archive.file)
+    except tarfile.TarError:
+        raise illegal_input_exception
+    return importer.run(db, current_user.user_id, files)
+
+
 @app.post("/project/{project_id}/graph")
-async def save_full_graph(
+def save_full_graph(
     project_id : int,
     project : GraphModel,
     current_user: Annotated[models.User, Depends(get_current_user)],
@@ -193,12 +601,13 @@ async def save_full_graph(
     if not check_access(db, current_user, project_id, AccessLevels.edit_access):
         raise access_exception
     graph = Graph(project_id, project.model_dump())
-    save_project_by_pid(db, project_id, graph)
+    with project_locks.write(project_id):
+        save_project_by_pid(db, project_id, graph)
     return {'Message' : 'Success'}
 
 
 @app.post("/project/{project_id}/node")
-async def add_new_node(
+def add_new_node(
     project_id : int,
     node : schemas.NodeCreate,
     current_user: Annotated[models.User, Depends(get_current_user)],
@@ -206,12 +615,19 @@ async def add_new_node(
 ):
     if not check_access(db, current_user, project_id, AccessLevels.edit_access):
         raise access_exception
-    new_node = crud.add_node(db, project_id, node)
-    return {'Message' : 'Success', 'node' : new_node}
+    with project_locks.write(project_id):
+        new_node = crud.add_node(db, project_id, node, flush=False)
+        db.flush()
+        delta = {'vertices_added' : [history.node_vertex(new_node)]}
+        history.record(db, project_id, delta, partial(history_state, db, project_id))
+        crud.apply_change(db, new_node)
+        graph_cache.invalidate(project_id)
+        changes.broker.publish(db, project_id, history.events(delta))
+        return {'Message' : 'Success', 'node' : new_node}
 
 
 @app.post("/project/{project_id}/edge")
-async def add_new_edge(
+def add_new_edge(
     project_id : int,
     edge : GraphEdge,
     current_user: Annotated[models.User, Depends(get_current_user)],
@@ -219,18 +635,72 @@ async def add_new_edge(
 ):
     if not check_access(db, current_user, project_id, AccessLevels.edit_access):
         raise access_exception
-    graph : Graph = get_project_by_pid(db, project_id)
+    with project_locks.write(project_id):
+        graph : Graph = get_project_by_pid(db, project_id, LoadProfile.topology)
+
+        edge_dump = {**edge.model_dump()}
+        edge_dump['next_vertex'] = graph.get_vertex(edge.next_vertex)
+        vert = graph.get_vertex(edge.cur_vertex)
+        if not vert or not edge_dump['next_vertex']:
+            raise non_exist_exception
+        if edge.cur_vertex == '__END__' or edge.next_vertex == '__BEGIN__':
+            raise illegal_input_exception
+        replaced = vert.get_edge(edge_dump['next_vertex'], False) is not None
+        vert.add_edge(**edge_dump)
+        save_project_edge(db, project_id, graph, vert, edge_dump['next_vertex'], replaced=replaced)
+        return {'Message' : 'Success'}
+
+
+# Plain function, so the graph is loaded in the thread pool; the walk itself streams on the event loop
+@app.post("/project/{project_id}/walk")
+def walk_project_graph(
+    project_id : int,
+    current_user: Annotated[models.User, Depends(get_current_user)],
+    max_steps : Annotated[int, Query(ge=1, le=WALK_MAX_STEPS)] = WALK_MAX_STEPS,
+    concurrency : Annotated[int, Query(ge=1, le=WALK_CONCURRENCY)] = WALK_CONCURRENCY,
+    db: Session = Depends(get_db)
+):
+    if not check_access(db, current_user, project_id, AccessLevels.read_access):
+        raise access_exception
+    # Metadata is read now, the session is closed before processors of the walk use it
+    graph : Graph = get_project_by_pid(db, project_id, LoadProfile.full)
+    if not graph:
+        raise non_exist_exception
+    walker = AsyncWalker(graph, concurrency=concurrency, max_steps=max_steps)
+
+    async def events():
+        async for event in walker.walk():
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
 
-    edge_dump = {**edge.model_dump()}
-    edge_dump['next_vertex'] = graph.get_vertex(edge.next_vertex)
-    vert = graph.get_vertex(edge.cur_vertex)
-    if not vert:
+    return StreamingResponse(events(), media_type='text/event-stream', headers={'Cache-Control' : 'no-cache', 'X-Accel-Buffering' : 'no'})
+
+
+# Plain function, so the simulation runs in the thread pool instead of the event loop
+@app.post("/project/{project_id}/simulate")
+def simulate_project_walks(
+    project_id : int,
+    current_user: Annotated[models.User, Depends(get_current_user)],
+    weights : list[GraphEdgeWeight] = [],
+    walks : Annotated[int, Query(ge=1, le=SIMULATION_MAX_WALKS)] = 10000,
+    max_steps : Annotated[int, Query(ge=1, le=WALK_MAX_STEPS)] = WALK_MAX_STEPS,
+    seed : int | None = None,
+    db: Session = Depends(get_db)
+):
+    if not check_access(db, current_user, project_id, AccessLevels.read_access):
+        raise access_exception
+    graph : Graph = get_project_by_pid(db, project_id, LoadProfile.topology)
+    if not graph:
         raise non_exist_exception
-    if edge.cur_vertex == '__END__' or edge.next_vertex == '__BEGIN__':
-        raise illegal_input_exception
-    vert.add_edge(**edge_dump)
-    save_project_by_pid(db, project_id, graph)
-    return {'Message' : 'Success'}
+    edge_weights = {}
+    for weight in weights:
+        vertex = graph.get_vertex(weight.cur_vertex)
+        next_vertex = graph.get_vertex(weight.next_vertex)
+        if not vertex or not next_vertex or not vertex.get_edge(next_vertex, False):
+            raise non_exist_exception
+        edge_weights[vertex.id, next_vertex.id] = weight.probability
+    result = WalkSimulation(graph, edge_weights).run(walks, max_steps, seed)
+    result['visits'] = [{'id' : id, 'visits' : visits} for id, visits in result['visits'].items()]
+    return result
 
 
 @app.post("/project/{project_id}/users/{user_id}")
@@ -255,7 +725,7 @@ async def add_new_access(
 
 
 @app.patch("/project/{project_id}")
-async def update_project_info(
+def update_project_info(
     project_id : int,
     project : schemas.Project,
     current_user: Annotated[models.User, Depends(get_current_user)],
@@ -263,12 +733,17 @@ async def update_project_info(
 ):
     if not check_access(db, current_user, project_id, AccessLevels.edit_access):
         raise access_exception
-    upd_project = crud.update_project(db, project)
-    return {'Message' : 'Success', 'project' : upd_project}
+    with project_locks.write(project_id):
+        upd_project = crud.update_project(db, project, flush=False)
+        history.record(db, project_id, {'label' : project.project_label} if project.project_label else {}, partial(history_state, db, project_id))
+        crud.apply_change(db, upd_project)
+        graph_cache.invalidate(project_id)
+        changes.broker.publish(db, project_id, [{'type' : 'project_updated', **crud.strip_project_path(upd_project).model_dump(mode='json')}])
+        return {'Message' : 'Success', 'project' : upd_project}
 
 
 @app.patch("/project/{project_id}/node/{node_id}")
-async def update_node_info(
+def update_node_info(
     project_id : int,
     node_id : int,
     node : schemas.NodeCreate,
@@ -277,32 +752,41 @@ async def update_node_info(
 ):
     if not check_access(db, current_user, project_id, AccessLevels.edit_access):
         raise access_exception
-    db_node = crud.get_node_by_id(db, node_id)
-    if not db_node:
-        raise non_exist_exception
-    if db_node.project_id != project_id:
-        raise wrong_project_exception
+    with project_locks.write(project_id):
+        db_node = crud.get_node_by_id(db, node_id)
+        if not db_node:
+            raise non_exist_exception
+        if db_node.project_id != project_id:
+            raise wrong_project_exception
 
-    upd_node = crud.update_node(db, node)
-    return {'Message' : 'Success', 'node' : upd_node}
+        upd_node = crud.update_node(db, schemas.Node(node_id=node_id, project_id=project_id, **node.model_dump()), flush=False)
+        delta = {'vertices_updated' : [history.node_vertex(upd_node)]}
+        history.record(db, project_id, delta, partial(history_state, db, project_id))
+        crud.apply_change(db, upd_node)
+        graph_cache.invalidate(project_id)
+        changes.broker.publish(db, project_id, history.events(delta))
+        return {'Message' : 'Success', 'node' : upd_node}
 
 
 
 @app.delete("/project/{project_id}")
-async def delete_full_project(
+def delete_full_project(
     project_id : int,
     current_user: Annotated[models.User, Depends(get_current_user)],
     db: Session = Depends(get_db)
 ):
     if not check_access(db, current_user, project_id, AccessLevels.full_access):
         raise access_exception
-    if not crud.del_project(db, project_id):
-        raise non_exist_exception
-    return {'Message' : 'Success'}
+    with project_locks.write(project_id):
+        if not crud.del_project(db, project_id):
+            raise non_exist_exception
+        graph_cache.invalidate(project_id)
+        changes.broker.delete(project_id)
+        return {'Message' : 'Success'}
 
 
 @app.delete("/project/{project_id}/users/{user_id}")
-async def delete_user_access(
+def delete_user_access(
     project_id : int,
     user_id : int,
     current_user: Annotated[models.User, Depends(get_current_user)],
@@ -310,15 +794,18 @@ async def delete_user_access(
 ):
     if not check_access(db, current_user, project_id, AccessLevels.edit_access):
         raise access_exception
-    
-    access = schemas.Access(user_id=user_id, project_id=project_id)
-    if not crud.del_access(db, access):
-        raise non_exist_exception
-    return {'Message' : 'Success'}
+    with project_locks.write(project_id):
+        access = schemas.Access(user_id=user_id, project_id=project_id)
+        if not crud.del_access(db, access, flush=False):
+            raise non_exist_exception
+        history.record(db, project_id, {}, partial(history_state, db, project_id))
+        db.commit()
+        changes.broker.publish(db, project_id, [])
+        return {'Message' : 'Success'}
 
 
 @app.delete("/project/{project_id}/node/{node_id}")
-async def delete_graph_node(
+def delete_graph_node(
     project_id : int,
     node_id : int,
     current_user: Annotated[models.User, Depends(get_current_user)],
@@ -326,15 +813,16 @@ async def delete_graph_node(
 ):
     if not check_access(db, current_user, project_id, AccessLevels.edit_access):
         raise access_exception
-    graph : Graph = get_project_by_pid(db, project_id)
-    if graph.get_vertex(node_id):
-        graph.del_vertex(node_id)
-        save_project_by_pid(db, project_id, graph)
-    return {'Message' : 'Success'}
+    with project_locks.write(project_id):
+        graph : Graph = get_project_by_pid(db, project_id, LoadProfile.labels)
+        if graph.get_vertex(node_id):
+            graph.del_vertex(node_id)
+            save_project_by_pid(db, project_id, graph)
+        return {'Message' : 'Success'}
 
 
 @app.delete("/project/{project_id}/edge")
-async def delete_graph_edge(
+def delete_graph_edge(
     project_id : int,
     edge : GraphEdgeDesc,
     current_user: Annotated[models.User, Depends(get_current_user)],
@@ -342,11 +830,19 @@ async def delete_graph_edge(
 ):
     if not check_access(db, current_user, project_id, AccessLevels.edit_access):
         raise access_exception
-    graph : Graph = get_project_by_pid(db, project_id)
-    
-    vert = graph.get_vertex(edge.cur_vertex)
-    if not vert:
-        raise non_exist_exception
-    vert.del_edge(edge.next_vertex)
-    save_project_by_pid(db, project_id, graph)
-    return {'Message' : 'Success'}
+    with project_locks.write(project_id):
+        graph : Graph = get_project_by_pid(db, project_id, LoadProfile.topology)
+
+        vert = graph.get_vertex(edge.cur_vertex)
+        # Node IDs are integers, a client may send them as strings
+        next_vertex = int(edge.next_vertex) if type(edge.next_vertex) == str and edge.next_vertex.isdigit() else edge.next_vertex
+        if not vert or next_vertex not in vert.edges:
+            raise non_exist_exception
+        vert.del_edge(next_vertex)
+        save_project_edge(db, project_id, graph, vert, next_vertex, deleted=True)
+        return {'Message' : 'Success'}
+
+
+# After all routes, profiling wraps their endpoints
+if profiling.enabled:
+    profiling.profile_routes(app)
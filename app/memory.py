@@ -0,0 +1,92 @@
+import threading
+import tracemalloc
+
+from . import config
+from .graph.graph import deep_size
+from .instrumentation import Gauge, Histogram, register
+
+enabled : bool = config.MEMORY_TRACKING_ENABLED
+# Powers of 4 from 1 KiB to 1 GiB
+BYTE_BUCKETS = tuple(2 ** i for i in range(10, 31, 2))
+
+graph_footprint = register(Histogram('graph_api_graph_footprint_bytes', 'Memory of graphs loaded from storage, by load profile and part.', ('profile', 'part'), buckets=BYTE_BUCKETS))
+graph_state = register(Histogram('graph_api_graph_state_bytes', 'Memory of graph states put in the graph cache, by load profile.', ('profile',), buckets=BYTE_BUCKETS))
+project_footprint = register(Gauge('graph_api_project_graph_bytes', 'Memory of the last loaded graph of projects with the largest graphs.', ('project',)))
+request_peak = register(Histogram('graph_api_request_peak_allocation_bytes', 'Peak memory allocated while handling measured requests, by route.', ('method', 'route'), buckets=BYTE_BUCKETS))
+project_peak = register(Gauge('graph_api_project_peak_allocation_bytes', 'Largest peak allocation of a measured request, for projects with the largest peaks.', ('project',)))
+traced_memory = register(Gauge('graph_api_traced_memory_bytes', 'Memory allocated by Python and still in use, as traced by tracemalloc.'))
+
+
+class _Largest:
+    '''Values of a gauge labeled by project, kept for the `limit` projects with the largest values
+    so the number of series stays bounded.'''
+
+    def __init__(self, gauge : Gauge, limit : int, keep_max : bool) -> None:
+        self.gauge = gauge
+        self.limit = limit
+        self.keep_max = keep_max
+        self._values : dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def set(self, project, value : int):
+        project = str(project)
+        with self._lock:
+            if self.keep_max:
+                value = max(value, self._values.get(project, 0))
+            self._values[project] = value
+            if len(self._values) > self.limit:
+                smallest = min(self._values, key=self._values.get)
+                del self._values[smallest]
+                self.gauge.remove(smallest)
+                if smallest == project:
+                    return
+        self.gauge.set(project, value=value)
+
+
+_project_footprints = _Largest(project_footprint, config.MEMORY_TRACKING_PROJECTS, keep_max=False)
+_project_peaks = _Largest(project_peak, config.MEMORY_TRACKING_PROJECTS, keep_max=True)
+
+
+def graph_loaded(graph, profile : str, state : dict):
+    """Records the footprint of a graph loaded with `profile` and of its cached `state`."""
+    footprint = graph.memory_footprint()
+    for part, size in footprint.items():
+        graph_footprint.observe(profile, part, value=size)
+    graph_state.observe(profile, value=deep_size(state))
+    _project_footprints.set(graph.id, footprint['total'])
+
+
+class AllocationMiddleware:
+    '''ASGI middleware recording the peak memory allocated while handling HTTP requests,
+    by route and by project, with tracemalloc.
+
+    tracemalloc has a single peak for the process, so one request is measured at a time
+    and requests arriving meanwhile are not measured. Allocations of requests that were
+    already running are counted too, so under concurrent load a peak is an upper bound.
+    Tracing slows down allocations of all requests, the middleware is meant for sizing runs.
+    '''
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self._measuring = False
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or self._measuring:
+            return await self.app(scope, receive, send)
+
+        self._measuring = True
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self._measuring = False
+            traced_memory.set(value=current)
+            route = scope.get('route')
+            request_peak.observe(scope['method'], route.path if route else 'unmatched', value=peak - baseline)
+            project_id = scope.get('path_params', {}).get('project_id')
+            if project_id is not None:
+                _project_peaks.set(project_id, peak - baseline)
@@ -0,0 +1,376 @@
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from queue import Empty, SimpleQueue
+from time import perf_counter, time
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse
+from fastapi.routing import APIRoute
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from . import config
+from .auth import get_current_user
+from .instrumentation import Counter, register
+from .sql_app import crud, models
+from .sql_app.db import SessionLocal, get_db
+
+enabled : bool = config.PROFILING_ENABLED
+directory : str = config.PROFILE_DIRECTORY or os.path.join(config.SAVE_DIRECTORY, 'profiles')
+_header = config.PROFILE_HEADER.lower().encode()
+# Functions listed in a stored profile, by sampled or measured time
+TOP_FUNCTIONS = 40
+
+profiles_stored = register(Counter('graph_api_profiles_stored_total', 'Request profiles stored, by trigger.', ('trigger',)))
+
+
+class _Request:
+    '''Profiling state of one HTTP request.'''
+    __slots__ = ('start', 'forced', 'stacks', 'profile', 'graphs')
+
+    def __init__(self, forced : bool) -> None:
+        self.start = perf_counter()
+        self.forced = forced
+        self.stacks : StackCounter = StackCounter()
+        self.profile : cProfile.Profile | None = None
+        self.graphs : dict = {}
+
+
+_request : ContextVar[_Request | None] = ContextVar('profiled_request', default=None)
+# Frames of endpoint calls in progress and their requests, so the sampler knows which
+# request a thread is working on; frames above them belong to the framework
+_frames : dict = {}
+# Threads running cProfile, one profiler per thread can be active
+_cprofiling = threading.local()
+
+
+def graph_loaded(graph):
+    """Notes a graph used by the current request, its size is stored with the profile."""
+    request = _request.get()
+    if request is not None:
+        request.graphs[graph.id] = graph
+
+
+@contextmanager
+def _cprofile(request : _Request):
+    if not request.forced or getattr(_cprofiling, 'active', False):
+        yield
+        return
+    request.profile = request.profile or cProfile.Profile()
+    _cprofiling.active = True
+    request.profile.enable()
+    try:
+        yield
+    finally:
+        request.profile.disable()
+        _cprofiling.active = False
+
+
+def _profiled(call):
+    # Async endpoints stay coroutine functions, FastAPI has already decided how to call them
+    if asyncio.iscoroutinefunction(call):
+        @wraps(call)
+        async def wrapper(*args, **kwargs):
+            request = _request.get()
+            if request is None:
+                return await call(*args, **kwargs)
+            frame = sys._getframe()
+            _frames[frame] = request
+            try:
+                with _cprofile(request):
+                    return await call(*args, **kwargs)
+            finally:
+                del _frames[frame]
+    else:
+        @wraps(call)
+        def wrapper(*args, **kwargs):
+            request = _request.get()
+            if request is None:
+                return call(*args, **kwargs)
+            frame = sys._getframe()
+            _frames[frame] = request
+            try:
+                with _cprofile(request):
+                    return call(*args, **kwargs)
+            finally:
+                del _frames[frame]
+    return wrapper
+
+
+def profile_routes(app):
+    """Wraps endpoints of the app's API routes, must be called after all routes are added."""
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            route.dependant.call = _profiled(route.dependant.call)
+
+
+def _function_name(filename : str, line : int, function : str) -> str:
+    # Paths relative to the import path they were found on, e.g. app/main.py or fastapi/routing.py
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    return f'{function} ({filename}:{line})'
+
+
+_names : dict = {}
+
+def _name(code) -> str:
+    name = _names.get(code)
+    if name is None:
+        name = _names[code] = _function_name(code.co_filename, code.co_firstlineno, code.co_name)
+    return name
+
+
+def _graph_size(graph) -> dict:
+    ids = graph.get_vertices_IDs()
+    return {'vertices' : len(ids), 'edges' : sum(len(graph.get_vertex(id).edges) for id in ids)}
+
+
+def _sampled_functions(stacks : StackCounter) -> list[dict]:
+    own, total = StackCounter(), StackCounter()
+    for stack, count in stacks.items():
+        functions = stack.split(';')
+        own[functions[-1]] += count
+        for function in set(functions):
+            total[function] += count
+    return [{'function' : function, 'own' : own[function], 'total' : count} for function, count in total.most_common(TOP_FUNCTIONS)]
+
+
+def _measured_functions(profile : cProfile.Profile) -> list[dict]:
+    rows = [{'function' : _function_name(*function), 'calls' : calls, 'own' : round(own, 6), 'cumulative' : round(cumulative, 6)}
+            for function, (primitive_calls, calls, own, cumulative, callers) in pstats.Stats(profile).stats.items()]
+    rows.sort(key=lambda row : row['cumulative'], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+
+class Sampler:
+    '''Background thread that samples stacks of endpoint calls every `interval` seconds
+    and writes profiles of finished requests, so requests don't wait for either.'''
+
+    def __init__(self, interval : float) -> None:
+        self.interval = interval
+        self._thread : threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._queue : SimpleQueue = SimpleQueue()
+        self._written = 0
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                    self._thread.start()
+
+    def store(self, request : _Request, data : dict):
+        self._queue.put((request, data))
+
+    def shutdown(self):
+        """Stops sampling after writing queued profiles."""
+        with self._lock:
+            if self._thread is not None:
+                self._stop.set()
+                self._thread.join()
+                self._thread = None
+                self._stop.clear()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if _frames:
+                self.sample()
+            self._write_queued()
+        self._write_queued()
+
+    def sample(self):
+        for frame in sys._current_frames().values():
+            names = []
+            while frame is not None:
+                request = _frames.get(frame)
+                if request is not None:
+                    if names:
+                        request.stacks[';'.join(reversed(names))] += 1
+                    break
+                names.append(_name(frame.f_code))
+                frame = frame.f_back
+
+    def _write_queued(self):
+        while True:
+            try:
+                request, data = self._queue.get_nowait()
+            except Empty:
+                return
+            try:
+                self._write(request, data)
+            except Exception as error:
+                print(f'Profiling: could not store profile of {data["path"]}: {error}')
+
+    def _write(self, request : _Request, data : dict):
+        self._written += 1
+        id = f'{int(data["time"] * 1000)}-{os.getpid()}-{self._written}'
+        data['id'] = id
+        data['time'] = datetime.fromtimestamp(data['time'], timezone.utc).isoformat()
+        data['graphs'] = {str(pid) : _graph_size(graph) for pid, graph in request.graphs.items()}
+        data['samples'] = {'interval' : self.interval, 'count' : sum(request.stacks.values()), 'stacks' : dict(request.stacks)}
+        data['functions'] = _sampled_functions(request.stacks)
+        data['cprofile'] = None
+        os.makedirs(directory, exist_ok=True)
+        if request.profile is not None:
+            data['cprofile'] = _measured_functions(request.profile)
+            request.profile.dump_stats(os.path.join(directory, id + '.prof'))
+        # Renamed into place, so listings of other workers never read a partial file
+        path = os.path.join(directory, id + '.json')
+        with open(path + '.tmp', 'w') as file:
+            json.dump(data, file)
+        os.replace(path + '.tmp', path)
+        profiles_stored.inc(data['trigger'])
+        self._prune()
+
+    def _prune(self):
+        ids = sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json'))
+        for id in ids[:max(0, len(ids) - config.PROFILE_KEEP)]:
+            for suffix in ('.json', '.prof'):
+                try:
+                    os.remove(os.path.join(directory, id + suffix))
+                except FileNotFoundError:
+                    pass
+
+
+sampler = Sampler(config.PROFILE_INTERVAL_SECONDS)
+
+
+class ProfilingMiddleware:
+    '''ASGI middleware keeping profiles of HTTP requests slower than `PROFILE_THRESHOLD_SECONDS`,
+    and of admin requests with the `PROFILE_HEADER` header, which are profiled with cProfile as well.
+
+    Stacks of every request's endpoint are sampled while it runs and dropped if it was fast,
+    so a request only costs a context variable and a dict entry unless its profile is kept.
+    '''
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope['headers'])
+        # cProfile slows the request down several times, other users' headers are ignored
+        forced = _header in headers and await asyncio.to_thread(_is_admin, headers.get(b'authorization', b'').decode())
+        request = _Request(forced)
+        token = _request.set(request)
+        sampler.start()
+        response_status = None
+
+        async def send_with_status(message):
+            nonlocal response_status
+            if message['type'] == 'http.response.start':
+                response_status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request.reset(token)
+            duration = perf_counter() - request.start
+            if request.forced or duration >= config.PROFILE_THRESHOLD_SECONDS:
+                route = scope.get('route')
+                sampler.store(request, {
+                    'time' : time() - duration,
+                    'method' : scope['method'],
+                    'route' : route.path if route else 'unmatched',
+                    'path' : scope['path'],
+                    'project_id' : scope.get('path_params', {}).get('project_id'),
+                    'status' : response_status,
+                    'duration' : round(duration, 6),
+                    'trigger' : 'header' if request.forced else 'slow',
+                })
+
+
+def _is_admin(authorization : str) -> bool:
+    """Whether the bearer token of the Authorization header belongs to a user with access to all projects."""
+    scheme, _, token = authorization.partition(' ')
+    if scheme.lower() != 'bearer':
+        return False
+    try:
+        user_id = int(jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM]).get('sub'))
+    except (JWTError, TypeError, ValueError):
+        return False
+    db = SessionLocal()
+    try:
+        return crud.has_global_access(db, user_id)
+    finally:
+        db.close()
+
+
+admin_exception = HTTPException(
+    status_code=status.HTTP_405_METHOD_NOT_ALLOWED,
+    detail="Not enough access rights",
+)
+
+non_exist_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Object doesn`t exist"
+)
+
+_profile_id = re.compile(r'\d+-\d+-\d+')
+
+
+def get_admin(
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Users with access to all projects."""
+    if not crud.has_global_access(db, current_user.user_id):
+        raise admin_exception
+    return current_user
+
+
+def _profile_path(profile_id : str, suffix : str) -> str:
+    path = os.path.join(directory, profile_id + suffix)
+    if not _profile_id.fullmatch(profile_id) or not os.path.exists(path):
+        raise non_exist_exception
+    return path
+
+
+profiles = APIRouter(dependencies=[Depends(get_admin)])
+
+@profiles.get("/admin/profiles")
+def list_profiles(limit : int = Query(50, ge=1)):
+    """Stored profiles, newest first, without samples and function lists."""
+    if not os.path.isdir(directory):
+        return {'profiles' : []}
+    ids = sorted((name[:-5] for name in os.listdir(directory) if name.endswith('.json')), reverse=True)[:limit]
+    summaries = []
+    for id in ids:
+        try:
+            with open(os.path.join(directory, id + '.json')) as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            continue
+        for key in ('samples', 'functions', 'cprofile'):
+            data.pop(key)
+        summaries.append(data)
+    return {'profiles' : summaries}
+
+@profiles.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id : str):
+    """Profile with sampled stacks in collapsed form (flame graph input) and the busiest functions."""
+    with open(_profile_path(profile_id, '.json')) as file:
+        return json.load(file)
+
+@profiles.get("/admin/profiles/{profile_id}/pstats")
+def get_profile_stats(profile_id : str):
+    """cProfile statistics of a header triggered profile, for `pstats` or snakeviz."""
+    return FileResponse(_profile_path(profile_id, '.prof'), media_type='application/octet-stream', filename=profile_id + '.prof')
@@ -1,7 +1,23 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select, exists, or_, and_, func, literal_column, table, column, text, event
+from sqlalchemy.orm import Session, load_only
+from enum import Enum
 import datetime
+import re
 
 from . import models, schemas
+from .migrations import NODE_SEARCH_VECTOR
+
+
+class LoadProfile(Enum):
+    topology : str = 'topology'
+    labels : str = 'labels'
+    full : str = 'full'
+
+# Columns selected for each profile, the rest are deferred and loaded on first access
+_profile_columns = {
+    LoadProfile.topology : (models.Node.node_id, models.Node.project_id),
+    LoadProfile.labels : (models.Node.node_id, models.Node.project_id, models.Node.node_label),
+}
 
 def strip_project_path(db_project: models.Project):
     return schemas.ProjectData(**db_project.__dict__)
@@ -23,30 +39,169 @@ def get_user_access(db: Session, access: schemas.Access | schemas.AccessCreate):
         return project_access.access_level
     return None
 
+def get_user_access_levels(db: Session, user_id: int, project_ids: list[int]) -> dict[int, int]:
+    """Access levels of a user to each of the projects in one query, same as `get_user_access` for every project.
+    Projects without access are left out."""
+    query = select(models.UserAccess.project_id, models.UserAccess.access_level).where(
+        models.UserAccess.user_id == user_id,
+        or_(models.UserAccess.project_id.in_(project_ids), models.UserAccess.project_id == None),
+    )
+    rows = db.execute(query).all()
+    levels = {project_id : level for project_id, level in rows if project_id is not None}
+    full_access = max((level for project_id, level in rows if project_id is None), default=None)
+    if full_access is not None:
+        for project_id in project_ids:
+            levels[project_id] = max(full_access, levels.get(project_id, full_access))
+    return levels
+
 def get_project_users(db: Session, project_id: int):
     # Warning: this function doesn't list superusers with access to all projects without direct access to this project
     project_access = db.query(models.UserAccess).filter(models.UserAccess.project_id == project_id)
     return [{'user_id' : access.user_id, 'user_access' : access.access_level} for access in project_access]
 
-def get_user_projects(db: Session, user_id: int):
-    all_user_access = db.query(models.UserAccess).filter(models.UserAccess.user_id == user_id)
-    if all_user_access.filter(models.UserAccess.project_id == None).first():
-        return [project.project_id for project in db.query(models.Project)]
-    return [item.project_id for item in all_user_access if item.access_level]
+def get_projects_users(db: Session, project_ids: list[int]) -> dict[int, list[dict]]:
+    """`get_project_users` of several projects in one query."""
+    users = {project_id : [] for project_id in project_ids}
+    for access in db.query(models.UserAccess).filter(models.UserAccess.project_id.in_(project_ids)):
+        users[access.project_id].append({'user_id' : access.user_id, 'user_access' : access.access_level})
+    return users
+
+def accessible_projects(user_id: int):
+    # Access to all projects is granted by a record without project_id
+    global_access = exists().where(models.UserAccess.user_id == user_id, models.UserAccess.project_id == None)
+    project_access = select(models.UserAccess.project_id).where(
+        models.UserAccess.user_id == user_id, models.UserAccess.access_level > 0
+    )
+    return or_(global_access, models.Project.project_id.in_(project_access))
+
+_search_words = re.compile(r'\w+')
+# Wildcards of LIKE in query words match literally
+_like_escape = re.compile(r'[\\%_]')
+# Databases where migrations created the nodes_fts table
+_fts_databases : dict[str, bool] = {}
+
+def _has_nodes_fts(db: Session) -> bool:
+    url = str(db.get_bind().url)
+    if url not in _fts_databases:
+        _fts_databases[url] = db.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'nodes_fts'")).first() is not None
+    return _fts_databases[url]
 
-def get_user_projects_data(db: Session, user_id: int):
-    db_project_ids = get_user_projects(db, user_id)
-    return [strip_project_path(get_project_by_id(db, project_id)) for project_id in  db_project_ids]
+def has_global_access(db: Session, user_id: int) -> bool:
+    return db.query(exists().where(models.UserAccess.user_id == user_id, models.UserAccess.project_id == None)).scalar()
+
+def search_nodes(db: Session, user_id: int, query: str, limit: int = 20, offset: int = 0):
+    """Nodes of projects accessible to the user containing words starting with every word of the query,
+    best matches first. Matches in labels rank above matches in descriptions."""
+    words = _search_words.findall(query.lower())
+    if not words:
+        return []
+    # Resolved beforehand, a per-row access check costs more than the search itself
+    accessible = None if has_global_access(db, user_id) else select(models.UserAccess.project_id).where(
+        models.UserAccess.user_id == user_id, models.UserAccess.access_level > 0
+    )
+    dialect = db.get_bind().dialect.name
+    if dialect == 'sqlite' and _has_nodes_fts(db):
+        fts = table('nodes_fts', column('rowid'))
+        score = (-func.bm25(literal_column('nodes_fts'), 10.0, 1.0)).label('score')
+        matches = select(fts.c.rowid, score).where(literal_column('nodes_fts').match(' '.join(f'"{word}"*' for word in words)))
+        if accessible is not None:
+            matches = matches.join(models.Node, models.Node.node_id == fts.c.rowid).where(models.Node.project_id.in_(accessible))
+        # Only the requested page of ranked ids is joined with nodes
+        page = matches.order_by(score.desc(), fts.c.rowid).limit(limit).offset(offset).subquery()
+        search = select(models.Node, page.c.score).join(page, page.c.rowid == models.Node.node_id).order_by(page.c.score.desc(), models.Node.node_id)
+    else:
+        if dialect == 'postgresql':
+            vector = literal_column(NODE_SEARCH_VECTOR)
+            ts_query = func.to_tsquery('simple', ' & '.join(f'{word}:*' for word in words))
+            score = func.ts_rank(vector, ts_query).label('score')
+            search = select(models.Node, score).where(vector.op('@@')(ts_query)).order_by(score.desc(), models.Node.node_id)
+        else:
+            patterns = ['%' + _like_escape.sub(r'\\\g<0>', word) + '%' for word in words]
+            matches = [or_(models.Node.node_label.ilike(pattern, escape='\\'), models.Node.node_description.ilike(pattern, escape='\\')) for pattern in patterns]
+            search = select(models.Node, literal_column('0.0').label('score')).where(*matches).order_by(models.Node.node_id)
+        if accessible is not None:
+            search = search.where(models.Node.project_id.in_(accessible))
+        search = search.limit(limit).offset(offset)
+    return [{**_strip_node(node), 'score' : float(score)} for node, score in db.execute(search)]
+
+def _strip_node(node: models.Node):
+    return {'node_id' : node.node_id, 'project_id' : node.project_id, 'node_label' : node.node_label, 'node_description' : node.node_description}
+
+def _user_projects_query(query, user_id: int, page: schemas.ProjectPage):
+    column = getattr(models.Project, page.sort_by.value)
+    query = query.filter(accessible_projects(user_id))
+    if page.after is not None:
+        # Keyset pagination continues after the (sort value, project_id) pair of the given project
+        after_value = select(column).where(models.Project.project_id == page.after).scalar_subquery()
+        if page.descending:
+            query = query.filter(or_(column < after_value, and_(column == after_value, models.Project.project_id < page.after)))
+        else:
+            query = query.filter(or_(column > after_value, and_(column == after_value, models.Project.project_id > page.after)))
+    if page.descending:
+        query = query.order_by(column.desc(), models.Project.project_id.desc())
+    else:
+        query = query.order_by(column, models.Project.project_id)
+    return query.limit(page.limit)
+
+def get_user_projects(db: Session, user_id: int, page: schemas.ProjectPage = schemas.ProjectPage()):
+    query = _user_projects_query(db.query(models.Project.project_id), user_id, page)
+    return [project_id for project_id, in query]
+
+def get_user_projects_data(db: Session, user_id: int, page: schemas.ProjectPage = schemas.ProjectPage()):
+    query = _user_projects_query(db.query(models.Project), user_id, page)
+    return [strip_project_path(project) for project in query]
 
 def get_project_by_id(db: Session, project_id: int):
     return db.get(models.Project, project_id)
 
-def get_project_nodes(db: Session, project_id: int):
-    return db.query(models.Node).filter(models.Node.project_id == project_id).all()
+def get_project_versions(db: Session, project_ids: list[int]) -> dict[int, int]:
+    query = select(models.Project.project_id, models.Project.project_version).where(models.Project.project_id.in_(project_ids))
+    return {project_id : version for project_id, version in db.execute(query)}
+
+def get_project_nodes(db: Session, project_id: int, profile: LoadProfile = LoadProfile.full):
+    query = db.query(models.Node).filter(models.Node.project_id == project_id)
+    if profile in _profile_columns:
+        query = query.options(load_only(*_profile_columns[profile]))
+    return query.all()
+
+def get_projects_by_ids(db: Session, project_ids: list[int]) -> dict[int, models.Project]:
+    query = db.query(models.Project).filter(models.Project.project_id.in_(project_ids))
+    return {project.project_id : project for project in query}
+
+def get_projects_nodes(db: Session, project_ids: list[int], profile: LoadProfile = LoadProfile.full) -> dict[int, list[models.Node]]:
+    """`get_project_nodes` of several projects in one query."""
+    query = db.query(models.Node).filter(models.Node.project_id.in_(project_ids)).order_by(models.Node.node_id)
+    if profile in _profile_columns:
+        query = query.options(load_only(*_profile_columns[profile]))
+    nodes = {project_id : [] for project_id in project_ids}
+    for node in query:
+        nodes[node.project_id].append(node)
+    return nodes
+
+def stream_projects(db: Session, user_id: int | None = None, after: int = 0, batch: int = 100):
+    """Project rows after the given ID in ID order, read with a server-side cursor. All projects without `user_id`."""
+    query = select(*models.Project.__table__.c).where(models.Project.project_id > after).order_by(models.Project.project_id)
+    if user_id is not None:
+        query = query.where(accessible_projects(user_id))
+    return db.execute(query.execution_options(yield_per=batch))
+
+def stream_project_nodes(db: Session, project_id: int, batch: int = 1000):
+    query = select(*models.Node.__table__.c).where(models.Node.project_id == project_id).order_by(models.Node.node_id)
+    return db.execute(query.execution_options(yield_per=batch))
+
+def get_node_metadata(node: models.Node):
+    return {
+        'node_description' : node.node_description,
+        'node_created' : node.node_created,
+        'node_updated' : node.node_updated,
+        }
 
 def get_node_by_id(db: Session, node_id: int):
     return db.get(models.Node, node_id)
 
+def get_project_edges(db: Session, project_id: int):
+    return db.query(models.Edge).filter(models.Edge.project_id == project_id).order_by(models.Edge.edge_id).all()
+
 
 def apply_change(db: Session, object: models.Base):
     db.commit()
@@ -89,6 +244,21 @@ def add_project(db: Session, project: schemas.ProjectCreate, dir: str):
     return db_project
 
 
+def add_edge(db: Session, edge: models.Edge, flush=True):
+    del_edge(db, edge.project_id, edge.src, edge.dst, flush=False)
+    db.add(edge)
+    if flush:
+        db.commit()
+    return edge
+
+def replace_project_edges(db: Session, project_id: int, edges: list[dict], flush=True):
+    db.query(models.Edge).filter(models.Edge.project_id == project_id).delete(synchronize_session=False)
+    if edges:
+        db.execute(insert(models.Edge), [{'project_id' : project_id, **edge} for edge in edges])
+    if flush:
+        db.commit()
+
+
 def update_access(db: Session, access: schemas.AccessCreate, flush=True):
     db_access = db.query(models.UserAccess).filter(models.UserAccess.user_id == access.user_id, models.UserAccess.project_id == access.project_id).first()
     db_access.access_level = access.access_level
@@ -108,12 +278,25 @@ def update_node(db: Session, node: schemas.Node, flush=True):
         apply_change(db, db_node)
     return db_node
 
+# Projects whose version is already incremented in the current transaction of a session
+_BUMPED = 'bumped_projects'
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _forget_bumped(db: Session):
+    db.info.pop(_BUMPED, None)
+
 def update_project(db: Session, project: schemas.Project, flush=True):
     db_project = get_project_by_id(db, project.project_id)
     for attr, value in project.model_dump().items():
         if value:
             setattr(db_project, attr, value)
     db_project.project_updated = datetime.datetime.now(datetime.UTC)
+    bumped = db.info.setdefault(_BUMPED, set())
+    if db_project.project_id not in bumped:
+        # Incremented in SQL, so concurrent commits of several workers get distinct versions
+        db_project.project_version = models.Project.project_version + 1
+        bumped.add(db_project.project_id)
     if flush:
         apply_change(db, db_project)
     return db_project
@@ -147,9 +330,19 @@ def del_node(db: Session, node_id: int, flush=True):
             return True
     return db_node
 
+def del_edge(db: Session, project_id: int, src: str, dst: str, flush=True):
+    deleted = db.query(models.Edge).filter(
+        models.Edge.project_id == project_id, models.Edge.src == src, models.Edge.dst == dst
+    ).delete(synchronize_session=False)
+    if flush:
+        db.commit()
+    return deleted
+
 def del_project(db: Session, project_id: int, flush=True):
     db_project = get_project_by_id(db, project_id)
     if db_project:
+        db.query(models.Edge).filter(models.Edge.project_id == project_id).delete(synchronize_session=False)
+        db.query(models.ProjectHistory).filter(models.ProjectHistory.project_id == project_id).delete(synchronize_session=False)
         db.delete(db_project)
         if flush:
             db.commit()
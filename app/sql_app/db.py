@@ -1,9 +1,27 @@
-from sqlalchemy import create_engine
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+from itertools import cycle
+import hmac
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 from .. import config
 
-engine = create_engine(config.SQLALCHEMY_DATABASE_URL)
+
+def _engine(url : str):
+    options = {'pool_pre_ping' : config.DB_POOL_PRE_PING, 'pool_recycle' : config.DB_POOL_RECYCLE}
+    # In-memory SQLite keeps one connection per thread, queue pool settings don't apply
+    if make_url(url).database not in (None, '', ':memory:'):
+        options.update(pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW, pool_timeout=config.DB_POOL_TIMEOUT)
+    return create_engine(url, **options)
+
+
+engine = _engine(config.SQLALCHEMY_DATABASE_URL)
+replica_engines = [_engine(url) for url in config.SQLALCHEMY_REPLICA_URLS]
+_replicas = cycle(replica_engines)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -13,4 +31,108 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# State of the current request: whether its reads must see the primary, and whether it wrote
+_request : ContextVar[dict | None] = ContextVar('request_writes', default=None)
+# Last write time per Authorization header of clients that wrote through this worker
+_writers : dict[str, float] = {}
+WRITE_COOKIE = 'last_write'
+
+def get_read_db():
+    """Session of a read-only route: a replica, or the primary for a client that wrote recently."""
+    request = _request.get()
+    if not replica_engines or (request and request['primary']):
+        yield from get_db()
+        return
+    db = SessionLocal(bind=next(_replicas))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@event.listens_for(Session, 'after_flush')
+def _flushed(db : Session, context):
+    db.info['wrote'] = True
+
+@event.listens_for(Session, 'do_orm_execute')
+def _executed(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info['wrote'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _committed(db : Session):
+    request = _request.get()
+    if db.info.pop('wrote', False) and request is not None:
+        request['wrote'] = True
+
+@event.listens_for(Session, 'after_rollback')
+def _rolled_back(db : Session):
+    db.info.pop('wrote', None)
+
+
+class ReadYourWritesMiddleware:
+    '''ASGI middleware sending reads of clients that committed changes in the last
+    `READ_YOUR_WRITES_SECONDS` to the primary, so replica lag doesn't hide their own changes.
+
+    Writers are recognized by their token within a worker, and by a signed cookie across workers.
+    '''
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] not in ('http', 'websocket'):
+            return await self.app(scope, receive, send)
+
+        now = time.time()
+        headers = dict(scope['headers'])
+        client = headers.get(b'authorization', b'').decode()
+        cookie = SimpleCookie(headers.get(b'cookie', b'').decode())
+        last_write = max(_writers.get(client, 0) if client else 0, _cookie_time(cookie[WRITE_COOKIE].value, now) if WRITE_COOKIE in cookie else 0)
+        request = {'primary' : now - last_write < config.READ_YOUR_WRITES_SECONDS, 'wrote' : False}
+        token = _request.set(request)
+
+        async def send_with_cookie(message):
+            if message['type'] == 'http.response.start' and request['wrote']:
+                written = time.time()
+                if client:
+                    _remember(client, written)
+                message = {**message, 'headers' : [*message.get('headers', []),
+                    (b'set-cookie', f'{WRITE_COOKIE}={_sign(written)}; Max-Age={int(config.READ_YOUR_WRITES_SECONDS) + 1}; Path=/; HttpOnly'.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _request.reset(token)
+            # Writes of responses streamed after their start, e.g. change feeds, still pin later reads
+            if request['wrote'] and client:
+                _remember(client, time.time())
+
+
+def _signature(value : str) -> str:
+    return hmac.new(config.SECRET_KEY.encode(), value.encode(), 'sha256').hexdigest()
+
+def _sign(written : float) -> str:
+    value = f'{written:.3f}'
+    return f'{value}.{_signature(value)}'
+
+def _cookie_time(cookie : str, now : float) -> float:
+    """Write time of a cookie set by `_sign`, 0 if it is forged. Clocks of workers may differ,
+    a time ahead of this one counts as now."""
+    value, _, signature = cookie.rpartition('.')
+    if not hmac.compare_digest(signature, _signature(value)):
+        return 0
+    try:
+        return min(float(value), now)
+    except ValueError:
+        return 0
+
+def _remember(client : str, written : float):
+    _writers[client] = written
+    if len(_writers) > 10_000:
+        for key in [key for key, value in _writers.items() if written - value >= config.READ_YOUR_WRITES_SECONDS]:
+            del _writers[key]
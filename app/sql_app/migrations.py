@@ -0,0 +1,144 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from . import models
+
+# Weighted text of a node, PostgreSQL search index and queries must use the same expression
+NODE_SEARCH_VECTOR = ("setweight(to_tsvector('simple', coalesce(node_label, '')), 'A') || "
+                      "setweight(to_tsvector('simple', coalesce(node_description, '')), 'B')")
+
+# Applied schema version is kept apart from application tables
+_metadata = MetaData()
+schema_version = Table('schema_version', _metadata, Column('version', Integer, nullable=False))
+
+
+def _create_index(conn : Connection, table, name : str):
+    index = next(index for index in table.__table__.indexes if index.name == name)
+    index.create(bind=conn, checkfirst=True)
+
+
+# Tables as they were before migrations were kept. Migration 1 creates them from this copy, not from
+# the models, which also have what later migrations add
+_baseline = MetaData()
+Table('users', _baseline,
+      Column('user_id', Integer, primary_key=True),
+      Column('username', String),
+      Column('email', String),
+      Column('password', String))
+Table('projects', _baseline,
+      Column('project_id', Integer, primary_key=True),
+      Column('project_code', String),
+      Column('project_label', String),
+      Column('project_path', String),
+      Column('project_author', Integer, ForeignKey('users.user_id')),
+      Column('project_description', String),
+      Column('project_created', DateTime),
+      Column('project_updated', DateTime))
+Table('nodes', _baseline,
+      Column('node_id', Integer, primary_key=True),
+      Column('node_label', String),
+      Column('project_id', Integer, ForeignKey('projects.project_id')),
+      Column('node_description', String),
+      Column('node_created', DateTime),
+      Column('node_updated', DateTime))
+Table('edges', _baseline,
+      Column('edge_id', Integer, primary_key=True),
+      Column('project_id', Integer, ForeignKey('projects.project_id')),
+      Column('src', String),
+      Column('dst', String),
+      Column('threading', Boolean),
+      Column('morph', String),
+      Index('ix_edges_project_src', 'project_id', 'src'),
+      Index('ix_edges_project_dst', 'project_id', 'dst'))
+Table('user_access', _baseline,
+      Column('access_id', Integer, primary_key=True),
+      Column('user_id', Integer, ForeignKey('users.user_id')),
+      Column('project_id', Integer, ForeignKey('projects.project_id')),
+      Column('access_level', Integer))
+
+
+def _initial_schema(conn : Connection):
+    _baseline.create_all(bind=conn)
+
+def _hot_column_indexes(conn : Connection):
+    _create_index(conn, models.Node, 'ix_nodes_project_id')
+    _create_index(conn, models.UserAccess, 'ix_user_access_user_project')
+    _create_index(conn, models.User, 'ix_users_username')
+
+
+def _sqlite_has_fts5(conn : Connection) -> bool:
+    return any(option == 'ENABLE_FTS5' for option, in conn.execute(text('PRAGMA compile_options')))
+
+def _node_search_index(conn : Connection):
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_nodes_search ON nodes USING GIN (({NODE_SEARCH_VECTOR}))'))
+    elif conn.dialect.name == 'sqlite' and _sqlite_has_fts5(conn):
+        # External content table kept in sync with nodes by triggers
+        conn.execute(text("""CREATE VIRTUAL TABLE IF NOT EXISTS nodes_fts USING fts5(
+            node_label, node_description, content='nodes', content_rowid='node_id', tokenize='unicode61 remove_diacritics 2')"""))
+        conn.execute(text("""CREATE TRIGGER IF NOT EXISTS nodes_fts_insert AFTER INSERT ON nodes BEGIN
+            INSERT INTO nodes_fts(rowid, node_label, node_description) VALUES (new.node_id, new.node_label, new.node_description);
+            END"""))
+        conn.execute(text("""CREATE TRIGGER IF NOT EXISTS nodes_fts_delete AFTER DELETE ON nodes BEGIN
+            INSERT INTO nodes_fts(nodes_fts, rowid, node_label, node_description) VALUES ('delete', old.node_id, old.node_label, old.node_description);
+            END"""))
+        conn.execute(text("""CREATE TRIGGER IF NOT EXISTS nodes_fts_update AFTER UPDATE OF node_label, node_description ON nodes BEGIN
+            INSERT INTO nodes_fts(nodes_fts, rowid, node_label, node_description) VALUES ('delete', old.node_id, old.node_label, old.node_description);
+            INSERT INTO nodes_fts(rowid, node_label, node_description) VALUES (new.node_id, new.node_label, new.node_description);
+            END"""))
+        conn.execute(text("INSERT INTO nodes_fts(nodes_fts) VALUES ('rebuild')"))
+    else:
+        print('Full-text search index is not supported by the database, node search will scan nodes')
+
+
+def _project_version(conn : Connection):
+    if 'project_version' not in {column['name'] for column in inspect(conn).get_columns('projects')}:
+        conn.execute(text('ALTER TABLE projects ADD COLUMN project_version INTEGER NOT NULL DEFAULT 0'))
+
+
+def _project_history(conn : Connection):
+    models.ProjectHistory.__table__.create(bind=conn, checkfirst=True)
+
+
+def _edge_probability(conn : Connection):
+    if 'probability' not in {column['name'] for column in inspect(conn).get_columns('edges')}:
+        conn.execute(text('ALTER TABLE edges ADD COLUMN probability FLOAT'))
+
+
+# Each migration makes only its own change. Databases created with `create_all` before migrations were kept
+# may already have some of it, so migrations skip tables, columns and indexes that exist
+migrations = [
+    (1, 'initial schema', _initial_schema),
+    (2, 'indexes on hot query columns', _hot_column_indexes),
+    (3, 'full-text search index on nodes', _node_search_index),
+    (4, 'project version counter', _project_version),
+    (5, 'project history', _project_history),
+    (6, 'edge probabilities', _edge_probability),
+]
+
+
+def get_version(conn : Connection) -> int:
+    _metadata.create_all(bind=conn)
+    version = conn.execute(select(schema_version.c.version)).scalar()
+    return version or 0
+
+def set_version(conn : Connection, version : int):
+    conn.execute(schema_version.delete())
+    conn.execute(schema_version.insert().values(version=version))
+
+
+def migrate(engine : Engine, target : int | None = None) -> int:
+    """Applies pending migrations up to `target` (latest by default) and returns resulting version."""
+    with engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            # Workers starting simultaneously wait for the first one to finish
+            conn.execute(text('SELECT pg_advisory_xact_lock(20240601)'))
+        version = get_version(conn)
+        for number, description, apply in migrations:
+            if number <= version or (target is not None and number > target):
+                continue
+            print(f'Schema migration {number}: {description}')
+            apply(conn)
+            version = number
+        set_version(conn, version)
+    return version
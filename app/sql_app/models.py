@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, DateTime
+from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Boolean, Float, Index, LargeBinary
 import datetime
 
 from .db import Base
@@ -8,11 +8,25 @@ class Node(Base):
     __tablename__ = 'nodes'
     node_id = Column(Integer, primary_key=True)
     node_label = Column(String)
-    project_id = Column(Integer, ForeignKey('projects.project_id'))
+    project_id = Column(Integer, ForeignKey('projects.project_id'), index=True)
     node_description = Column(String)
     node_created = Column(DateTime, default=datetime.datetime.now(datetime.UTC))
     node_updated = Column(DateTime, default=datetime.datetime.now(datetime.UTC))
 
+class Edge(Base):
+    __tablename__ = 'edges'
+    edge_id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, ForeignKey('projects.project_id'))
+    src = Column(String)
+    dst = Column(String)
+    threading = Column(Boolean, default=False)
+    morph = Column(String)
+    probability = Column(Float)
+    __table_args__ = (
+        Index('ix_edges_project_src', 'project_id', 'src'),
+        Index('ix_edges_project_dst', 'project_id', 'dst'),
+    )
+
 class Project(Base):
     __tablename__ = 'projects'
     project_id = Column(Integer, primary_key=True)
@@ -23,6 +37,25 @@ class Project(Base):
     project_description = Column(String)
     project_created = Column(DateTime, default=datetime.datetime.now(datetime.UTC))
     project_updated = Column(DateTime, default=datetime.datetime.now(datetime.UTC))
+    # Incremented once per committed change of the project, change feed messages carry it
+    project_version = Column(Integer, nullable=False, default=0, server_default='0')
+
+class ProjectHistory(Base):
+    __tablename__ = 'project_history'
+    history_id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, ForeignKey('projects.project_id'), nullable=False)
+    version = Column(Integer, nullable=False)
+    # Compressed JSON: change from the previous version and, for snapshots, the whole graph
+    delta = Column(LargeBinary)
+    state = Column(LargeBinary)
+    size = Column(Integer)
+    # Sizes of deltas since the last snapshot and of that snapshot, to decide when to store the next one
+    chain_size = Column(Integer)
+    base_size = Column(Integer)
+    created = Column(DateTime, default=lambda : datetime.datetime.now(datetime.UTC))
+    __table_args__ = (
+        Index('ix_project_history_project_version', 'project_id', 'version', unique=True),
+    )
 
 class UserAccess(Base):
     __tablename__ = 'user_access'
@@ -30,10 +63,13 @@ class UserAccess(Base):
     user_id = Column(Integer, ForeignKey('users.user_id'))
     project_id = Column(Integer, ForeignKey('projects.project_id'))
     access_level = Column(Integer)
+    __table_args__ = (
+        Index('ix_user_access_user_project', 'user_id', 'project_id'),
+    )
 
 class User(Base):
     __tablename__ = 'users'
     user_id = Column(Integer, primary_key=True)
-    username = Column(String)
+    username = Column(String, unique=True, index=True)
     email = Column(String)
     password = Column(String)
@@ -1,5 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
+from enum import Enum
+
+from ..graph_models import GraphModelReturn
 
 
 class UserCredAuth(BaseModel):
@@ -50,3 +53,51 @@ class Project(ProjectBase):
 class ProjectData(ProjectCreate, Project):
     project_created : datetime
     project_updated : datetime
+    project_version : int = 0
+
+
+class ProjectSortField(Enum):
+    project_id : str = 'project_id'
+    project_label : str = 'project_label'
+    project_created : str = 'project_created'
+    project_updated : str = 'project_updated'
+
+class ExportFormat(Enum):
+    ndjson : str = 'ndjson'
+    tar : str = 'tar'
+
+class BatchPart(Enum):
+    info : str = 'info'
+    graph : str = 'graph'
+    chapters : str = 'chapters'
+    users : str = 'users'
+
+class ProjectBatch(BaseModel):
+    project_ids : list[int] = Field(min_length=1)
+    parts : list[BatchPart] = [BatchPart.info]
+
+class ProjectAccessData(BaseModel):
+    project : ProjectData
+    access : int | None
+
+class BatchError(BaseModel):
+    status_code : int
+    detail : str
+
+class ProjectBatchItem(BaseModel):
+    project_id : int
+    version : int | None = None
+    info : ProjectAccessData | None = None
+    graph : GraphModelReturn | None = None
+    chapters : list | None = None
+    users : list[dict] | None = None
+    error : BatchError | None = None
+
+class ProjectBatchResult(BaseModel):
+    projects : list[ProjectBatchItem]
+
+class ProjectPage(BaseModel):
+    sort_by : ProjectSortField = ProjectSortField.project_id
+    descending : bool = False
+    after : int | None = None
+    limit : int = Field(100, ge=1, le=1000)
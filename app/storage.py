@@ -0,0 +1,178 @@
+import argparse
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Iterator
+
+from sqlalchemy.orm import Session
+
+from .graph.graph import Graph
+from .graph.vertex import Vertex
+from .sql_app import crud, models
+from . import config
+
+
+def _vertex_id(value : str) -> int | str:
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _edge_row(vertex : Vertex, edge : dict) -> dict:
+    morph = edge.get('morph')
+    return {
+        'src' : str(vertex.id),
+        'dst' : str(edge['next_vertex'].id),
+        'threading' : bool(edge.get('threading')),
+        'morph' : morph.get('name') if morph else None,
+        'probability' : edge.get('probability'),
+    }
+
+
+def _transition_names(morph : dict) -> tuple:
+    predicate = morph.get('predicate')
+    function = morph.get('function')
+    return morph.get('name'), predicate.get('name') if predicate else None, function.get('name') if function else None
+
+
+def _graph_edges(graph : Graph) -> list[dict]:
+    vertices = [graph.get_vertex(id) for id in graph.get_vertices_IDs()]
+    return [_edge_row(vertex, edge) for vertex in vertices for edge in vertex.edges.values()]
+
+
+class GraphStorage(ABC):
+    '''Keeps graph edges of a project. Vertices always come from the nodes table.'''
+
+    @abstractmethod
+    def load(self, db : Session, project : models.Project, graph : Graph):
+        """Adds edges of the project to `graph`, which has its vertices."""
+
+    @abstractmethod
+    def save(self, db : Session, project : models.Project, graph : Graph):
+        """Returns truthy value if save failed."""
+
+    @abstractmethod
+    def add_edge(self, db : Session, project : models.Project, graph : Graph, vertex : Vertex, next_vertex : Vertex):
+        """Stores edge already added to `graph`."""
+
+    @abstractmethod
+    def del_edge(self, db : Session, project : models.Project, graph : Graph, vertex : Vertex, next_vertex : int | str):
+        """Removes edge already deleted from `graph`."""
+
+    @abstractmethod
+    def read_aDOT(self, db : Session, project : models.Project, chunk_size : int) -> Iterator[str]:
+        """Yields aDOT text of the project graph in chunks."""
+
+    @abstractmethod
+    def write_new(self, path : str, graph : Graph) -> list[dict]:
+        """Writes the graph of a project being imported, without a database session.
+        Returns edge rows the caller inserts into the edges table."""
+
+
+class FileStorage(GraphStorage):
+    '''Edges live in the aDOT file of a project, every change rewrites it.'''
+
+    def load(self, db, project, graph):
+        graph.import_aDOT(project.project_path, clear=False, check_errors=False)
+
+    def save(self, db, project, graph):
+        return graph.export_aDOT(project.project_path)
+
+    def add_edge(self, db, project, graph, vertex, next_vertex):
+        return self.save(db, project, graph)
+
+    def del_edge(self, db, project, graph, vertex, next_vertex):
+        return self.save(db, project, graph)
+
+    def read_aDOT(self, db, project, chunk_size):
+        if not os.path.exists(project.project_path):
+            return
+        with open(project.project_path) as file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+
+    def write_new(self, path, graph):
+        if graph.export_aDOT(path):
+            raise OSError(f'Could not write {path}')
+        return []
+
+
+class HybridStorage(GraphStorage):
+    '''Edges live in the edges table. The aDOT file is still written on full saves
+    and keeps function, transition and selector definitions.'''
+
+    def load(self, db, project, graph):
+        if os.path.exists(project.project_path):
+            graph.import_aDOT(project.project_path, clear=False, check_errors=False, edges=False)
+        for edge in crud.get_project_edges(db, project.project_id):
+            vertex = graph.add_vertex(id=_vertex_id(edge.src))
+            next_vertex = graph.add_vertex(id=_vertex_id(edge.dst))
+            vertex.add_edge(next_vertex, threading=edge.threading, morph=graph.get_transition(edge.morph), probability=edge.probability)
+
+    def save(self, db, project, graph):
+        if graph.export_aDOT(project.project_path):
+            return 1
+        crud.replace_project_edges(db, project.project_id, _graph_edges(graph), flush=False)
+
+    def add_edge(self, db, project, graph, vertex, next_vertex):
+        edge = vertex.get_edge(next_vertex)
+        morph = edge.get('morph')
+        # Transitions are defined in the aDOT file only, an edge with a transition the file
+        # doesn't define yet is saved with the whole graph, so the definition isn't lost
+        if morph and _transition_names(graph.get_transition(morph.get('name'))) != _transition_names(morph):
+            return self.save(db, project, graph)
+        crud.add_edge(db, models.Edge(project_id=project.project_id, **_edge_row(vertex, edge)), flush=False)
+
+    def del_edge(self, db, project, graph, vertex, next_vertex):
+        crud.del_edge(db, project.project_id, str(vertex.id), str(next_vertex), flush=False)
+
+    def read_aDOT(self, db, project, chunk_size):
+        # The file may have outdated edges, the graph is written anew with edges of the table
+        graph = Graph(project.project_id, label=str(project.project_label))
+        self.load(db, project, graph)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'graph.gv')
+            graph.export_aDOT(path)
+            yield from FileStorage().read_aDOT(db, models.Project(project_path=path), chunk_size)
+
+    def write_new(self, path, graph):
+        if graph.export_aDOT(path):
+            raise OSError(f'Could not write {path}')
+        return _graph_edges(graph)
+
+
+storages = {'file' : FileStorage, 'hybrid' : HybridStorage}
+
+storage : GraphStorage = storages[config.GRAPH_STORAGE]()
+
+
+def migrate_files(db : Session):
+    """Copies edges of every project from its aDOT file into the edges table."""
+    file_storage = FileStorage()
+    migrated = 0
+    for project in db.query(models.Project).order_by(models.Project.project_id):
+        if not project.project_path or not os.path.exists(project.project_path):
+            print(f'Project {project.project_id}: no graph file, skipped')
+            continue
+        graph = Graph(project.project_id, label=str(project.project_label))
+        file_storage.load(db, project, graph)
+        crud.replace_project_edges(db, project.project_id, _graph_edges(graph))
+        migrated += 1
+    return migrated
+
+
+if __name__ == '__main__':
+    from .sql_app.db import SessionLocal, engine
+    from .sql_app.migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Graph storage tools')
+    parser.add_argument('command', choices=['migrate'], help='migrate: copy edges from aDOT files into the edges table')
+    args = parser.parse_args()
+
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        print(f'Migrated {migrate_files(db)} projects')
+    finally:
+        db.close()
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Thread
+from time import perf_counter
+
+from sqlalchemy.orm import Session
+
+from .graph.registry import registry
+from .graph_cache import graph_cache, GraphCache
+from .sql_app import migrations, models
+from .sql_app.crud import LoadProfile
+from .sql_app.db import SessionLocal, engine
+from . import config
+
+# Profiles requested by hot endpoints: /graph and /chapters with edge mutations
+WARMUP_PROFILES = [LoadProfile.full, LoadProfile.topology]
+
+
+class WarmupState:
+    def __init__(self) -> None:
+        self.schema_version : int | None = None
+        self.functions : int = 0
+        self.total : int = 0
+        self.loaded : int = 0
+        self.failed : int = 0
+        self.skipped : int = 0
+        self.elapsed : float = 0.0
+        self.ready : bool = False
+
+    def report(self) -> dict:
+        return {
+            'ready' : self.ready,
+            'schema_version' : self.schema_version,
+            'functions' : self.functions,
+            'projects' : {'total' : self.total, 'loaded' : self.loaded, 'failed' : self.failed, 'skipped' : self.skipped},
+            'elapsed' : round(self.elapsed, 3),
+            'budget' : config.WARMUP_BUDGET_SECONDS,
+        }
+
+
+state = WarmupState()
+
+
+def hot_projects(db : Session, limit : int) -> list[int]:
+    query = db.query(models.Project.project_id).order_by(models.Project.project_updated.desc()).limit(limit)
+    return [project_id for project_id, in query]
+
+
+def _preload(load_project, pid : int, deadline : float) -> str:
+    if perf_counter() > deadline:
+        return 'skipped'
+    db = SessionLocal()
+    try:
+        for profile in WARMUP_PROFILES:
+            load_project(db, pid, profile)
+        return 'loaded'
+    except Exception as error:
+        print(f'Warm-up: project {pid} failed to load: {error}')
+        return 'failed'
+    finally:
+        db.close()
+
+
+def warm_up(load_project, start : float):
+    deadline = start + config.WARMUP_BUDGET_SECONDS
+    try:
+        state.functions = registry.preload()
+        if config.WARMUP_PROJECTS and type(graph_cache) != GraphCache:
+            db = SessionLocal()
+            try:
+                projects = hot_projects(db, config.WARMUP_PROJECTS)
+            finally:
+                db.close()
+            state.total = len(projects)
+            with ThreadPoolExecutor(config.WARMUP_WORKERS) as pool:
+                futures = [pool.submit(_preload, load_project, pid, deadline) for pid in projects]
+                for future in as_completed(futures):
+                    result = future.result()
+                    setattr(state, result, getattr(state, result) + 1)
+    finally:
+        state.elapsed = perf_counter() - start
+        state.ready = True
+        over_budget = ' (over budget)' if state.elapsed > config.WARMUP_BUDGET_SECONDS else ''
+        print(f'Warm-up finished in {state.elapsed:.2f}s{over_budget}: {state.loaded} of {state.total} projects cached')
+
+
+def start(load_project):
+    """Checks schema and starts background warm-up. `load_project` is called as
+    `load_project(db, project_id, profile)` and must put the graph into the graph cache."""
+    start = perf_counter()
+    state.schema_version = migrations.migrate(engine)
+    Thread(target=warm_up, args=(load_project, start), name='warm-up', daemon=True).start()
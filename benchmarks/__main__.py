@@ -0,0 +1,50 @@
+import argparse
+import json
+import os
+import sys
+
+BASELINES = os.path.join(os.path.dirname(__file__), 'baselines')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Graph hot path benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run benchmark suites')
+    run.add_argument('--sizes', default='100,1000,10000', help='comma separated vertex counts, up to 1000000')
+    run.add_argument('-k', dest='select', help='run only suites with this substring in name')
+    run.add_argument('--save', metavar='NAME', help=f'store results as baseline NAME in {BASELINES}')
+    run.add_argument('--compare', metavar='NAME', help='compare results with stored baseline NAME')
+    run.add_argument('--threshold', type=float, default=0.1, help='allowed relative slowdown, 0.1 by default')
+
+    compare = commands.add_parser('compare', help='compare two stored baselines')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.1)
+
+    args = parser.parse_args()
+    # get_priorities walks graphs recursively
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100_000))
+
+    from .runner import run_suites, compare as compare_results
+    if args.command == 'run':
+        from .suites import suites
+        results = run_suites(suites, [int(size) for size in args.sizes.split(',')], args.select)
+        if args.save:
+            os.makedirs(BASELINES, exist_ok=True)
+            with open(os.path.join(BASELINES, args.save + '.json'), 'w') as file:
+                json.dump(results, file, indent=2)
+        if args.compare:
+            return 1 if compare_results(load(args.compare), results, args.threshold) else 0
+    else:
+        return 1 if compare_results(load(args.baseline), load(args.current), args.threshold) else 0
+    return 0
+
+
+def load(name : str) -> dict:
+    path = name if os.path.exists(name) else os.path.join(BASELINES, name + '.json')
+    with open(path) as file:
+        return json.load(file)
+
+
+sys.exit(main())
@@ -0,0 +1,104 @@
+"""Latency of reading many projects with one `POST /projects/batch` request against a request
+per project, through uvicorn on a temporary SQLite database.
+
+For every part (graph, chapters, info, users) the same projects are read with requests sent one
+after another, with all requests sent at once over `--connections` connections (browsers open 6 per
+host), and with one batch request; median times are printed.
+
+    python -m benchmarks.batch_read --projects 30 --size 200 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from .http_load import PASSWORD, free_port, seed, start_server
+
+ROUTES = {'graph' : '/project/{}/graph', 'chapters' : '/project/{}/chapters', 'info' : '/project/{}', 'users' : '/project/{}/users'}
+
+
+async def timed(job) -> float:
+    start = time.perf_counter()
+    await job
+    return time.perf_counter() - start
+
+
+async def one_by_one(http : httpx.AsyncClient, headers : dict, route : str, projects : list[int]):
+    for project in projects:
+        (await http.get(route.format(project), headers=headers)).raise_for_status()
+
+
+async def all_at_once(http : httpx.AsyncClient, headers : dict, route : str, projects : list[int]):
+    responses = await asyncio.gather(*[http.get(route.format(project), headers=headers) for project in projects])
+    for response in responses:
+        response.raise_for_status()
+
+
+async def batch(http : httpx.AsyncClient, headers : dict, part : str, projects : list[int]):
+    response = await http.post('/projects/batch', json={'project_ids' : projects, 'parts' : [part]}, headers=headers)
+    response.raise_for_status()
+    errors = [result for result in response.json()['projects'] if 'error' in result]
+    if errors:
+        raise RuntimeError(f'Batch read failed for {errors}')
+
+
+async def measure(base_url : str, username : str, projects : list[int], rounds : int, connections : int) -> dict:
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=httpx.Limits(max_connections=connections)) as http:
+        response = await http.post('/auth', data={'username' : username, 'password' : PASSWORD})
+        response.raise_for_status()
+        headers = {'Authorization' : 'Bearer ' + response.json()['access_token']}
+        for part, route in ROUTES.items():
+            times = {'one by one' : [], 'all at once' : [], 'batch' : []}
+            for _ in range(rounds):
+                times['one by one'].append(await timed(one_by_one(http, headers, route, projects)))
+                times['all at once'].append(await timed(all_at_once(http, headers, route, projects)))
+                times['batch'].append(await timed(batch(http, headers, part, projects)))
+            results[part] = {way : statistics.median(values) for way, values in times.items()}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.batch_read', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, default=30, help='projects read by every request series')
+    parser.add_argument('--size', type=int, default=200, help='vertices per project graph')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--connections', type=int, default=6, help='connections of requests sent at once')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE', help='extra application settings, e.g. GRAPH_CACHE=local')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        environment = {
+            'SQLALCHEMY_DATABASE_URL' : f'sqlite:///{directory}/graph_api.db',
+            'SAVE_DIRECTORY' : os.path.join(directory, 'graphs') + os.sep,
+            'SECRET_KEY' : secrets.token_hex(32),
+            'ACCESS_TOKEN_EXPIRE_MINUTES' : '60',
+            **dict(item.split('=', 1) for item in args.env),
+        }
+        os.makedirs(environment['SAVE_DIRECTORY'])
+        seeded = seed(environment, 1, args.projects, args.size, args.seed)
+
+        port = free_port()
+        server = start_server(environment, args.workers, port)
+        try:
+            results = asyncio.run(measure(f'http://127.0.0.1:{port}', seeded['users'][min(seeded['users'])], sorted(seeded['nodes']), args.rounds, args.connections))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.projects} projects of {args.size} vertices, median ms")
+    print(f"{'part':<9} {'one by one':>11} {'all at once':>12} {'batch':>8} {'speedup':>8}")
+    for part, times in results.items():
+        fastest = min(times['one by one'], times['all at once'])
+        print(f"{part:<9} {times['one by one'] * 1000:>11.0f} {times['all at once'] * 1000:>12.0f} {times['batch'] * 1000:>8.0f} {fastest / times['batch']:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
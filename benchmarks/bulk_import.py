@@ -0,0 +1,80 @@
+"""Rate of bulk project import (`app.importer.ProjectImporter`) into a temporary SQLite database.
+
+Generates aDOT files and imports them with different numbers of worker processes, each run
+into a fresh database, reporting files and vertices imported per second.
+
+    python -m benchmarks.bulk_import --files 200 --vertices 2000 --workers 1,2,4,8
+"""
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(directory : str, workers : int):
+    """Imports the files of `directory`/files into `directory`/<workers>, in this process."""
+    target = os.path.join(directory, str(workers))
+    os.makedirs(target)
+    os.environ.update({
+        'SQLALCHEMY_DATABASE_URL' : f'sqlite:///{target}/graph_api.db',
+        'SAVE_DIRECTORY' : target + os.sep,
+        'SECRET_KEY' : secrets.token_hex(32),
+        'ACCESS_TOKEN_EXPIRE_MINUTES' : '60',
+    })
+    sys.path.insert(0, ROOT)
+    from app import config
+    from app.importer import ProjectImporter, read_directory
+    from app.sql_app import models
+    from app.sql_app.db import SessionLocal, engine
+    from app.sql_app.migrations import migrate
+
+    migrate(engine)
+    db = SessionLocal()
+    db.add(models.User(username='importer', email='', password=''))
+    db.commit()
+    files = read_directory(os.path.join(directory, 'files'))
+    importer = ProjectImporter(workers, config.IMPORT_BATCH)
+    start = time.perf_counter()
+    report = importer.run(db, 1, files)
+    elapsed = time.perf_counter() - start
+    importer.shutdown()
+    db.close()
+    vertices = sum(item['nodes'] for item in report['imported'])
+    print(f"{workers:>7} {len(report['imported']):>6} {elapsed:>8.2f} {len(report['imported']) / elapsed:>8.1f} {vertices / elapsed:>11.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bulk_import', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--vertices', type=int, default=2000)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.run, int(args.workers))
+        return
+
+    sys.path.insert(0, ROOT)
+    from benchmarks.generator import generate_adot
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, 'files'))
+        for i in range(args.files):
+            with open(os.path.join(directory, 'files', f'project{i}.gv'), 'w') as file:
+                file.write(generate_adot(args.vertices, seed=args.seed + i))
+        print(f'{args.files} files of {args.vertices} vertices, {os.cpu_count()} cores')
+        print(f"{'workers':>7} {'files':>6} {'seconds':>8} {'files/s':>8} {'vertices/s':>11}")
+        for workers in args.workers.split(','):
+            # Every run in its own process, settings are read once on import
+            subprocess.run([sys.executable, '-m', 'benchmarks.bulk_import', '--run', directory, '--workers', workers], cwd=ROOT, check=True)
+
+
+if __name__ == '__main__':
+    main()
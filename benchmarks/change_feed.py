@@ -0,0 +1,81 @@
+"""Fan-out of project change feeds (`app.changes.ChangeBroker`) inside one worker process.
+
+Subscribes many consumers to one project, publishes a series of changes and reports
+how long it takes until every subscriber has received each message.
+
+    python -m benchmarks.change_feed --subscribers 1000,10000 --messages 100
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def measure(broker_class, subscribers : int, messages : int) -> dict:
+    broker = broker_class(buffer_size=256, projects=16, poll_seconds=0)
+    events = [{'type' : 'node_updated', 'node_id' : 1, 'node_label' : 'stage', 'node_description' : 'x' * 100}]
+    received = [0] * messages
+    done = asyncio.Event()
+
+    async def consume():
+        async for version, message in broker.subscribe(1, 0, since=0):
+            received[version - 1] += 1
+            if version == messages:
+                break
+        if all(count == subscribers for count in received):
+            done.set()
+
+    tasks = [asyncio.create_task(consume()) for _ in range(subscribers)]
+    await asyncio.sleep(0)
+    while broker.feeds[1].subscribers < subscribers:
+        await asyncio.sleep(0.01)
+
+    latencies = []
+    start = time.perf_counter()
+    for version in range(1, messages + 1):
+        sent = time.perf_counter()
+        broker._publish(1, version, events)
+        while received[version - 1] < subscribers:
+            await asyncio.sleep(0)
+        latencies.append(time.perf_counter() - sent)
+    elapsed = time.perf_counter() - start
+    await asyncio.wait_for(done.wait(), 10)
+    await asyncio.gather(*tasks)
+    latencies.sort()
+    return {
+        'subscribers' : subscribers,
+        'deliveries_per_second' : subscribers * messages / elapsed,
+        'p50_ms' : latencies[len(latencies) // 2] * 1000,
+        'p99_ms' : latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.change_feed', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', default='100,1000,10000')
+    parser.add_argument('--messages', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({
+            'SQLALCHEMY_DATABASE_URL' : f'sqlite:///{directory}/graph_api.db',
+            'SAVE_DIRECTORY' : directory + os.sep,
+            'SECRET_KEY' : secrets.token_hex(32),
+            'ACCESS_TOKEN_EXPIRE_MINUTES' : '60',
+        })
+        sys.path.insert(0, ROOT)
+        from app.changes import ChangeBroker
+
+        print(f"{'subscribers':>11} {'deliveries/s':>13} {'p50 ms':>9} {'p99 ms':>9}")
+        for subscribers in [int(value) for value in args.subscribers.split(',')]:
+            result = asyncio.run(measure(ChangeBroker, subscribers, args.messages))
+            print(f"{result['subscribers']:>11} {result['deliveries_per_second']:>13.0f} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
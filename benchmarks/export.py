@@ -0,0 +1,73 @@
+"""Throughput and memory of streaming project export (`app.exporter`) from a temporary SQLite database.
+
+Imports generated aDOT files as projects, then exports growing numbers of them as NDJSON and
+tar, reporting the rate and the peak of memory allocated during the export (tracemalloc),
+which should not grow with the number of projects.
+
+    python -m benchmarks.export --projects 1000 --vertices 500
+"""
+import argparse
+import os
+import secrets
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.export', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, default=1000)
+    parser.add_argument('--vertices', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=2024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({
+            'SQLALCHEMY_DATABASE_URL' : f'sqlite:///{directory}/graph_api.db',
+            'SAVE_DIRECTORY' : directory + os.sep,
+            'SECRET_KEY' : secrets.token_hex(32),
+            'ACCESS_TOKEN_EXPIRE_MINUTES' : '60',
+        })
+        sys.path.insert(0, ROOT)
+        from app import exporter
+        from app.importer import importer
+        from app.sql_app import models
+        from app.sql_app.db import SessionLocal, engine
+        from app.sql_app.migrations import migrate
+        from benchmarks.generator import generate_adot
+
+        migrate(engine)
+        db = SessionLocal()
+        db.add(models.User(username='exporter', email='', password=''))
+        db.commit()
+        start = time.perf_counter()
+        files = [(f'project{i}.gv', generate_adot(args.vertices, seed=args.seed + i).encode()) for i in range(args.projects)]
+        report = importer.run(db, 1, files)
+        importer.shutdown()
+        print(f"Imported {len(report['imported'])} projects of {args.vertices} vertices in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'format':<7} {'projects':>8} {'MiB':>8} {'seconds':>8} {'projects/s':>11} {'MiB/s':>7} {'peak KiB':>9}")
+        for format, export in exporter.exporters.items():
+            for projects in sorted({max(1, args.projects // 10), args.projects}):
+                # Projects after `after` are exported, the last `projects` of them
+                after = args.projects - projects
+                start = time.perf_counter()
+                size = sum(len(chunk) for chunk in export(db, None, after))
+                elapsed = time.perf_counter() - start
+                db.rollback()
+                # Traced separately, tracing slows the export down several times
+                tracemalloc.start()
+                for chunk in export(db, None, after):
+                    pass
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                db.rollback()
+                print(f'{format:<7} {projects:>8} {size / 2 ** 20:>8.1f} {elapsed:>8.2f} {projects / elapsed:>11.0f} {size / 2 ** 20 / elapsed:>7.1f} {peak / 1024:>9.0f}')
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import random
+
+# Block kinds making up a project track, with relative frequency
+BLOCKS = {'chain' : 4, 'diamond' : 2, 'fanout' : 1, 'parallel' : 2}
+
+HEADER = '''// Определения функций-селекторов
+\tsel1 [module=select_module, entry_func=select1]
+
+// Определения функций-обработчиков
+\tproc1 [module=processor_module, entry_func=process1]
+
+// Определения функций-предикатов
+\tpred1 [module=predicate_module, entry_func=predicate1]
+
+// Определения функций перехода
+\tmorph1 [predicate=pred1, function=proc1]
+\tmorph2 [predicate=pred1]
+'''
+
+
+class _Builder:
+    def __init__(self, rng : random.Random, morph_rate : float) -> None:
+        self.rng = rng
+        self.morph_rate = morph_rate
+        self.next_id = 1
+        self.edges : list[str] = []
+        self.selectors : list[int] = []
+
+    def vertex(self) -> int:
+        self.next_id += 1
+        return self.next_id - 1
+
+    def edge(self, src, dst, threading = False):
+        morph = ''
+        if self.rng.random() < self.morph_rate:
+            morph = f'[morphism={self.rng.choice(["morph1", "morph2"])}]'
+        self.edges.append(f"\t{src} {'=>' if threading else '->'} {dst} {morph}")
+
+    def block(self, start, budget : int) -> int:
+        """Appends a block after `start` using at most `budget` vertices and returns its last vertex."""
+        kind = self.rng.choices(list(BLOCKS), weights=list(BLOCKS.values()))[0]
+        if kind == 'chain' or budget < 4:
+            last = start
+            for _ in range(min(budget, self.rng.randint(2, 8))):
+                vertex = self.vertex()
+                self.edge(last, vertex)
+                last = vertex
+            return last
+
+        width = min(budget - 2, self.rng.randint(2, 6 if kind != 'fanout' else 24))
+        split, join = self.vertex(), self.vertex()
+        self.edge(start, split)
+        branches = [self.vertex() for _ in range(width)]
+        if kind == 'fanout':
+            self.selectors.append(split)
+        for branch in branches:
+            self.edge(split, branch, threading = kind == 'parallel')
+            self.edge(branch, join)
+        return join
+
+
+def generate_adot(vertices : int, seed : int = 0, tracks : int | None = None, morph_rate : float = 0.1, graph_id : int = 1) -> str:
+    """Generates aDOT text of a project graph with about `vertices` stages.
+
+    The graph starts with fan-out from __BEGIN__ into parallel tracks (sqrt of size by default),
+    each track is a series of chains, diamonds, selector fan-outs and `=>` parallel sections.
+    """
+    rng = random.Random(seed)
+    builder = _Builder(rng, morph_rate)
+    tracks = tracks or max(1, int(vertices ** 0.5) // 4)
+    per_track = max(1, vertices // tracks)
+
+    for track in range(tracks):
+        budget = per_track if track < tracks - 1 else vertices - builder.next_id + 1
+        last = '__BEGIN__'
+        start = builder.next_id
+        while builder.next_id - start < budget:
+            last = builder.block(last, budget - (builder.next_id - start))
+        builder.edge(last, '__END__')
+
+    selectors = '\n'.join(f'\t{vertex} [selector=sel1]' for vertex in builder.selectors)
+    body = '\n'.join(builder.edges)
+    return f'digraph {graph_id}\n{{\n{HEADER}\n// В узле указана функция-селектор\n{selectors}\n\n// Описание графовой модели\n{body}\n}}\n'
+
+
+def generate_template(vertices : int, seed : int = 0, id_prefix : str = '', **kwargs) -> dict:
+    """Generates graph template in the format accepted by `Graph(int, dict)` and `POST /project/{id}/graph`.
+
+    With `id_prefix` stage IDs become strings, so the API treats them as new nodes.
+    """
+    from app.graph.graph import Graph
+    
+    def vertex_id(id):
+        return f'{id_prefix}{id}' if id_prefix and type(id) == int else id
+
+    graph = Graph(1)
+    graph.import_aDOT(generate_adot(vertices, seed, **kwargs), from_data=True)
+    template = {'project_label' : 'benchmark', 'vertices' : {}}
+    for vertex in graph.export_dict()['vertices'].values():
+        id = vertex_id(vertex['id'])
+        edges = {str(vertex_id(next_id)) : {'cur_vertex' : id, 'next_vertex' : vertex_id(next_id), 'threading' : edge['threading'], 'morph' : {}}
+                 for next_id, edge in vertex['edges'].items()}
+        template['vertices'][str(id)] = {'id' : id, 'label' : f'Stage {vertex["id"]}', 'metadata' : {}, 'edges' : edges}
+    return template
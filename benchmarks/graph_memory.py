@@ -0,0 +1,60 @@
+"""Memory of generated project graphs with node metadata: `Graph.memory_footprint()` by part
+against the memory traced by tracemalloc while building the graph, and the size of the graph
+state kept by the graph cache. Bytes per vertex are the numbers to size `GRAPH_CACHE_SIZE`
+and the number of workers with.
+
+    python -m benchmarks.graph_memory --sizes 100,1000,10000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build(size : int, seed : int):
+    from app.graph.graph import Graph
+    from .generator import generate_template
+
+    graph = Graph(1, generate_template(size, seed, id_prefix='stage'))
+    now = datetime.now()
+    for id in graph.get_vertices_IDs():
+        graph.get_vertex(id).metadata = {'node_description' : f'Description of node {id}', 'node_created' : now, 'node_updated' : now}
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.graph_memory', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000', help='comma separated vertex counts')
+    parser.add_argument('--seed', type=int, default=2024)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from app.graph.graph import deep_size
+    # Imports and dispatch caches are filled beforehand, only the graph is allocated while tracing
+    build(10, args.seed)
+
+    print(f"{'vertices':>9} {'traced':>10} {'footprint':>10} {'ratio':>6} {'vertices':>10} {'edges':>10} {'metadata':>10} {'transitions':>11} {'state':>10} {'B/vertex':>9} {'ms':>6}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        graph = build(size, args.seed)
+        gc.collect()
+        traced = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        footprint = graph.memory_footprint()
+        elapsed = time.perf_counter() - start
+        state = deep_size(graph.dump_state())
+        print(f"{size:>9} {traced:>10} {footprint['total']:>10} {footprint['total'] / traced:>6.3f} {footprint['vertices']:>10} {footprint['edges']:>10} "
+              f"{footprint['metadata']:>10} {footprint['transitions']:>11} {state:>10} {footprint['total'] / size:>9.0f} {elapsed * 1000:>6.1f}")
+
+
+if __name__ == '__main__':
+    main()
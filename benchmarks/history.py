@@ -0,0 +1,110 @@
+"""Size and speed of project history (`app.history`) on a large temporary SQLite project.
+
+Records a full snapshot of a generated graph, then a series of small edits (label changes,
+added nodes and edges), and reports bytes stored per version, time to record a version,
+time to rebuild random versions and to compute diffs.
+
+    python -m benchmarks.history --vertices 10000 --versions 1000
+"""
+import argparse
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _percentiles(latencies : list[float]) -> str:
+    latencies = sorted(latencies)
+    return f'p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.history', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vertices', type=int, default=10_000)
+    parser.add_argument('--versions', type=int, default=1000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=2024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({
+            'SQLALCHEMY_DATABASE_URL' : f'sqlite:///{directory}/graph_api.db',
+            'SAVE_DIRECTORY' : directory + os.sep,
+            'SECRET_KEY' : secrets.token_hex(32),
+            'ACCESS_TOKEN_EXPIRE_MINUTES' : '60',
+            'HISTORY_VERSIONS' : '0',
+        })
+        sys.path.insert(0, ROOT)
+        from sqlalchemy import func
+        from app import history
+        from app.graph.graph import Graph
+        from app.sql_app import models
+        from app.sql_app.db import SessionLocal, engine
+        from app.sql_app.migrations import migrate
+        from benchmarks.generator import generate_adot
+
+        migrate(engine)
+        rng = random.Random(args.seed)
+        path = os.path.join(directory, 'graph.gv')
+        with open(path, 'w') as file:
+            file.write(generate_adot(args.vertices, seed=args.seed))
+        graph = Graph(1)
+        graph.import_aDOT(path)
+        state = history.graph_state(graph)
+        ids = [id for id in state['vertices'] if type(id) == int]
+
+        db = SessionLocal()
+        project = models.Project(project_label='history', project_version=0)
+        db.add(project)
+        db.commit()
+
+        record_latencies = []
+        next_id = max(ids) + 1
+        for version in range(1, args.versions + 1):
+            project.project_version = version
+            if version == 1:
+                delta = {}
+            elif version % 3 == 0:
+                delta = {'vertices_added' : [[next_id, f'stage {next_id}', {'node_description' : 'added'}]],
+                         'edges_added' : [[rng.choice(ids), next_id, False, None]]}
+                ids.append(next_id)
+                next_id += 1
+            else:
+                id = rng.choice(ids)
+                delta = {'vertices_updated' : [[id, f'renamed {version}', {'node_description' : f'edit {version}'}]]}
+            start = time.perf_counter()
+            history.record(db, project.project_id, delta, lambda : state)
+            db.commit()
+            record_latencies.append(time.perf_counter() - start)
+
+        stored = db.query(func.sum(models.ProjectHistory.size), func.count(), func.count(models.ProjectHistory.state)).one()
+        snapshot_size = len(history._encode(history._dump_state(state)))
+        print(f'{args.vertices} vertices, snapshot {snapshot_size / 1024:.0f} KiB, {args.versions} versions')
+        print(f'stored {stored[0] / 1024:.0f} KiB in {stored[1]} rows with {stored[2]} snapshots, {stored[0] / args.versions:.0f} bytes per version')
+        print(f'record: {_percentiles(record_latencies)}')
+
+        versions = [rng.randint(1, args.versions) for _ in range(args.queries)]
+        latencies = []
+        for version in versions:
+            start = time.perf_counter()
+            history.state_graph(1, history.state_at(db, project.project_id, version))
+            latencies.append(time.perf_counter() - start)
+        print(f'rebuild graph of a version: {_percentiles(latencies)}')
+
+        for distance in [1, 10, 100]:
+            latencies = []
+            for _ in range(args.queries):
+                since = max(1, args.versions - distance)
+                start = time.perf_counter()
+                history.events(history.diff(db, project.project_id, since, args.versions))
+                latencies.append(time.perf_counter() - start)
+            print(f'diff of last {distance} versions: {_percentiles(latencies)}')
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""End-to-end HTTP load test of the API against a temporary SQLite database.
+
+Boots `app.main:app` with uvicorn in a subprocess, seeds users, access rights and
+projects, then drives a mix of requests from concurrent httpx clients and reports
+throughput and latency percentiles per route.
+
+    python -m benchmarks.http_load --workers 2 --concurrency 32 --duration 30
+    python -m benchmarks.http_load --mix read --env GRAPH_STORAGE=hybrid --json result.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'load-test-password'
+
+# Relative weights of operations in each mix
+MIXES = {
+    'read' : {'auth' : 1, 'list' : 5, 'info' : 5, 'graph' : 40, 'chapters' : 40, 'users' : 5},
+    'mixed' : {'auth' : 2, 'list' : 5, 'info' : 5, 'graph' : 30, 'chapters' : 30, 'users' : 3,
+               'add_node' : 8, 'add_edge' : 8, 'del_edge' : 4, 'save_graph' : 3, 'del_node' : 2},
+    'write' : {'auth' : 1, 'graph' : 10, 'add_node' : 25, 'add_edge' : 25, 'del_edge' : 15, 'save_graph' : 15, 'del_node' : 9},
+    'login' : {'auth' : 1},
+    # Login storm with unrelated light routes, shows how logins affect other requests
+    'login_storm' : {'auth' : 8, 'list' : 1, 'users' : 1},
+}
+
+
+def seed(environment : dict, users : int, projects : int, size : int, seed : int) -> dict:
+    """Creates users and projects through application modules, returns ids needed by clients."""
+    os.environ.update(environment)
+    sys.path.insert(0, ROOT)
+    from app.auth import get_password_hash
+    from app.graph.graph import Graph
+    from app.main import save_project_by_pid
+    from app.sql_app import crud, models, schemas
+    from app.sql_app.db import SessionLocal, engine
+    from app.sql_app.migrations import migrate
+    from .generator import generate_template
+
+    migrate(engine)
+    rng = random.Random(seed)
+    db = SessionLocal()
+    password = get_password_hash(PASSWORD)
+    db.add_all([models.User(username=f'user{i}', email=f'user{i}@example.com', password=password) for i in range(users)])
+    db.commit()
+    usernames = {user.user_id : user.username for user in db.query(models.User)}
+    user_ids = sorted(usernames)
+    # The first user can access every project
+    db.add(models.UserAccess(user_id=user_ids[0], project_id=None, access_level=3))
+    db.commit()
+
+    project_nodes = {}
+    for i in range(projects):
+        author = rng.choice(user_ids)
+        project = crud.add_project(db, schemas.ProjectCreate(project_author=author, project_label=f'Project {i}'), dir=environment['SAVE_DIRECTORY'])
+        for user_id in rng.sample(user_ids, min(len(user_ids), 3)):
+            if user_id != author:
+                crud.add_access(db, schemas.AccessCreate(user_id=user_id, project_id=project.project_id, access_level=2))
+        save_project_by_pid(db, project.project_id, Graph(project.project_id, generate_template(size, seed + i, id_prefix='stage')))
+        project_nodes[project.project_id] = [node.node_id for node in crud.get_project_nodes(db, project.project_id)]
+
+    access = {}
+    for row in db.query(models.UserAccess):
+        access.setdefault(row.user_id, []).append(row.project_id)
+    db.close()
+    return {'users' : usernames, 'access' : {user_id : ids if None not in ids else list(project_nodes) for user_id, ids in access.items()},
+            'nodes' : project_nodes}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(environment : dict, workers : int, port : int) -> subprocess.Popen:
+    command = [sys.executable, '-m', 'uvicorn', 'app.main:app', '--host', '127.0.0.1', '--port', str(port),
+               '--workers', str(workers), '--log-level', 'warning']
+    server = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **environment})
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f'http://127.0.0.1:{port}/openapi.json', timeout=1)
+            return server
+        except httpx.TransportError:
+            if server.poll() is not None:
+                raise RuntimeError('Server exited during startup')
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('Server did not start in 60 seconds')
+
+
+class Client:
+    '''One virtual user issuing weighted random requests.'''
+
+    def __init__(self, http : httpx.AsyncClient, user : str, projects : list[int], nodes : dict, mix : dict, rng : random.Random) -> None:
+        self.http = http
+        self.user = user
+        self.projects = projects
+        self.nodes = nodes
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.rng = rng
+        self.headers = {}
+        self.added_edges = []
+
+    async def login(self):
+        response = await self.http.post('/auth', data={'username' : self.user, 'password' : PASSWORD})
+        if response.status_code == 200:
+            self.headers = {'Authorization' : f'Bearer {response.json()["access_token"]}'}
+        return response
+
+    async def request(self, operation : str):
+        project = self.rng.choice(self.projects)
+        nodes = self.nodes[project]
+        match operation:
+            case 'auth':
+                return await self.login()
+            case 'list':
+                return await self.http.get('/project', headers=self.headers)
+            case 'info':
+                return await self.http.get('/project/info', headers=self.headers, params={'limit' : 50})
+            case 'graph':
+                return await self.http.get(f'/project/{project}/graph', headers=self.headers)
+            case 'chapters':
+                return await self.http.get(f'/project/{project}/chapters', headers=self.headers)
+            case 'users':
+                return await self.http.get(f'/project/{project}/users', headers=self.headers)
+            case 'add_node':
+                response = await self.http.post(f'/project/{project}/node', headers=self.headers,
+                                                json={'node_label' : 'load', 'node_description' : 'added by load test'})
+                if response.status_code == 200:
+                    nodes.append(response.json()['node']['node_id'])
+                return response
+            case 'add_edge':
+                edge = {'cur_vertex' : self.rng.choice(nodes), 'next_vertex' : self.rng.choice(nodes)}
+                response = await self.http.post(f'/project/{project}/edge', headers=self.headers, json=edge)
+                if response.status_code == 200:
+                    self.added_edges.append((project, edge))
+                return response
+            case 'del_edge':
+                if not self.added_edges:
+                    return None
+                project, edge = self.added_edges.pop(self.rng.randrange(len(self.added_edges)))
+                return await self.http.request('DELETE', f'/project/{project}/edge', headers=self.headers, json=edge)
+            case 'del_node':
+                if len(nodes) < 10:
+                    return None
+                node = nodes.pop(self.rng.randrange(len(nodes)))
+                return await self.http.delete(f'/project/{project}/node/{node}', headers=self.headers)
+            case 'save_graph':
+                graph = await self.http.get(f'/project/{project}/graph', headers=self.headers)
+                if graph.status_code != 200:
+                    return graph
+                return await self.http.post(f'/project/{project}/graph', headers=self.headers, json=graph.json())
+
+    async def run(self, deadline : float, results : list, warmup_until : float):
+        await self.login()
+        while time.monotonic() < deadline:
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            start = time.monotonic()
+            try:
+                response = await self.request(operation)
+                status = response.status_code if response is not None else None
+            except httpx.HTTPError as error:
+                status = type(error).__name__
+            if status is not None and start >= warmup_until:
+                results.append((operation, time.monotonic() - start, status))
+
+
+def percentile(values : list[float], fraction : float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def report(results : list, duration : float) -> dict:
+    routes = {}
+    for operation, latency, status in results:
+        route = routes.setdefault(operation, {'latencies' : [], 'errors' : 0})
+        route['latencies'].append(latency)
+        if status != 200:
+            route['errors'] += 1
+
+    summary = {}
+    print(f"{'route':<12} {'requests':>9} {'errors':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for operation, route in sorted(routes.items()):
+        latencies = route['latencies']
+        summary[operation] = {
+            'requests' : len(latencies),
+            'errors' : route['errors'],
+            'rps' : len(latencies) / duration,
+            'p50' : percentile(latencies, 0.5),
+            'p95' : percentile(latencies, 0.95),
+            'p99' : percentile(latencies, 0.99),
+        }
+        stats = summary[operation]
+        print(f"{operation:<12} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>8.1f}"
+              f" {stats['p50'] * 1000:>9.1f} {stats['p95'] * 1000:>9.1f} {stats['p99'] * 1000:>9.1f}")
+    total = sum(route['requests'] for route in summary.values())
+    print(f'total {total} requests, {total / duration:.1f} requests/s')
+    return summary
+
+
+async def drive(base_url : str, seeded : dict, mix : dict, concurrency : int, duration : float, warmup : float, seed : int) -> list:
+    results = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        rng = random.Random(seed)
+        users = [user for user in seeded['users'] if seeded['access'].get(user)]
+        clients = []
+        for i in range(concurrency):
+            user = rng.choice(users)
+            clients.append(Client(http, seeded['users'][user], seeded['access'][user], seeded['nodes'], mix, random.Random(seed + i)))
+        start = time.monotonic()
+        await asyncio.gather(*(client.run(start + warmup + duration, results, start + warmup) for client in clients))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.http_load', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds before measuring')
+    parser.add_argument('--mix', choices=MIXES, default='mixed')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--size', type=int, default=200, help='vertices per project graph')
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE', help='extra application settings')
+    parser.add_argument('--json', metavar='PATH', help='write results to a JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        environment = {
+            'SQLALCHEMY_DATABASE_URL' : f'sqlite:///{directory}/graph_api.db',
+            'SAVE_DIRECTORY' : os.path.join(directory, 'graphs') + os.sep,
+            'SECRET_KEY' : secrets.token_hex(32),
+            'ACCESS_TOKEN_EXPIRE_MINUTES' : '60',
+            **dict(item.split('=', 1) for item in args.env),
+        }
+        os.makedirs(environment['SAVE_DIRECTORY'])
+        print(f'Seeding {args.users} users and {args.projects} projects of {args.size} vertices')
+        seeded = seed(environment, args.users, args.projects, args.size, args.seed)
+
+        port = free_port()
+        server = start_server(environment, args.workers, port)
+        try:
+            print(f'Running {args.mix} mix: {args.workers} workers, {args.concurrency} clients, {args.duration}s')
+            results = asyncio.run(drive(f'http://127.0.0.1:{port}', seeded, MIXES[args.mix], args.concurrency, args.duration, args.warmup, args.seed))
+        finally:
+            server.terminate()
+            server.wait()
+
+    summary = report(results, args.duration)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'settings' : vars(args), 'routes' : summary}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
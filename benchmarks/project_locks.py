@@ -0,0 +1,119 @@
+"""Stress test of project write locks (`app.locks`) through uvicorn with several workers.
+
+Concurrent clients add edges to one shared project, then the graph is checked for edges that
+were acknowledged but lost. Then the rate of edge additions is measured with all clients
+writing to one project and with every client writing to its own project.
+
+    python -m benchmarks.project_locks --workers 4 --clients 16 --edges 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import secrets
+import tempfile
+import time
+
+import httpx
+
+from .http_load import PASSWORD, free_port, seed, start_server
+
+
+async def login(http : httpx.AsyncClient, username : str) -> dict:
+    response = await http.post('/auth', data={'username' : username, 'password' : PASSWORD})
+    response.raise_for_status()
+    return {'Authorization' : 'Bearer ' + response.json()['access_token']}
+
+
+async def add_edges(http : httpx.AsyncClient, headers : dict, project : int, pairs : list[tuple[int, int]]) -> list[tuple[int, int]]:
+    added = []
+    for src, dst in pairs:
+        response = await http.post(f'/project/{project}/edge', json={'cur_vertex' : src, 'next_vertex' : dst}, headers=headers)
+        if response.status_code == 200:
+            added.append((src, dst))
+        else:
+            print(f'Edge {src} -> {dst} of project {project}: {response.status_code} {response.text}')
+    return added
+
+
+def _pairs(rng : random.Random, nodes : list[int], count : int) -> list[tuple[int, int]]:
+    return [tuple(rng.sample(nodes, 2)) for _ in range(count)]
+
+
+async def check_lost(base_url : str, seeded : dict, clients : int, edges : int, seed : int) -> tuple[int, int]:
+    rng = random.Random(seed)
+    project = min(seeded['nodes'])
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as http:
+        headers = await login(http, seeded['users'][min(seeded['users'])])
+        jobs = [add_edges(http, headers, project, _pairs(rng, seeded['nodes'][project], edges)) for _ in range(clients)]
+        added = {pair for result in await asyncio.gather(*jobs) for pair in result}
+        graph = (await http.get(f'/project/{project}/graph', headers=headers)).json()
+    present = {(int(id), int(next_id)) for id, vertex in graph['vertices'].items() if id.isdigit()
+               for next_id in vertex['edges'] if next_id.isdigit()}
+    return len(added), len(added - present)
+
+
+async def throughput(base_url : str, seeded : dict, clients : int, edges : int, shared : bool, seed : int) -> float:
+    rng = random.Random(seed)
+    projects = sorted(seeded['nodes'])
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=httpx.Limits(max_connections=clients)) as http:
+        headers = await login(http, seeded['users'][min(seeded['users'])])
+        targets = [projects[0] if shared else projects[i % len(projects)] for i in range(clients)]
+        jobs = [add_edges(http, headers, project, _pairs(rng, seeded['nodes'][project], edges)) for project in targets]
+        start = time.perf_counter()
+        added = sum(len(result) for result in await asyncio.gather(*jobs))
+        return added / (time.perf_counter() - start)
+
+
+def lock_metrics(base_url : str) -> str:
+    text = httpx.get(base_url + '/metrics').text
+    count = re.search(r'^graph_api_project_lock_wait_seconds_count (\S+)', text, re.M)
+    total = re.search(r'^graph_api_project_lock_wait_seconds_sum (\S+)', text, re.M)
+    contended = re.search(r'^graph_api_project_lock_contended_total (\S+)', text, re.M)
+    if not count or not float(count.group(1)):
+        return 'no lock metrics in this worker'
+    return (f'{float(count.group(1)):.0f} locks, {float(contended.group(1)) if contended else 0:.0f} contended, '
+            f'mean wait {float(total.group(1)) / float(count.group(1)) * 1000:.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.project_locks', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4, help='uvicorn worker processes')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--edges', type=int, default=50, help='edges added by every client')
+    parser.add_argument('--size', type=int, default=200, help='vertices per project graph')
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE', help='extra application settings')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        environment = {
+            'SQLALCHEMY_DATABASE_URL' : f'sqlite:///{directory}/graph_api.db',
+            'SAVE_DIRECTORY' : os.path.join(directory, 'graphs') + os.sep,
+            'SECRET_KEY' : secrets.token_hex(32),
+            'ACCESS_TOKEN_EXPIRE_MINUTES' : '60',
+            **dict(item.split('=', 1) for item in args.env),
+        }
+        os.makedirs(environment['SAVE_DIRECTORY'])
+        seeded = seed(environment, 1, args.clients, args.size, args.seed)
+
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        server = start_server(environment, args.workers, port)
+        try:
+            added, lost = asyncio.run(check_lost(base_url, seeded, args.clients, args.edges, args.seed))
+            print(f'{args.workers} workers, {args.clients} clients adding edges to one project: {added} distinct edges added, {lost} lost')
+            shared = asyncio.run(throughput(base_url, seeded, args.clients, args.edges, True, args.seed))
+            separate = asyncio.run(throughput(base_url, seeded, args.clients, args.edges, False, args.seed))
+            print(f'edges/s: {shared:.0f} to one project, {separate:.0f} to {args.clients} projects ({separate / shared:.1f}x)')
+            print(f'lock waits of one worker: {lock_metrics(base_url)}')
+        finally:
+            server.terminate()
+            server.wait()
+    if lost:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import gc
+import statistics
+import sys
+import tracemalloc
+from time import perf_counter
+
+
+class Benchmark:
+    '''Measures a callable the way `pytest-benchmark` fixture does: time over several rounds and peak memory of one extra round.'''
+
+    def __init__(self, min_rounds : int = 3, min_time : float = 0.2, max_rounds : int = 100) -> None:
+        self.min_rounds = min_rounds
+        self.min_time = min_time
+        self.max_rounds = max_rounds
+        self.stats : dict | None = None
+
+    def __call__(self, func, *args, **kwargs):
+        return self.pedantic(func, args=args, kwargs=kwargs)
+
+    def pedantic(self, func, args = (), kwargs = None, setup = None, rounds : int | None = None):
+        """Runs `func` repeatedly. `setup` is called before every round, is not timed
+        and may return (args, kwargs) replacing the given ones."""
+        kwargs = kwargs or {}
+
+        def prepare():
+            if setup:
+                prepared = setup()
+                if prepared:
+                    return prepared
+            return args, kwargs
+
+        times = []
+        result = None
+        elapsed = 0.0
+        while len(times) < (rounds or self.max_rounds):
+            round_args, round_kwargs = prepare()
+            gc.collect()
+            start = perf_counter()
+            result = func(*round_args, **round_kwargs)
+            times.append(perf_counter() - start)
+            elapsed += times[-1]
+            if not rounds and len(times) >= self.min_rounds and elapsed >= self.min_time:
+                break
+
+        round_args, round_kwargs = prepare()
+        gc.collect()
+        tracemalloc.start()
+        func(*round_args, **round_kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.stats = {
+            'rounds' : len(times),
+            'min' : min(times),
+            'median' : statistics.median(times),
+            'mean' : statistics.fmean(times),
+            'peak_memory' : peak,
+        }
+        return result
+
+
+def run_suites(suites : dict, sizes : list[int], select : str | None = None, out = sys.stdout) -> dict:
+    """Runs every suite for every size within its limit, returns results keyed by "suite[size]"."""
+    results = {}
+    for name, (suite, max_size) in suites.items():
+        if select and select not in name:
+            continue
+        for size in sizes:
+            if size > max_size:
+                continue
+            benchmark = Benchmark()
+            suite(benchmark, size)
+            key = f'{name}[{size}]'
+            results[key] = benchmark.stats
+            print(f"{key:<32} {benchmark.stats['median'] * 1000:>12.3f} ms {benchmark.stats['peak_memory'] / 2**20:>10.2f} MiB"
+                  f" {benchmark.stats['rounds']:>5} rounds", file=out, flush=True)
+    return results
+
+
+def compare(baseline : dict, current : dict, threshold : float = 0.1, out = sys.stdout) -> list[str]:
+    """Prints time and memory ratios of current results to baseline and returns keys regressed over `threshold`."""
+    regressions = []
+    print(f"{'benchmark':<32} {'time':>10} {'memory':>10}", file=out)
+    for key, stats in current.items():
+        base = baseline.get(key)
+        if not base:
+            print(f'{key:<32} {"new":>10}', file=out)
+            continue
+        time_ratio = stats['median'] / base['median'] if base['median'] else 1.0
+        memory_ratio = stats['peak_memory'] / base['peak_memory'] if base['peak_memory'] else 1.0
+        regressed = time_ratio > 1 + threshold or memory_ratio > 1 + threshold
+        if regressed:
+            regressions.append(key)
+        print(f'{key:<32} {time_ratio:>9.2f}x {memory_ratio:>9.2f}x{"  REGRESSION" if regressed else ""}', file=out)
+    return regressions
@@ -0,0 +1,106 @@
+"""Latency of node search (`crud.search_nodes`) on a large temporary SQLite database.
+
+Fills the database with synthetic projects and nodes, builds the search index with
+migrations, then times queries of a user with access to a few projects and of a user
+with global access, for frequent, rare and prefix words.
+
+    python -m benchmarks.search --nodes 1000000 --projects 10000
+"""
+import argparse
+import itertools
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Zipf-like vocabulary: word i appears with weight 1 / (i + 1)
+VOCABULARY = [f'{prefix}{suffix}' for prefix in ['stage', 'review', 'draft', 'test', 'build', 'release', 'design', 'spec',
+                                                  'этап', 'проверка', 'сборка', 'отчёт']
+              for suffix in ['', 'ing', 'ed', 'er', 'al', 'ion', 'ity', 'ness']] + [f'term{i}' for i in range(5000)]
+CUMULATIVE_WEIGHTS = list(itertools.accumulate(1 / (i + 1) for i in range(len(VOCABULARY))))
+QUERIES = {'frequent word' : 'stage', 'two words' : 'review draft', 'rare word' : 'term4321', 'prefix' : 'rel', 'cyrillic' : 'сбор'}
+
+
+def _text(rng : random.Random, words : int) -> str:
+    return ' '.join(rng.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS, k=words))
+
+
+def seed(environment : dict, nodes : int, projects : int, seed : int, batch : int = 50_000):
+    os.environ.update(environment)
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import insert
+    from app.sql_app import models
+    from app.sql_app.db import engine
+    from app.sql_app.migrations import migrate
+
+    rng = random.Random(seed)
+    # Index is built once by the migration, after nodes are inserted
+    migrate(engine, target=2)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{'username' : f'user{i}', 'email' : f'user{i}@example.com', 'password' : ''} for i in range(2)])
+        conn.execute(insert(models.Project), [{'project_label' : f'Project {i}', 'project_author' : 1} for i in range(projects)])
+        conn.execute(insert(models.UserAccess), [{'user_id' : 1, 'project_id' : None, 'access_level' : 3}] +
+                     [{'user_id' : 2, 'project_id' : project, 'access_level' : 1} for project in rng.sample(range(1, projects + 1), min(projects, 20))])
+    for start in range(0, nodes, batch):
+        rows = [{'project_id' : rng.randint(1, projects), 'node_label' : _text(rng, rng.randint(1, 3)),
+                 'node_description' : _text(rng, rng.randint(5, 20))} for _ in range(min(batch, nodes - start))]
+        with engine.begin() as conn:
+            conn.execute(insert(models.Node), rows)
+    start = time.perf_counter()
+    migrate(engine)
+    print(f'Search index built in {time.perf_counter() - start:.1f}s')
+
+
+def measure(repeat : int) -> list:
+    from app.sql_app import crud
+    from app.sql_app.db import SessionLocal
+
+    results = []
+    db = SessionLocal()
+    try:
+        for user_id, user in [(1, 'global access'), (2, '20 projects')]:
+            for name, query in QUERIES.items():
+                for offset in [0, 100]:
+                    latencies = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        found = crud.search_nodes(db, user_id, query, 21, offset)
+                        latencies.append(time.perf_counter() - start)
+                    latencies.sort()
+                    results.append((user, name, offset, len(found), latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]))
+    finally:
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.search', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=1_000_000)
+    parser.add_argument('--projects', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=2024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        environment = {
+            'SQLALCHEMY_DATABASE_URL' : f'sqlite:///{directory}/graph_api.db',
+            'SAVE_DIRECTORY' : directory + os.sep,
+            'SECRET_KEY' : secrets.token_hex(32),
+            'ACCESS_TOKEN_EXPIRE_MINUTES' : '60',
+        }
+        print(f'Seeding {args.nodes} nodes in {args.projects} projects')
+        start = time.perf_counter()
+        seed(environment, args.nodes, args.projects, args.seed)
+        print(f'Seeded in {time.perf_counter() - start:.1f}s')
+
+        print(f"{'user':<14} {'query':<14} {'offset':>6} {'found':>6} {'p50 ms':>9} {'p95 ms':>9}")
+        for user, name, offset, found, p50, p95 in measure(args.repeat):
+            print(f'{user:<14} {name:<14} {offset:>6} {found:>6} {p50 * 1000:>9.2f} {p95 * 1000:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import contextlib
+import copy
+import io
+import os
+import random
+import tempfile
+
+from app.graph.graph import Graph
+from app.graph.simulation import WalkSimulation
+from app.graph.layout import layered_layout
+from .generator import generate_adot, generate_template
+
+SEED = 2024
+
+_cache = {}
+
+def _adot(size : int) -> str:
+    if ('adot', size) not in _cache:
+        _cache['adot', size] = generate_adot(size, SEED)
+    return _cache['adot', size]
+
+def _template(size : int) -> dict:
+    if ('template', size) not in _cache:
+        _cache['template', size] = generate_template(size, SEED)
+    return _cache['template', size]
+
+def _graph(size : int) -> Graph:
+    graph = Graph(1)
+    graph.import_aDOT(_adot(size), from_data=True)
+    return graph
+
+
+def bench_import_adot(benchmark, size):
+    data = _adot(size)
+    benchmark.pedantic(lambda graph: graph.import_aDOT(data, from_data=True), setup=lambda: ((Graph(1),), {}))
+
+
+def bench_export_adot(benchmark, size):
+    graph = _graph(size)
+    with tempfile.TemporaryDirectory() as directory:
+        benchmark(graph.export_aDOT, os.path.join(directory, 'graph.gv'))
+
+
+def bench_export_dict(benchmark, size):
+    benchmark(_graph(size).export_dict)
+
+
+def bench_get_priorities(benchmark, size):
+    benchmark(_graph(size).get_priorities)
+
+
+def bench_del_vertex(benchmark, size):
+    ids = [id for id in _graph(size).get_vertices_IDs() if id not in ['__BEGIN__', '__END__']]
+    removed = random.Random(SEED).sample(ids, max(1, len(ids) // 100))
+
+    def delete(graph):
+        for id in removed:
+            graph.del_vertex(id)
+
+    benchmark.pedantic(delete, setup=lambda: ((_graph(size),), {}))
+
+
+def bench_dict_constructor(benchmark, size):
+    template = _template(size)
+    benchmark.pedantic(lambda template: Graph(1, template), setup=lambda: ((copy.deepcopy(template),), {}))
+
+
+def _loop_graph(size : int) -> Graph:
+    """Graph with a select1 hub, walks go through every spoke before reaching __END__."""
+    graph = Graph(1)
+    graph.import_aDOT(_adot(size), from_data=True)
+    hub = graph.add_vertex(id=-1)
+    graph.add_func_desc('sel1', 'select_module', 'select1')
+    graph.set_selector(hub, 'sel1')
+    begin = graph.get_vertex('__BEGIN__')
+    for id in list(begin.edges):
+        hub.add_edge(graph.get_vertex(id), morph=graph.get_transition('morph2'))
+        begin.del_edge(id)
+    begin.add_edge(hub)
+    for vertex_id in graph.get_vertices_IDs():
+        vertex = graph.get_vertex(vertex_id)
+        if vertex.get_edge('__END__', False) and vertex_id != -1:
+            vertex.del_edge('__END__')
+            vertex.add_edge(hub)
+    hub.add_edge(graph.get_vertex('__END__'))
+    return graph
+
+
+def _walk_output(walk) -> str:
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        walk()
+    return output.getvalue()
+
+
+def bench_walk_graph(benchmark, size):
+    benchmark.pedantic(lambda graph: _walk_output(graph.walk_graph), setup=lambda: ((_loop_graph(size),), {}))
+
+
+def bench_compiled_walk(benchmark, size):
+    expected = _walk_output(_loop_graph(size).walk_graph)
+    if _walk_output(_loop_graph(size).compile_walk().run) != expected:
+        raise AssertionError('Compiled walk differs from walk_graph')
+    benchmark.pedantic(lambda plan: _walk_output(plan.run), setup=lambda: ((_loop_graph(size).compile_walk(),), {}))
+
+
+def bench_simulate(benchmark, size):
+    simulation = WalkSimulation(_graph(size))
+    benchmark(simulation.run, 100_000, 10 * size, SEED)
+
+
+def bench_layout(benchmark, size):
+    benchmark(layered_layout, _graph(size))
+
+
+def bench_layout_update(benchmark, size):
+    graph = _graph(size)
+    previous = layered_layout(graph)
+    ids = [id for id in graph.get_vertices_IDs() if id not in ['__BEGIN__', '__END__']]
+    rng = random.Random(SEED)
+    for _ in range(10):
+        graph.get_vertex(rng.choice(ids)).add_edge(graph.get_vertex(rng.choice(ids)))
+    benchmark(layered_layout, graph, previous)
+
+
+# Suites with the largest size they are run for
+suites = {
+    'import_aDOT' : (bench_import_adot, 1_000_000),
+    'export_aDOT' : (bench_export_adot, 1_000_000),
+    'export_dict' : (bench_export_dict, 1_000_000),
+    'get_priorities' : (bench_get_priorities, 1_000),
+    'del_vertex' : (bench_del_vertex, 100_000),
+    'Graph(int, dict)' : (bench_dict_constructor, 1_000_000),
+    'simulate 100k walks' : (bench_simulate, 10_000),
+    'walk_graph' : (bench_walk_graph, 10_000),
+    'compile_walk().run' : (bench_compiled_walk, 10_000),
+    'layered_layout' : (bench_layout, 100_000),
+    'layered_layout update' : (bench_layout_update, 100_000),
+}
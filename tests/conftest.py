@@ -0,0 +1,28 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# Settings are read when `app.config` is imported, the application gets a temporary database and directory
+_directory = tempfile.mkdtemp(prefix='graph_api_tests_')
+os.environ.update({
+    'SQLALCHEMY_DATABASE_URL' : f'sqlite:///{_directory}/graph_api.db',
+    'SAVE_DIRECTORY' : _directory + os.sep,
+    'SECRET_KEY' : 'tests',
+    'ACCESS_TOKEN_EXPIRE_MINUTES' : '60',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database():
+    """Schema of the application database, for tests using it before the application starts."""
+    from app.sql_app.db import engine
+    from app.sql_app.migrations import migrate
+    migrate(engine)
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_directory, ignore_errors=True)
@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token
+from app.main import app
+from app.sql_app import models
+from app.sql_app.db import SessionLocal
+from app.storage import storage
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        db = SessionLocal()
+        try:
+            users = [models.User(username=name, email=f'{name}@example.com', password='') for name in ('batcher', 'stranger')]
+            db.add_all(users)
+            db.commit()
+            tokens = ['Bearer ' + create_access_token({'sub' : str(user.user_id)}) for user in users]
+        finally:
+            db.close()
+        client.headers['Authorization'] = tokens[0]
+        yield client, {'Authorization' : tokens[1]}
+
+
+def new_project(client : TestClient, label : str, headers : dict | None = None) -> int:
+    response = client.post('/project', json={'project_label' : label, 'project_code' : '', 'project_description' : ''}, headers=headers)
+    pid = response.json()['project']['project_id']
+    node = client.post(f'/project/{pid}/node', json={'node_label' : 'node', 'node_description' : ''}, headers=headers).json()['node']['node_id']
+    client.post(f'/project/{pid}/edge', json={'cur_vertex' : '__BEGIN__', 'next_vertex' : node}, headers=headers)
+    return pid
+
+
+def test_mixed_batch(client, caplog, monkeypatch):
+    client, stranger = client
+    readable = new_project(client, 'readable')
+    broken = new_project(client, 'broken')
+    other = new_project(client, 'other', stranger)
+    missing = other + 1000
+    load = storage.load
+
+    def failing_load(db, project, graph):
+        if project.project_id == broken:
+            raise OSError('disk failure')
+        load(db, project, graph)
+
+    monkeypatch.setattr(storage, 'load', failing_load)
+
+    with caplog.at_level(logging.ERROR, logger='app.main'):
+        response = client.post('/projects/batch', json={'project_ids' : [readable, other, missing, broken], 'parts' : ['info', 'graph']})
+    assert response.status_code == 200
+    results = response.json()['projects']
+    assert [result['project_id'] for result in results] == [readable, other, missing, broken]
+    assert 'error' not in results[0]
+    assert results[0]['info']['project']['project_label'] == 'readable'
+    assert len(results[0]['graph']['vertices']) == 3
+    for result in results[1:3]:
+        assert result == {'project_id' : result['project_id'], 'error' : {'status_code' : 405, 'detail' : 'Not enough access rights'}}
+    assert results[3]['error'] == {'status_code' : 500, 'detail' : 'Project graph could not be loaded'}
+    assert results[3]['info']['project']['project_label'] == 'broken'
+    assert 'graph' not in results[3]
+    assert [record.getMessage() for record in caplog.records] == [f'Batch read: project {broken} failed to load']
+    assert caplog.records[0].exc_info[1].args == ('disk failure',)
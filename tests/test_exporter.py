@@ -0,0 +1,89 @@
+import io
+import json
+import tarfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token
+from app.main import app
+from app.sql_app import models
+from app.sql_app.db import SessionLocal
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        db = SessionLocal()
+        try:
+            user = models.User(username='exporter', email='exporter@example.com', password='')
+            db.add(user)
+            db.commit()
+            client.headers['Authorization'] = 'Bearer ' + create_access_token({'sub' : str(user.user_id)})
+        finally:
+            db.close()
+        yield client
+
+
+@pytest.fixture(scope='module')
+def projects(client) -> list[int]:
+    pids = []
+    for label, nodes in [('first', 3), ('second', 2)]:
+        pid = client.post('/project', json={'project_label' : label, 'project_code' : '', 'project_description' : ''}).json()['project']['project_id']
+        ids = [client.post(f'/project/{pid}/node', json={'node_label' : f'{label} {number}', 'node_description' : 'exported'}).json()['node']['node_id']
+               for number in range(nodes)]
+        client.post(f'/project/{pid}/edge', json={'cur_vertex' : '__BEGIN__', 'next_vertex' : ids[0]})
+        for src, dst in zip(ids, ids[1:]):
+            client.post(f'/project/{pid}/edge', json={'cur_vertex' : src, 'next_vertex' : dst, 'probability' : 0.5})
+        client.post(f'/project/{pid}/edge', json={'cur_vertex' : ids[-1], 'next_vertex' : '__END__'})
+        pids.append(pid)
+    return pids
+
+
+def edges(graph : dict, labels : dict | None = None) -> set[tuple]:
+    """Edges of a graph by vertex IDs, or by original IDs found in `labels` of imported graphs."""
+    if labels is None:
+        labels = {id : id for id in graph['vertices']}
+    return {(labels[id], labels[next_id], edge['probability'])
+            for id, vertex in graph['vertices'].items() for next_id, edge in vertex['edges'].items()}
+
+
+def test_export_ndjson(client, projects):
+    response = client.get('/project/export')
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line['project']['project_id'] for line in lines] == projects
+    for line in lines:
+        pid = line['project']['project_id']
+        graph = client.get(f'/project/{pid}/graph').json()
+        assert 'project_path' not in line['project']
+        assert {str(node['node_id']) for node in line['nodes']} == set(graph['vertices']) - {'__BEGIN__', '__END__'}
+        assert {node['node_description'] for node in line['nodes']} == {'exported'}
+        assert line['graph'].startswith('digraph') and line['graph'].endswith('}\n')
+    after = client.get('/project/export', params={'after' : projects[0]}).text.splitlines()
+    assert [json.loads(line)['project']['project_id'] for line in after] == projects[1:]
+
+
+def test_export_tar_round_trip(client, projects):
+    lines = [json.loads(line) for line in client.get('/project/export').text.splitlines()]
+    response = client.get('/project/export', params={'format' : 'tar'})
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-tar'
+    with tarfile.open(fileobj=io.BytesIO(response.content)) as archive:
+        assert archive.getnames() == [f'{pid}.{suffix}' for pid in projects for suffix in ('json', 'gv')]
+        for line in lines:
+            pid = line['project']['project_id']
+            assert archive.extractfile(f'{pid}.gv').read().decode() == line['graph']
+            assert json.loads(archive.extractfile(f'{pid}.json').read()) == {key : value for key, value in line.items() if key != 'graph'}
+
+    # Graphs of the archive are imported as new projects, their vertices labelled with the exported IDs
+    report = client.post('/project/import', files={'archive' : ('projects.tar', io.BytesIO(response.content), 'application/x-tar')}).json()
+    assert report['failed'] == []
+    assert [item['file'] for item in report['imported']] == [f'{pid}.gv' for pid in projects]
+    for pid, item in zip(projects, report['imported']):
+        imported = client.get(f'/project/{item["project_id"]}/graph').json()
+        labels = {id : vertex['label'] for id, vertex in imported['vertices'].items()}
+        original = edges(client.get(f'/project/{pid}/graph').json())
+        assert 0.5 in {probability for _, _, probability in original}
+        assert edges(imported, labels) == original
@@ -0,0 +1,161 @@
+import random
+import sys
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.graph.graph import _VERTEX_ATTRIBUTES_SIZE, Graph, deep_size
+from app.graph.registry import registry
+from app.graph.vertex import Vertex
+
+
+def test_constructor_argument_types():
+    assert Graph(1, label='empty').get_vertices_IDs() == ['__BEGIN__', '__END__']
+    assert Graph(2, {'project_label' : 'template', 'vertices' : {}}).label == 'template'
+    for args in [(1.5,), (1, 'label'), ()]:
+        with pytest.raises(TypeError):
+            Graph(*args)
+
+
+def test_constructed_concurrently():
+    with ThreadPoolExecutor(8) as pool:
+        graphs = list(pool.map(Graph, range(2000)))
+    assert [graph.id for graph in graphs] == list(range(2000))
+
+
+calls = []
+
+
+def record_edge(graph, vertex, next_vertex):
+    return (vertex.id, next_vertex.id)
+
+
+def record_call(*args):
+    calls.append(args)
+
+
+def select_reverse(vertex):
+    """Edges from last to first, then again."""
+    count = []
+    def select():
+        edges = list(vertex.edges.values())
+        count.append(None)
+        return edges[-len(count) % len(edges)]['next_vertex']
+    return select
+
+
+@pytest.fixture(autouse=True)
+def functions():
+    registry.register('predicate_module', 'record_edge', record_edge)
+    registry.register('processor_module', 'record_call', record_call)
+    registry.register('select_module', 'select_reverse', select_reverse)
+    calls.clear()
+
+
+def hub_graph(selector : str | None) -> Graph:
+    """__BEGIN__ -> 1 -> __END__ and 1 -> 2, 3, 4 -> 1, with `selector` of module select_module at vertex 1.
+    Every edge records its transition."""
+    graph = Graph(1)
+    graph.add_func_desc('record', 'predicate_module', 'record_edge')
+    graph.add_func_desc('call', 'processor_module', 'record_call')
+    graph.add_transition('recorded', 'call', 'record')
+    for id in range(1, 5):
+        graph.add_vertex(id)
+    hub = graph.get_vertex(1)
+    morph = graph.get_transition('recorded')
+    graph.get_vertex('__BEGIN__').add_edge(hub, morph=morph)
+    hub.add_edge(graph.get_vertex('__END__'), morph=morph)
+    for id in range(2, 5):
+        hub.add_edge(graph.get_vertex(id), morph=morph)
+        graph.get_vertex(id).add_edge(hub, morph=morph)
+    if selector:
+        graph.add_func_desc('selector', 'select_module', selector)
+        graph.set_selector(hub, 'selector')
+    return graph
+
+
+def walk(run, capsys) -> tuple[str, list]:
+    calls.clear()
+    random.seed(7)
+    run()
+    return capsys.readouterr().out, list(calls)
+
+
+@pytest.mark.parametrize('selector', ['select1', 'select_weighted', 'select_reverse'])
+def test_compiled_walk_same_as_walk_graph(selector, capsys):
+    expected = walk(hub_graph(selector).walk_graph, capsys)
+    assert expected[1][0] == ('__BEGIN__', 1) and expected[1][-1] == (1, '__END__')
+    assert walk(hub_graph(selector).compile_walk().run, capsys) == expected
+
+
+def test_compiled_walk_first_edge(capsys):
+    graph = hub_graph(None)
+    # Without a selector the first edge is taken, 1 -> __END__
+    graph.get_vertex('__BEGIN__').add_edge(graph.get_vertex(2))
+    graph.get_vertex('__BEGIN__').del_edge(1)
+    graph.get_vertex('__BEGIN__').add_edge(graph.get_vertex(1))
+    expected = walk(graph.walk_graph, capsys)
+    assert expected[0].splitlines() == ['__BEGIN__ -> 2', '2 -> 1', '1 -> __END__']
+    assert walk(graph.compile_walk().run, capsys) == expected
+
+
+def test_compiled_walk_of_changed_graph(capsys):
+    graph = hub_graph('select1')
+    plan = graph.compile_walk()
+    graph.get_vertex(1).del_edge(3)
+    # The plan keeps the graph as it was compiled, a new plan sees the change
+    assert walk(plan.run, capsys) == walk(hub_graph('select1').walk_graph, capsys)
+    expected = walk(graph.walk_graph, capsys)
+    assert '1 -> 3' not in expected[0]
+    changed = hub_graph('select1')
+    changed.get_vertex(1).del_edge(3)
+    assert walk(changed.compile_walk().run, capsys) == expected
+
+
+def test_deep_size():
+    shared = 'shared value ' * 4
+    assert deep_size([shared, shared]) == sys.getsizeof([shared, shared]) + sys.getsizeof(shared)
+    assert deep_size({'key' : (1.5, None)}) == sys.getsizeof({'key' : (1.5, None)}) + sys.getsizeof('key') + sys.getsizeof((1.5, None)) + sys.getsizeof(1.5)
+    assert deep_size([shared], seen={id(shared)}) == sys.getsizeof([shared])
+    assert deep_size([shared], shallow=True) == sys.getsizeof([shared])
+
+
+def sized_graph(vertices : int, edges : int, metadata : bool = False) -> Graph:
+    graph = Graph(1, label='sized')
+    for id in range(vertices):
+        graph.add_vertex(id, f'vertex {id}', metadata={'node_description' : 'described ' * 10} if metadata else {})
+    for id in range(edges):
+        graph.get_vertex(id).add_edge(graph.get_vertex((id + 1) % vertices))
+    return graph
+
+
+def test_memory_footprint_grows():
+    footprint = sized_graph(10, 5).memory_footprint()
+    assert set(footprint) == {'vertices', 'edges', 'metadata', 'transitions', 'total'}
+    assert footprint['total'] == sum(size for part, size in footprint.items() if part != 'total')
+    more_vertices = sized_graph(20, 5).memory_footprint()
+    assert more_vertices['vertices'] > footprint['vertices']
+    more_edges = sized_graph(10, 10).memory_footprint()
+    assert more_edges['edges'] > footprint['edges']
+    assert more_edges['vertices'] == footprint['vertices']
+    assert sized_graph(10, 5, metadata=True).memory_footprint()['metadata'] > footprint['metadata']
+
+
+@pytest.mark.skipif(sys.implementation.name != 'cpython', reason='sizes of CPython objects')
+def test_vertex_attributes_size():
+    Vertex(0)
+    labels = [f'vertex {id}' for id in range(1000)]
+    selector, metadata = {}, {}
+    tracemalloc.start()
+    try:
+        vertices = [None] * len(labels)
+        before = tracemalloc.get_traced_memory()[0]
+        for id, label in enumerate(labels):
+            vertices[id] = Vertex(id + 1000, label, selector, metadata)
+        allocated = (tracemalloc.get_traced_memory()[0] - before) / len(vertices)
+    finally:
+        tracemalloc.stop()
+    vertex = vertices[0]
+    counted = sys.getsizeof(vertex) + sys.getsizeof(vertex.id) + sys.getsizeof(vertex._edges) + sys.getsizeof(vertex._notes)
+    assert abs(allocated - counted - _VERTEX_ATTRIBUTES_SIZE) < 8
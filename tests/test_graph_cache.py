@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import graph_cache
+from app.graph_cache import LocalGraphCache, SharedGraphCache
+
+VERSION = datetime(2024, 6, 1)
+STATE = {'vertices' : list(range(100))}
+
+
+@pytest.fixture
+def shared():
+    if not os.path.isdir(graph_cache._SHM_DIRECTORY):
+        pytest.skip('no /dev/shm')
+    namespace = uuid.uuid4().hex
+    cache = SharedGraphCache(namespace, size=3, max_bytes=10_000)
+    cache.namespace = namespace
+    yield cache
+    for name, *_ in cache._segments():
+        cache._unlink(name)
+
+
+def test_local_bounds():
+    cache = LocalGraphCache(size=2, max_bytes=10_000)
+    for pid in range(3):
+        cache.put(pid, VERSION, 'full', STATE)
+    assert cache.get(0, VERSION, 'full') is None
+    assert cache.get(2, VERSION, 'full') == STATE
+    cache.put(3, VERSION, 'full', {'data' : bytes(20_000)})
+    assert cache.get(3, VERSION, 'full') is None
+    assert cache._bytes == sum(len(data) for _, data in cache._entries.values())
+
+
+def test_shared_older_versions_removed(shared):
+    shared.put(1, VERSION, 'full', STATE)
+    shared.put(1, VERSION + timedelta(seconds=1), 'full', STATE)
+    assert [key for _, _, _, key in shared._segments()] == [graph_cache.version_key(VERSION + timedelta(seconds=1))]
+    # Stale version stored after a newer one
+    shared.put(1, VERSION, 'full', STATE)
+    assert shared.get(1, VERSION, 'full') is None
+    assert len(shared._segments()) == 1
+
+
+def test_shared_least_recently_used_evicted(shared):
+    for pid in range(3):
+        shared.put(pid, VERSION, 'full', STATE)
+        os.utime(shared._path(shared._name(pid, VERSION, 'full')), (pid, pid))
+    assert shared.get(0, VERSION, 'full') == STATE
+    shared.put(3, VERSION, 'full', STATE)
+    assert sorted(pid for _, pid, _, _ in shared._segments()) == [0, 2, 3]
+
+
+def test_shared_bytes_bound(shared):
+    shared.put(1, VERSION, 'full', {'data' : 'x' * 6000})
+    shared.put(2, VERSION, 'full', {'data' : 'x' * 6000})
+    assert [pid for _, pid, _, _ in shared._segments()] == [2]
+    shared.put(3, VERSION, 'full', {'data' : 'x' * 20_000})
+    assert shared.get(3, VERSION, 'full') is None
+
+
+def test_shared_orphans_removed(shared):
+    # A segment written by a process that has exited
+    code = f'from app.graph_cache import SharedGraphCache; SharedGraphCache({shared.namespace!r}, 3, 10_000).put(1, None, "full", {{}})'
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    shared.put(2, VERSION, 'full', STATE)
+    assert len(shared._segments()) == 2
+    shared.remove_orphans()
+    assert [pid for _, pid, _, _ in shared._segments()] == [2]
+    shared.shutdown()
+    assert shared._segments() == []
+
+
+def test_shared_state_round_trip(shared):
+    state = {'vertices' : [(1, 'a', {'node_created' : VERSION, 'node_description' : 'first'})], 'edges' : [(1, '__END__', False, None, None)]}
+    shared.put(1, VERSION, 'full', state)
+    assert shared.get(1, VERSION, 'full') == {'vertices' : [[1, 'a', {'node_created' : VERSION, 'node_description' : 'first'}]],
+                                               'edges' : [[1, '__END__', False, None, None]]}
+
+
+def test_shared_writable_segment_not_read(shared):
+    shared.put(1, VERSION, 'full', STATE)
+    os.chmod(shared._path(shared._name(1, VERSION, 'full')), 0o666)
+    assert shared.get(1, VERSION, 'full') is None
+
+
+def test_shared_names_depend_on_secret(shared, monkeypatch):
+    monkeypatch.setattr(graph_cache.config, 'SECRET_KEY', 'another deployment')
+    assert SharedGraphCache(shared.namespace, 3, 10_000).prefix != shared.prefix
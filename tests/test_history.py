@@ -0,0 +1,81 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config, history
+from app.auth import create_access_token
+from app.main import app
+from app.sql_app import models
+from app.sql_app.db import SessionLocal
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        db = SessionLocal()
+        try:
+            user = models.User(username='historian', email='historian@example.com', password='')
+            db.add(user)
+            db.flush()
+            db.add(models.UserAccess(user_id=user.user_id, project_id=None, access_level=2))
+            db.commit()
+            client.headers['Authorization'] = 'Bearer ' + create_access_token({'sub' : str(user.user_id)})
+        finally:
+            db.close()
+        yield client
+
+
+def new_project(client : TestClient, nodes : int) -> tuple[int, list[int]]:
+    response = client.post('/project', json={'project_label' : 'history', 'project_code' : '', 'project_description' : ''})
+    pid = response.json()['project']['project_id']
+    ids = [client.post(f'/project/{pid}/node', json={'node_label' : f'node {number}', 'node_description' : ''}).json()['node']['node_id']
+           for number in range(nodes)]
+    return pid, ids
+
+
+def test_diff_from_empty(client):
+    pid, ids = new_project(client, 2)
+    client.post(f'/project/{pid}/edge', json={'cur_vertex' : '__BEGIN__', 'next_vertex' : ids[0]})
+    response = client.get(f'/project/{pid}/diff', params={'since' : 0})
+    assert response.status_code == 200
+    events = response.json()['events']
+    assert sorted(event['node_id'] for event in events if event['type'] == 'node_added') == ids
+    assert {(event['src'], event['dst']) for event in events if event['type'] == 'edge_added'} == {('__BEGIN__', '__END__'), ('__BEGIN__', str(ids[0]))}
+
+
+def test_snapshot_without_previous_state(client, monkeypatch):
+    pid, _ = new_project(client, 1)
+    # Every change stores a snapshot, and the previous version cannot be rebuilt
+    monkeypatch.setattr(config, 'HISTORY_SNAPSHOT_RATIO', 0)
+    monkeypatch.setattr(history, 'state_at', lambda db, pid, version : None)
+    assert client.post(f'/project/{pid}/node', json={'node_label' : 'last', 'node_description' : ''}).status_code == 200
+    db = SessionLocal()
+    try:
+        row = db.query(models.ProjectHistory).filter(models.ProjectHistory.project_id == pid).order_by(models.ProjectHistory.version.desc()).first()
+        state = history._load_state(history._decode(row.state))
+    finally:
+        db.close()
+    assert sorted(label for label, _ in state['vertices'].values()) == ['__BEGIN__', '__END__', 'last', 'node 0']
+
+
+def version(pid : int) -> int:
+    db = SessionLocal()
+    try:
+        return db.get(models.Project, pid).project_version
+    finally:
+        db.close()
+
+
+def test_delete_missing_edge(client):
+    pid, ids = new_project(client, 2)
+    client.post(f'/project/{pid}/edge', json={'cur_vertex' : ids[0], 'next_vertex' : ids[1]})
+    before = version(pid)
+    for next_vertex in [ids[0], '__END__', 'missing']:
+        response = client.request('DELETE', f'/project/{pid}/edge', json={'cur_vertex' : ids[0], 'next_vertex' : next_vertex})
+        assert response.status_code == 400
+    assert version(pid) == before
+    # IDs of nodes sent as strings
+    response = client.request('DELETE', f'/project/{pid}/edge', json={'cur_vertex' : ids[0], 'next_vertex' : str(ids[1])})
+    assert response.status_code == 200
+    assert version(pid) == before + 1
+    events = client.get(f'/project/{pid}/diff', params={'since' : before}).json()['events']
+    assert events == [{'type' : 'edge_deleted', 'src' : str(ids[0]), 'dst' : str(ids[1])}]
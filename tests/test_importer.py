@@ -0,0 +1,71 @@
+import io
+import tarfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token
+from app.main import app
+from app.sql_app import models
+from app.sql_app.db import SessionLocal
+
+GRAPHS = {
+    'graphs/line.gv' : 'digraph line {\n\t__BEGIN__ -> 1\n\t1 -> 2\n\t2 -> __END__\n}\n',
+    'graphs/fork.gv' : 'digraph fork {\n\t__BEGIN__ -> 1\n\t1 -> 2 [probability=0.25]\n\t1 -> 3 [probability=0.75]\n\t2 -> __END__\n\t3 -> __END__\n}\n',
+}
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        db = SessionLocal()
+        try:
+            user = models.User(username='importer', email='importer@example.com', password='')
+            db.add(user)
+            db.commit()
+            client.headers['Authorization'] = 'Bearer ' + create_access_token({'sub' : str(user.user_id)})
+        finally:
+            db.close()
+        yield client
+
+
+def archive(files : dict[str, str | bytes]) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for name, data in files.items():
+            data = data.encode() if type(data) == str else data
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+def labelled_edges(graph : dict) -> set[tuple]:
+    labels = {id : vertex['label'] for id, vertex in graph['vertices'].items()}
+    return {(labels[id], labels[next_id], edge['probability'])
+            for id, vertex in graph['vertices'].items() for next_id, edge in vertex['edges'].items()}
+
+
+def test_import_with_bad_file(client):
+    files = {**GRAPHS, 'graphs/broken.gv' : 'digraph broken { a -> b }', 'graphs/binary.gv' : b'\xff\xfe', 'readme.txt' : 'not a graph'}
+    response = client.post('/project/import', files={'archive' : ('graphs.tar.gz', archive(files), 'application/gzip')})
+    assert response.status_code == 200
+    report = response.json()
+    assert sorted(failure['file'] for failure in report['failed']) == ['graphs/binary.gv', 'graphs/broken.gv']
+    assert sorted((item['file'], item['nodes'], item['edges']) for item in report['imported']) == [('graphs/fork.gv', 3, 5), ('graphs/line.gv', 2, 3)]
+
+    imported = {item['file'] : item['project_id'] for item in report['imported']}
+    line = client.get(f'/project/{imported["graphs/line.gv"]}/graph')
+    assert line.headers['x-project-version'] == '1'
+    assert labelled_edges(line.json()) == {('__BEGIN__', '1', None), ('1', '2', None), ('2', '__END__', None)}
+    fork = client.get(f'/project/{imported["graphs/fork.gv"]}/graph').json()
+    assert fork['label'] == 'fork'
+    assert {edge for edge in labelled_edges(fork) if edge[0] == '1'} == {('1', '2', 0.25), ('1', '3', 0.75)}
+    projects = [client.get(f'/project/{pid}').json()['project']['project_label'] for pid in imported.values()]
+    assert sorted(projects) == ['fork', 'line']
+
+
+def test_import_broken_archive(client):
+    response = client.post('/project/import', files={'archive' : ('graphs.tar', io.BytesIO(b'not an archive'), 'application/x-tar')})
+    assert response.status_code == 400
@@ -0,0 +1,26 @@
+import asyncio
+
+import fastapi.routing
+
+from app import instrumentation
+
+
+def test_label_values_are_escaped():
+    gauge = instrumentation.Gauge('test_gauge', 'Escaped labels.', ('route',))
+    gauge.set('a\\b "c"\nd', value=1)
+    assert gauge.render().splitlines()[-1] == 'test_gauge{route="a\\\\b \\"c\\"\\nd"} 1'
+
+
+def test_serialize_stage_includes_encoding(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'enabled', True)
+    # Restored after the test
+    monkeypatch.setattr(fastapi.routing, 'serialize_response', fastapi.routing.serialize_response)
+    instrumentation.instrument_serialization()
+    timings = {}
+    token = instrumentation._timings.set(timings)
+    try:
+        content = asyncio.run(fastapi.routing.serialize_response(response_content={'vertices' : {1 : {'id' : 1}}}))
+    finally:
+        instrumentation._timings.reset(token)
+    assert content == {'vertices' : {1 : {'id' : 1}}}
+    assert timings['serialize'][1] == 1
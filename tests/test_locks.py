@@ -0,0 +1,59 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token
+from app.locks import ProjectLocks
+from app.main import app
+from app.sql_app import models
+from app.sql_app.db import SessionLocal
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        db = SessionLocal()
+        try:
+            user = models.User(username='locksmith', email='locksmith@example.com', password='')
+            db.add(user)
+            db.flush()
+            db.add(models.UserAccess(user_id=user.user_id, project_id=None, access_level=2))
+            db.commit()
+            client.headers['Authorization'] = 'Bearer ' + create_access_token({'sub' : str(user.user_id)})
+        finally:
+            db.close()
+        yield client
+
+
+def test_concurrent_edge_writes(client):
+    pid = client.post('/project', json={'project_label' : 'locks', 'project_code' : '', 'project_description' : ''}).json()['project']['project_id']
+    ids = [client.post(f'/project/{pid}/node', json={'node_label' : f'node {number}', 'node_description' : ''}).json()['node']['node_id']
+           for number in range(12)]
+    rng = random.Random(3)
+    pairs = list({tuple(rng.sample(ids, 2)) for _ in range(80)})
+
+    def add(pair):
+        return client.post(f'/project/{pid}/edge', json={'cur_vertex' : pair[0], 'next_vertex' : pair[1]}).status_code
+
+    with ThreadPoolExecutor(8) as pool:
+        assert set(pool.map(add, pairs)) == {200}
+    graph = client.get(f'/project/{pid}/graph').json()
+    present = {(int(id), int(next_id)) for id, vertex in graph['vertices'].items() if id.isdigit()
+               for next_id in vertex['edges'] if next_id.isdigit()}
+    assert present == set(pairs)
+
+
+def test_busy_lock(tmp_path):
+    locks = ProjectLocks(str(tmp_path / 'locks'), 0.05)
+    with locks.write(1):
+        with ThreadPoolExecutor(1) as pool:
+            # Other projects don't wait, the same project times out
+            pool.submit(lambda : locks.write(2).__enter__().__exit__()).result()
+            with pytest.raises(HTTPException) as error:
+                pool.submit(lambda : locks.write(1).__enter__()).result()
+    assert error.value.status_code == 503
+    with locks.write(1):
+        pass
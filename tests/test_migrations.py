@@ -0,0 +1,35 @@
+"""Migration 1 creates the schema from before migrations, later ones bring it to the current models."""
+from sqlalchemy import create_engine, inspect
+
+from app.sql_app.db import Base
+from app.sql_app.migrations import migrate, migrations
+
+
+def schema(engine) -> dict[str, tuple[set, set]]:
+    inspector = inspect(engine)
+    return {table : ({column['name'] for column in inspector.get_columns(table)}, {index['name'] for index in inspector.get_indexes(table)})
+            for table in inspector.get_table_names()}
+
+
+def test_initial_schema(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/initial.db')
+    assert migrate(engine, 1) == 1
+    tables = schema(engine)
+    engine.dispose()
+    assert set(tables) == {'schema_version', 'users', 'projects', 'nodes', 'edges', 'user_access'}
+    assert 'project_version' not in tables['projects'][0]
+    assert 'probability' not in tables['edges'][0]
+    assert tables['edges'][1] == {'ix_edges_project_src', 'ix_edges_project_dst'}
+    assert not tables['nodes'][1] | tables['users'][1] | tables['user_access'][1]
+
+
+def test_migrated_to_models(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/migrated.db')
+    assert migrate(engine, 1) == 1
+    assert migrate(engine) == migrations[-1][0]
+    tables = schema(engine)
+    engine.dispose()
+    for table in Base.metadata.sorted_tables:
+        columns, indexes = tables[table.name]
+        assert columns == {column.name for column in table.columns}
+        assert indexes >= {index.name for index in table.indexes}
@@ -0,0 +1,48 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import config, profiling
+from app.auth import create_access_token
+from app.sql_app import models
+from app.sql_app.db import SessionLocal
+
+app = FastAPI()
+app.add_middleware(profiling.ProfilingMiddleware)
+
+@app.get('/ping')
+def ping():
+    return 'pong'
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    stored = []
+    monkeypatch.setattr(profiling.sampler, 'store', lambda request, data : stored.append(data['trigger']))
+    yield stored
+    profiling.sampler.shutdown()
+
+
+def token(global_access : bool) -> dict:
+    db = SessionLocal()
+    try:
+        user = models.User(username=f'profiled{global_access}', email='profiled@example.com', password='')
+        db.add(user)
+        db.flush()
+        if global_access:
+            db.add(models.UserAccess(user_id=user.user_id, project_id=None, access_level=2))
+        db.commit()
+        return {'Authorization' : 'Bearer ' + create_access_token({'sub' : str(user.user_id)})}
+    finally:
+        db.close()
+
+
+def test_header_honored_for_admins_only(stored):
+    header = {config.PROFILE_HEADER : '1'}
+    with TestClient(app) as client:
+        client.get('/ping', headers=header)
+        client.get('/ping', headers={**header, 'Authorization' : 'Bearer forged'})
+        client.get('/ping', headers={**header, **token(False)})
+        assert stored == []
+        client.get('/ping', headers={**header, **token(True)})
+        assert stored == ['header']
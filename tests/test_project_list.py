@@ -0,0 +1,81 @@
+"""`GET /project` and `GET /project/info` read a page of accessible projects with a fixed
+number of queries, however many projects the user has."""
+import itertools
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.auth import create_access_token
+from app.main import app
+from app.sql_app import models
+from app.sql_app.db import SessionLocal, engine
+
+_usernames = itertools.count()
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def add_user(projects : int, global_access : bool = False) -> dict:
+    """User with edit access to `projects` new projects, and to all projects if `global_access`."""
+    db = SessionLocal()
+    try:
+        user = models.User(username=f'lister{next(_usernames)}', email='lister@example.com', password='')
+        db.add(user)
+        db.flush()
+        if global_access:
+            db.add(models.UserAccess(user_id=user.user_id, project_id=None, access_level=2))
+        for number in range(projects):
+            project = models.Project(project_label=f'project {number}', project_code='', project_description='', project_author=user.user_id)
+            db.add(project)
+            db.flush()
+            db.add(models.UserAccess(user_id=user.user_id, project_id=project.project_id, access_level=2))
+        db.commit()
+        return {'Authorization' : 'Bearer ' + create_access_token({'sub' : str(user.user_id)})}
+    finally:
+        db.close()
+
+
+def queries(client : TestClient, url : str, headers : dict) -> tuple[int, dict]:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200, response.text
+    return len(statements), response.json()
+
+
+@pytest.mark.parametrize('route', ['/project', '/project/info'])
+@pytest.mark.parametrize('global_access', [False, True])
+def test_page_query_count(client, route, global_access):
+    counts = set()
+    for projects in (3, 30, 120):
+        headers = add_user(projects, global_access)
+        count, first = queries(client, f'{route}?limit=10', headers)
+        counts.add(count)
+        assert len(first['projects']) == (10 if global_access else min(projects, 10))
+        if first['next']:
+            count, second = queries(client, f'{route}?limit=10&after={first["next"]}', headers)
+            counts.add(count)
+            assert second['projects']
+    # The current user and the page
+    assert counts == {2}, counts
+
+
+def test_page_limit(client):
+    headers = add_user(105)
+    response = client.get('/project', headers=headers)
+    assert len(response.json()['projects']) == 100
+    assert response.json()['next'] == response.json()['projects'][-1]
+    assert client.get('/project?limit=1001', headers=headers).status_code == 422
+    assert client.get('/project/info?limit=0', headers=headers).status_code == 422
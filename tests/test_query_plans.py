@@ -0,0 +1,88 @@
+"""Query plans of hot CRUD queries on SQLite after all migrations: every query must search
+its table through the index added for it, never scan the table."""
+import re
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+from app.sql_app import crud, models, schemas
+from app.sql_app.migrations import migrate
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/plans.db')
+    migrate(engine)
+    with Session(engine) as db:
+        db.add(models.User(user_id=1, username='user', email='user@example.com', password=''))
+        db.add(models.Project(project_id=1, project_label='project', project_author=1))
+        db.add(models.UserAccess(user_id=1, project_id=None, access_level=3))
+        db.add(models.UserAccess(user_id=1, project_id=1, access_level=2))
+        db.add(models.Node(node_id=1, project_id=1, node_label='node'))
+        db.add(models.Edge(project_id=1, src='__BEGIN__', dst='1'))
+        db.commit()
+        yield db
+    engine.dispose()
+
+
+def query_plans(db : Session, call) -> list[str]:
+    """Plans of the statements run by `call`, one string of plan lines per statement."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'DELETE', 'UPDATE')):
+            statements.append((statement, parameters))
+
+    engine = db.get_bind()
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        call()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    connection = db.connection()
+    return ['\n'.join(row[3] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters))
+            for statement, parameters in statements]
+
+
+def assert_uses(plans : list[str], table : str, index : str):
+    assert any(f'{table} USING INDEX {index}' in plan or f'{table} USING COVERING INDEX {index}' in plan for plan in plans), plans
+    for plan in plans:
+        assert not re.search(rf'\bSCAN {table}\b', plan), plan
+
+
+def test_project_nodes(db):
+    plans = query_plans(db, lambda : crud.get_project_nodes(db, 1, crud.LoadProfile.topology))
+    assert_uses(plans, 'nodes', 'ix_nodes_project_id')
+    plans = query_plans(db, lambda : crud.get_projects_nodes(db, [1, 2], crud.LoadProfile.labels))
+    assert_uses(plans, 'nodes', 'ix_nodes_project_id')
+
+
+def test_user_access(db):
+    plans = query_plans(db, lambda : crud.get_user_access(db, schemas.Access(user_id=1, project_id=1)))
+    assert_uses(plans, 'user_access', 'ix_user_access_user_project')
+    plans = query_plans(db, lambda : crud.get_user_access_levels(db, 1, [1, 2]))
+    assert_uses(plans, 'user_access', 'ix_user_access_user_project')
+    plans = query_plans(db, lambda : crud.has_global_access(db, 1))
+    assert_uses(plans, 'user_access', 'ix_user_access_user_project')
+
+
+def test_user_by_name(db):
+    plans = query_plans(db, lambda : crud.get_user_by_name(db, 'user'))
+    assert_uses(plans, 'users', 'ix_users_username')
+
+
+def test_project_edges(db):
+    plans = query_plans(db, lambda : crud.get_project_edges(db, 1))
+    assert_uses(plans, 'edges', 'ix_edges_project_')
+    plans = query_plans(db, lambda : crud.del_edge(db, 1, '__BEGIN__', '1', flush=False))
+    assert_uses(plans, 'edges', 'ix_edges_project_')
+    plans = query_plans(db, lambda : crud.replace_project_edges(db, 1, [{'src' : '__BEGIN__', 'dst' : '1'}], flush=False))
+    assert_uses(plans, 'edges', 'ix_edges_project_')
+
+
+def test_index_is_required(db):
+    db.execute(text('DROP INDEX ix_nodes_project_id'))
+    plans = query_plans(db, lambda : crud.get_project_nodes(db, 1))
+    with pytest.raises(AssertionError):
+        assert_uses(plans, 'nodes', 'ix_nodes_project_id')
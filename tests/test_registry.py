@@ -0,0 +1,27 @@
+from app.graph.graph import Graph
+from app.graph.registry import FunctionRegistry, registry
+
+
+def test_unknown_modules_are_not_kept():
+    functions = FunctionRegistry()
+    for number in range(100):
+        assert functions.get(f'uploaded_module_{number}', 'entry') is None
+        assert functions.get('select_module', f'missing_{number}') is None
+    assert set(functions._functions) == {'select_module'}
+    functions.register('custom_module', 'entry', print)
+    assert functions.get('custom_module', 'entry') is print
+
+
+def test_transitions_bounded(monkeypatch):
+    monkeypatch.setattr(registry, 'max_transitions', 10)
+    monkeypatch.setattr(registry, '_transitions', type(registry._transitions)())
+    graphs = [Graph(1), Graph(2)]
+    for graph in graphs:
+        graph.add_func_desc('check', 'predicate_module', 'predicate1')
+    for number in range(50):
+        graphs[0].add_transition(f'transition_{number}', None, 'check')
+    assert len(registry._transitions) == 10
+    graphs[1].add_transition('transition_45', None, 'check')
+    graphs[1].add_transition('transition_0', None, 'check')
+    assert graphs[1].get_transition('transition_45') is graphs[0].get_transition('transition_45')
+    assert graphs[1].get_transition('transition_0') is not graphs[0].get_transition('transition_0')
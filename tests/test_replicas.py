@@ -0,0 +1,95 @@
+"""Reads of `get_read_db` routes go to replicas, except for clients that committed a change
+in the last `READ_YOUR_WRITES_SECONDS`."""
+import time
+import uuid
+from itertools import cycle
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import config
+from app.sql_app import db, models
+
+PRIMARY = str(db.engine.url)
+
+app = FastAPI()
+app.add_middleware(db.ReadYourWritesMiddleware)
+
+@app.get('/read')
+def read(session : Session = Depends(db.get_read_db)):
+    return str(session.get_bind().url)
+
+@app.post('/write')
+def write(rollback : bool = False, session : Session = Depends(db.get_db)):
+    session.add(models.User(username=uuid.uuid4().hex, email='replicas@example.com', password=''))
+    session.flush()
+    if rollback:
+        session.rollback()
+    else:
+        session.commit()
+
+
+@pytest.fixture
+def replicas(tmp_path, monkeypatch):
+    engines = [create_engine(f'sqlite:///{tmp_path}/replica{number}.db') for number in range(2)]
+    monkeypatch.setattr(db, 'replica_engines', engines)
+    monkeypatch.setattr(db, '_replicas', cycle(engines))
+    yield [str(engine.url) for engine in engines]
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def token() -> dict:
+    return {'Authorization' : 'Bearer ' + uuid.uuid4().hex}
+
+
+def test_reads_round_robin(replicas, client):
+    assert [client.get('/read').json() for _ in range(4)] == replicas * 2
+
+
+def test_writer_pinned_by_token(replicas, client):
+    writer = token()
+    client.post('/write', headers=writer)
+    client.cookies.clear()
+    assert client.get('/read', headers=writer).json() == PRIMARY
+    assert client.get('/read', headers=token()).json() in replicas
+
+
+def test_writer_pinned_by_cookie(replicas, client):
+    response = client.post('/write')
+    assert db.WRITE_COOKIE in response.cookies
+    # Another worker doesn't know the token, only the cookie
+    assert client.get('/read', headers=token()).json() == PRIMARY
+    client.cookies.clear()
+    assert client.get('/read').json() in replicas
+
+
+def test_forged_cookie_ignored(replicas, client):
+    for value in [f'{time.time() + 3600:.3f}', f'{time.time() + 3600:.3f}.{"0" * 64}']:
+        client.cookies.set(db.WRITE_COOKIE, value)
+        assert client.get('/read').json() in replicas
+
+
+def test_pin_expires(replicas, client, monkeypatch):
+    monkeypatch.setattr(config, 'READ_YOUR_WRITES_SECONDS', 0.2)
+    writer = token()
+    client.post('/write', headers=writer)
+    assert client.get('/read', headers=writer).json() == PRIMARY
+    time.sleep(0.3)
+    assert client.get('/read', headers=writer).json() in replicas
+
+
+def test_rollback_does_not_pin(replicas, client):
+    writer = token()
+    response = client.post('/write', params={'rollback' : True}, headers=writer)
+    assert db.WRITE_COOKIE not in response.cookies
+    assert client.get('/read', headers=writer).json() in replicas
@@ -0,0 +1,19 @@
+from app.sql_app import crud, models
+from app.sql_app.db import SessionLocal
+
+
+def test_like_fallback_matches_wildcards_literally(monkeypatch):
+    # Databases without a full-text index search with ILIKE
+    monkeypatch.setattr(crud, '_has_nodes_fts', lambda db : False)
+    db = SessionLocal()
+    try:
+        user = models.User(username='searcher', email='searcher@example.com', password='')
+        project = models.Project(project_label='search', project_code='', project_description='')
+        db.add_all([user, project])
+        db.flush()
+        db.add(models.UserAccess(user_id=user.user_id, project_id=project.project_id, access_level=1))
+        db.add_all(models.Node(project_id=project.project_id, node_label=label, node_description='') for label in ['load_data', 'loadxdata', 'load100'])
+        db.commit()
+        assert [node['node_label'] for node in crud.search_nodes(db, user.user_id, 'load_data')] == ['load_data']
+    finally:
+        db.close()
@@ -0,0 +1,50 @@
+import pytest
+
+from app.graph.graph import Graph
+from app.graph.simulation import WalkSimulation
+
+
+def test_fresh_project():
+    result = WalkSimulation(Graph(1)).run(10, 50, 1)
+    assert result['stuck_probability'] == 1
+    assert result['visits'] == {'__BEGIN__' : 1, '__END__' : 0}
+
+
+def test_edgeless_begin_is_a_dead_end():
+    graph = Graph(1)
+    graph.add_vertex(1)
+    graph.get_vertex(1).add_edge(graph.get_vertex('__END__'))
+    # __BEGIN__ is not the last row, its empty row must not be read as the next one
+    assert graph.get_vertices_IDs().index('__BEGIN__') < len(graph.get_vertices_IDs()) - 1
+    result = WalkSimulation(graph).run(10, 50, 1)
+    assert result['stuck_probability'] == 1
+    assert result['visits'][1] == 0
+
+
+def test_edge_probabilities_persist(tmp_path):
+    graph = Graph(1)
+    graph.add_vertex(1)
+    graph.add_vertex(2)
+    begin = graph.get_vertex('__BEGIN__')
+    graph.add_func_desc('weighted', 'select_module', 'select_weighted')
+    graph.set_selector(graph.get_vertex(1), 'weighted')
+    begin.add_edge(graph.get_vertex(1))
+    graph.get_vertex(1).add_edge(graph.get_vertex(2), probability=3.0)
+    graph.get_vertex(1).add_edge(graph.get_vertex('__END__'), probability=1.0)
+    graph.get_vertex(2).add_edge(graph.get_vertex('__END__'))
+    path = str(tmp_path / 'weighted.gv')
+    graph.export_aDOT(path)
+
+    imported = Graph(1)
+    assert imported.import_aDOT(path) is None
+    assert imported.get_vertex(1).get_edge(2)['probability'] == 3.0
+    restored = Graph(1)
+    restored.load_state(imported.dump_state())
+    result = WalkSimulation(restored).run(20000, 50, 1)
+    assert result['visits'][2] == pytest.approx(0.75, abs=0.02)
+
+
+def test_exported_edges_have_probability():
+    graph = Graph(1)
+    graph.get_vertex('__BEGIN__').add_edge(graph.get_vertex('__END__'))
+    assert graph.export_dict()['vertices']['__BEGIN__']['edges']['__END__']['probability'] is None
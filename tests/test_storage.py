@@ -0,0 +1,74 @@
+"""Hybrid storage writes one edge row per edge change, the aDOT file only when it lacks a definition."""
+import os
+
+import pytest
+from sqlalchemy import event
+
+from app import config
+from app.graph.graph import Graph
+from app.sql_app import models
+from app.sql_app.db import SessionLocal, engine
+from app.storage import HybridStorage
+
+
+@pytest.fixture
+def project():
+    db = SessionLocal()
+    try:
+        project = models.Project(project_label='hybrid', project_code='', project_description='')
+        db.add(project)
+        db.flush()
+        project.project_path = f'{config.SAVE_DIRECTORY}{project.project_id}.gv'
+        graph = Graph(project.project_id)
+        graph.add_vertex(1)
+        graph.add_func_desc('pr', 'predicate_module', 'predicate1')
+        graph.add_transition('tr', None, 'pr')
+        graph.get_vertex('__BEGIN__').add_edge(graph.get_vertex(1), morph=graph.get_transition('tr'))
+        HybridStorage().save(db, project, graph)
+        db.commit()
+        yield db, project
+    finally:
+        db.close()
+
+
+def statements(db, change) -> list[str]:
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement.split()[0])
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        change()
+        db.flush()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return executed
+
+
+@pytest.mark.parametrize('morph, rows', [
+    # As posted to POST /project/{id}/edge, equal to the defined transition
+    ({'name' : 'tr', 'predicate' : {'name' : 'pr'}}, ['DELETE', 'INSERT']),
+    ({}, ['DELETE', 'INSERT']),
+])
+def test_add_edge_single_row(project, morph, rows):
+    db, project = project
+    storage = HybridStorage()
+    graph = Graph(project.project_id)
+    storage.load(db, project, graph)
+    vertex, end = graph.get_vertex(1), graph.get_vertex('__END__')
+    vertex.add_edge(end, morph=morph)
+    modified = os.stat(project.project_path).st_mtime_ns
+    assert statements(db, lambda : storage.add_edge(db, project, graph, vertex, end)) == rows
+    assert os.stat(project.project_path).st_mtime_ns == modified
+
+
+def test_add_edge_with_new_transition_saves_graph(project):
+    db, project = project
+    storage = HybridStorage()
+    graph = Graph(project.project_id)
+    storage.load(db, project, graph)
+    vertex, end = graph.get_vertex(1), graph.get_vertex('__END__')
+    vertex.add_edge(end, morph={'name' : 'other', 'predicate' : {'name' : 'pr'}})
+    assert 'INSERT' in statements(db, lambda : storage.add_edge(db, project, graph, vertex, end))
+    assert 'other [predicate=pr]' in open(project.project_path).read()
@@ -0,0 +1,150 @@
+"""`POST /project/{id}/walk` streams after its database session is closed: functions
+of the walk must still be able to read vertex metadata."""
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+from app.auth import create_access_token
+from app.graph.graph import Graph
+from app.graph.walker import AsyncWalker
+from app.graph.registry import registry
+from app.main import app
+from app.sql_app import models
+from app.sql_app.db import SessionLocal
+
+descriptions = []
+
+
+def read_description(graph, vertex, next_vertex):
+    descriptions.append(next_vertex.metadata.get('node_description'))
+    return None
+
+
+@pytest.fixture(scope='module')
+def project():
+    registry.register('predicate_module', 'read_description', read_description)
+    db = SessionLocal()
+    try:
+        user = models.User(username='walker', email='walker@example.com', password='')
+        project = models.Project(project_label='walk', project_code='', project_description='')
+        db.add_all([user, project])
+        db.flush()
+        node = models.Node(project_id=project.project_id, node_label='stage', node_description='first stage')
+        db.add_all([node, models.UserAccess(user_id=user.user_id, project_id=project.project_id, access_level=1)])
+        db.flush()
+
+        graph = Graph(project.project_id)
+        graph.add_vertex(node.node_id, 'stage')
+        graph.add_func_desc('read', 'predicate_module', 'read_description')
+        graph.add_transition('describe', None, 'read')
+        graph.get_vertex('__BEGIN__').add_edge(graph.get_vertex(node.node_id), morph=graph.get_transition('describe'))
+        graph.get_vertex(node.node_id).add_edge(graph.get_vertex('__END__'), morph=graph.get_transition('describe'))
+        project.project_path = f'{config.SAVE_DIRECTORY}{project.project_id}.gv'
+        graph.export_aDOT(project.project_path)
+        db.commit()
+        yield project.project_id, {'Authorization' : 'Bearer ' + create_access_token({'sub' : str(user.user_id)})}
+    finally:
+        db.close()
+
+
+def test_walk_reads_metadata(project):
+    pid, headers = project
+    descriptions.clear()
+    with TestClient(app) as client:
+        with client.stream('POST', f'/project/{pid}/walk', headers=headers) as response:
+            assert response.status_code == 200
+            events = [json.loads(line[len('data: '):]) for line in response.iter_lines() if line.startswith('data: ')]
+    assert [event['event'] for event in events if event['event'] != 'transition'] == ['processed', 'processed', 'end']
+    assert descriptions == ['first stage', None]
+
+
+def read_events(client, pid, headers, **params):
+    with client.stream('POST', f'/project/{pid}/walk', headers=headers, params=params) as response:
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('text/event-stream')
+        messages = [message.split('\n') for message in response.read().decode().split('\n\n') if message]
+    events = []
+    for name, data in messages:
+        event = json.loads(data[len('data: '):])
+        assert name == 'event: ' + event['event']
+        events.append(event)
+    return events
+
+
+def test_walk_event_stream(project):
+    pid, headers = project
+    with TestClient(app) as client:
+        events = read_events(client, pid, headers, concurrency=1)
+    node = events[0]['to']
+    # One edge at a time: every transition is processed before the next one is made
+    assert [(event['event'], event.get('step'), event.get('from'), event.get('to')) for event in events[:-1]] == [
+        ('transition', 1, '__BEGIN__', node),
+        ('processed', 1, '__BEGIN__', node),
+        ('transition', 2, node, '__END__'),
+        ('processed', 2, node, '__END__'),
+    ]
+    assert events[-1] == {'event' : 'end', 'steps' : 2}
+
+
+calls = []
+running = 0
+most_running = 0
+
+
+async def async_predicate(graph, vertex, next_vertex):
+    global running, most_running
+    running += 1
+    most_running = max(most_running, running)
+    await asyncio.sleep(0.01)
+    running -= 1
+    return vertex.id, next_vertex.id
+
+
+async def async_processor(src, dst):
+    await asyncio.sleep(0)
+    calls.append((src, dst))
+
+
+def chain_graph(length : int) -> Graph:
+    registry.register('predicate_module', 'async_predicate', async_predicate)
+    registry.register('processor_module', 'async_processor', async_processor)
+    graph = Graph(0)
+    graph.add_func_desc('pred', 'predicate_module', 'async_predicate')
+    graph.add_func_desc('proc', 'processor_module', 'async_processor')
+    graph.add_transition('async', 'proc', 'pred')
+    vertices = [graph.get_vertex('__BEGIN__')]
+    for id in range(1, length + 1):
+        graph.add_vertex(id, f'vertex {id}')
+        vertices.append(graph.get_vertex(id))
+    vertices.append(graph.get_vertex('__END__'))
+    for vertex, next_vertex in zip(vertices, vertices[1:]):
+        vertex.add_edge(next_vertex, morph=graph.get_transition('async'))
+    return graph
+
+
+def run_walk(graph : Graph, concurrency : int) -> list[dict]:
+    global running, most_running
+    calls.clear()
+    running = most_running = 0
+
+    async def collect():
+        return [event async for event in AsyncWalker(graph, concurrency=concurrency).walk()]
+
+    return asyncio.run(collect())
+
+
+def test_async_functions_awaited():
+    events = run_walk(chain_graph(2), 1)
+    assert calls == [('__BEGIN__', 1), (1, 2), (2, '__END__')]
+    assert [event['event'] for event in events] == ['transition', 'processed'] * 3 + ['end']
+
+
+@pytest.mark.parametrize('concurrency', [1, 3])
+def test_concurrency_limit(concurrency):
+    events = run_walk(chain_graph(9), concurrency)
+    assert most_running == concurrency
+    assert sorted(calls, key=str) == sorted([('__BEGIN__', 1)] + [(id, id + 1) for id in range(1, 9)] + [(9, '__END__')], key=str)
+    assert events[-1] == {'event' : 'end', 'steps' : 10}